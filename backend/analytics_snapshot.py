@@ -0,0 +1,63 @@
+"""
+Columnar analytics snapshot
+
+Exports reports, their updates and notifications changed since the last
+run to Parquet files (see utils/columnar_export.py), or prints summaries
+computed from those files without touching the database.
+
+Usage:
+    python analytics_snapshot.py export
+    python analytics_snapshot.py summary [--department NAME] [--start YYYY-MM] [--end YYYY-MM]
+"""
+import argparse
+import asyncio
+from datetime import datetime
+
+from utils.columnar_export import columnar_exporter
+from utils.columnar_query import status_counts, monthly_summary, resolution_hours
+
+def print_table(title: str, rows: list):
+    print(f"\n{title}")
+    if not rows:
+        print("  (no data)")
+        return
+    columns = list(rows[0])
+    widths = {
+        column: max(len(column), *(len(str(row[column])) for row in rows))
+        for column in columns
+    }
+    print("  " + "  ".join(f"{column:<{widths[column]}}" for column in columns))
+    for row in rows:
+        print("  " + "  ".join(f"{str(row[column]):<{widths[column]}}" for column in columns))
+
+async def export():
+    from database import connect_to_mongodb, close_mongodb_connection
+
+    await connect_to_mongodb()
+    try:
+        counts = await columnar_exporter.export_once()
+    finally:
+        await close_mongodb_connection()
+    print(f"🗄️  Exported to {columnar_exporter.directory}: {counts or 'nothing new'}")
+
+def summary(department: str = None, start: datetime = None, end: datetime = None):
+    directory = columnar_exporter.directory
+    print_table("Reports by status", status_counts(department, directory))
+    print_table("Reports by month", monthly_summary(start, end, department, directory))
+    print_table("Hours to resolve", resolution_hours(start, end, department, directory))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("command", choices=["export", "summary"])
+    parser.add_argument("--department")
+    parser.add_argument("--start", type=lambda value: datetime.strptime(value, "%Y-%m"))
+    parser.add_argument("--end", type=lambda value: datetime.strptime(value, "%Y-%m"))
+    args = parser.parse_args()
+
+    if args.command == "export":
+        asyncio.run(export())
+    else:
+        summary(args.department, args.start, args.end)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+API routes for report analytics, answered from pre-aggregated rollups
+"""
+from fastapi import APIRouter, BackgroundTasks, HTTPException, status, Depends, Query
+from typing import Optional
+from datetime import datetime, timedelta, timezone
+
+from models.schemas import UserInDB
+from utils.auth import get_admin_user, get_officer_or_admin_user
+from utils.analytics import INTERVALS, query_timeseries, query_resolution
+from utils.hotspots import HOTSPOT_WINDOWS_DAYS, compute_hotspots, get_hotspots
+
+router = APIRouter()
+
+MAX_HOURLY_RANGE = timedelta(days=31)
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Query datetimes with an offset, as naive UTC like the stored ones"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def analytics_scope(
+    current_user: UserInDB,
+    department: Optional[str],
+    start: Optional[datetime],
+    end: Optional[datetime]
+):
+    """
+    Resolve the time range (last 30 days by default) and department;
+    officers only see their own department
+    """
+    end = naive_utc(end) or datetime.utcnow()
+    start = naive_utc(start) or end - timedelta(days=30)
+    if start >= end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start must be before end"
+        )
+    if current_user.user_type == "officer":
+        own_department = (current_user.department or "").lower()
+        if department and department.lower() != own_department:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="You can only view analytics for your department"
+            )
+        department = own_department or None
+    return start, end, department
+
+@router.get("/timeseries")
+async def get_timeseries(
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+    interval: str = Query("day", description="hour, day, week or month"),
+    department: Optional[str] = Query(None),
+    category: Optional[str] = Query(None),
+    group_by: Optional[str] = Query(None, description="department or category"),
+    current_user: UserInDB = Depends(get_officer_or_admin_user)
+):
+    """
+    Reports created, resolved, rejected and reopened per interval, with
+    average, median and 90th/95th percentile time to resolve (officers and
+    admins only)
+    """
+    if interval not in INTERVALS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"interval must be one of {', '.join(INTERVALS)}"
+        )
+    if group_by not in (None, "department", "category"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="group_by must be department or category"
+        )
+    start, end, department = analytics_scope(current_user, department, start, end)
+    if interval == "hour" and end - start > MAX_HOURLY_RANGE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Hourly series are limited to 31 days"
+        )
+
+    points = await query_timeseries(start, end, interval, department, category, group_by)
+    return {
+        "start": start,
+        "end": end,
+        "interval": interval,
+        "department": department,
+        "category": category,
+        "points": points
+    }
+
+@router.get("/resolution")
+async def get_resolution_stats(
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+    group_by: str = Query("department", description="department or category"),
+    department: Optional[str] = Query(None),
+    category: Optional[str] = Query(None),
+    current_user: UserInDB = Depends(get_officer_or_admin_user)
+):
+    """
+    Totals and time-to-resolve percentiles per department or category over
+    a range (officers and admins only)
+    """
+    if group_by not in ("department", "category"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="group_by must be department or category"
+        )
+    start, end, department = analytics_scope(current_user, department, start, end)
+
+    groups = await query_resolution(start, end, group_by, department, category)
+    return {
+        "start": start,
+        "end": end,
+        "group_by": group_by,
+        "groups": groups
+    }
+
+@router.get("/hotspots")
+async def get_report_hotspots(
+    department: Optional[str] = Query(None),
+    window_days: int = Query(HOTSPOT_WINDOWS_DAYS[0], description="One of the configured windows"),
+    current_user: UserInDB = Depends(get_admin_user)
+):
+    """
+    Places generating the most reports, per department, with report counts
+    and outlines from the latest hotspot run (admin only)
+    """
+    if window_days not in HOTSPOT_WINDOWS_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"window_days must be one of {', '.join(map(str, HOTSPOT_WINDOWS_DAYS))}"
+        )
+    return await get_hotspots(department, window_days)
+
+@router.post("/hotspots/refresh", status_code=status.HTTP_202_ACCEPTED)
+async def refresh_report_hotspots(
+    background_tasks: BackgroundTasks,
+    current_user: UserInDB = Depends(get_admin_user)
+):
+    """Recompute hotspots now instead of waiting for the next run (admin only)"""
+    background_tasks.add_task(compute_hotspots)
+    return {"message": "Hotspot refresh started"}
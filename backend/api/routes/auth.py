@@ -1,27 +1,43 @@
 """
 Authentication routes for user registration, login, and token management
 """
-from fastapi import APIRouter, HTTPException, status, Depends
-from fastapi.security import HTTPBearer
+from fastapi import APIRouter, HTTPException, status, Depends, Request
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, EmailStr
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import List, Optional
 
 from database import get_users_collection, get_registration_requests_collection
 from models.schemas import (
     UserCreate, UserResponse, UserInDB, Token, TokenData,
-    RegistrationRequestCreate, RegistrationRequestInDB
+    RegistrationRequestCreate, RegistrationRequestInDB, SessionResponse
 )
 from utils.auth import (
-    get_password_hash, verify_password, create_access_token, 
-    authenticate_user, get_current_user
+    get_password_hash, verify_password, create_access_token, verify_token,
+    authenticate_user, get_current_user, get_current_user_from_db, security
+)
+from utils.rate_limit import client_ip
+from utils.login_guard import login_guard
+from utils.cache import cache
+from utils.sessions import (
+    create_session, rotate_refresh_token, list_sessions, revoke_session,
+    revoke_refresh_token
 )
 
 router = APIRouter()
 
+optional_security = HTTPBearer(auto_error=False)
+
 class LoginRequest(BaseModel):
     email: EmailStr
     password: str
+    device_name: Optional[str] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
 
 class RegisterRequest(BaseModel):
     name: str
@@ -33,34 +49,53 @@ class RegisterRequest(BaseModel):
     department: Optional[str] = None
 
 @router.post("/login", response_model=dict)
-async def login(login_data: LoginRequest):
+async def login(login_data: LoginRequest, request: Request):
     """
     Authenticate user and return access token
     """
+    # Reject locked accounts/IPs before spending a password hash on them
+    ip_address = client_ip(request.scope)
+    await login_guard.check(login_data.email, ip_address)
+    
     user = await authenticate_user(login_data.email, login_data.password)
     if not user:
+        await login_guard.record_failure(login_data.email, ip_address)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    await login_guard.record_success(login_data.email, ip_address)
+    
     # Update last login time
     users_collection = get_users_collection()
     await users_collection.update_one(
         {"id": user.id},
         {"$set": {"last_login_at": datetime.utcnow()}}
     )
+    await cache.invalidate("users", user.email)
+    
+    # Start a refresh-token session for this device
+    session, refresh_token = await create_session(
+        user,
+        device_name=login_data.device_name,
+        user_agent=request.headers.get("user-agent"),
+        ip_address=ip_address
+    )
     
     # Create access token
     access_token_expires = timedelta(minutes=30)
     access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data={"sub": user.email, "sid": session.id},
+        expires_delta=access_token_expires, user=user
     )
     
     return {
         "access_token": access_token,
         "token_type": "bearer",
+        "refresh_token": refresh_token,
+        "session_id": session.id,
         "user": {
             "id": user.id,
             "name": user.name,
@@ -142,7 +177,7 @@ async def register(register_data: RegisterRequest):
         }
 
 @router.get("/me", response_model=UserResponse)
-async def get_current_user_profile(current_user: UserInDB = Depends(get_current_user)):
+async def get_current_user_profile(current_user: UserInDB = Depends(get_current_user_from_db)):
     """
     Get current user profile information
     """
@@ -161,20 +196,99 @@ async def get_current_user_profile(current_user: UserInDB = Depends(get_current_
     )
 
 @router.post("/refresh", response_model=Token)
-async def refresh_token(current_user: UserInDB = Depends(get_current_user)):
+async def refresh_token(
+    refresh_data: Optional[RefreshRequest] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+):
     """
-    Refresh access token for authenticated user
+    Exchange a refresh token for a new access token and refresh token
+    
+    The presented refresh token is invalidated. Clients that have not
+    adopted refresh tokens yet may still refresh with a valid access token.
     """
+    if refresh_data is None:
+        if credentials is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Refresh token required",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        current_user = await get_current_user_from_db(credentials)
+        access_token = create_access_token(
+            data={"sub": current_user.email}, expires_delta=timedelta(minutes=30),
+            user=current_user
+        )
+        return Token(access_token=access_token, token_type="bearer")
+    
+    session, new_refresh_token = await rotate_refresh_token(refresh_data.refresh_token)
+    
+    users_collection = get_users_collection()
+    user_doc = await users_collection.find_one({"id": session.user_id})
+    if not user_doc or not user_doc.get("is_active", True):
+        await revoke_session(session.id, session.user_id, "inactive_user")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Inactive user",
+        )
+    user = UserInDB(**user_doc)
+    
     access_token_expires = timedelta(minutes=30)
     access_token = create_access_token(
-        data={"sub": current_user.email}, expires_delta=access_token_expires
+        data={"sub": user.email, "sid": session.id},
+        expires_delta=access_token_expires, user=user
     )
     
-    return Token(access_token=access_token, token_type="bearer")
+    return Token(
+        access_token=access_token,
+        token_type="bearer",
+        refresh_token=new_refresh_token
+    )
+
+@router.get("/sessions", response_model=List[SessionResponse])
+async def get_sessions(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """
+    List the current user's signed-in devices
+    """
+    current_session_id = verify_token(credentials.credentials).get("sid")
+    return await list_sessions(current_user.id, current_session_id)
+
+@router.delete("/sessions/{session_id}")
+async def delete_session(
+    session_id: str,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """
+    Sign out one of the current user's devices
+    """
+    if not await revoke_session(session_id, current_user.id, "user_revoked"):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Session not found"
+        )
+    return {"message": "Session revoked successfully"}
 
 @router.post("/logout")
-async def logout():
+async def logout(
+    logout_data: Optional[LogoutRequest] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+):
     """
     Logout user (client should remove token)
+    
+    Also ends this device's refresh-token session, identified by the
+    refresh token or by the session id in the access token.
     """
-    return {"message": "Successfully logged out"}
\ No newline at end of file
+    if logout_data and logout_data.refresh_token:
+        await revoke_refresh_token(logout_data.refresh_token, "logout")
+    elif credentials is not None:
+        try:
+            payload = verify_token(credentials.credentials)
+        except HTTPException:
+            payload = {}
+        if payload.get("sid") and payload.get("uid"):
+            await revoke_session(payload["sid"], payload["uid"], "logout")
+    
+    return {"message": "Successfully logged out"}
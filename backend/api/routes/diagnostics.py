@@ -0,0 +1,25 @@
+"""
+API routes for runtime diagnostics of the serving worker
+"""
+from fastapi import APIRouter, Depends, Query
+
+from models.schemas import UserInDB
+from utils.auth import get_admin_user
+from utils.loop_monitor import loop_monitor
+
+router = APIRouter()
+
+@router.get("/loop")
+async def get_loop_blocks(
+    top: int = Query(20, ge=1, le=100),
+    recent: int = Query(20, ge=0, le=100),
+    current_user: UserInDB = Depends(get_admin_user)
+):
+    """
+    Event-loop lag and the places where callbacks blocked the loop, with
+    their routes and stacks (admin only)
+
+    Each worker keeps its own record; the answer covers the worker that
+    served the request (see pid).
+    """
+    return loop_monitor.report(top, recent)
@@ -1,19 +1,43 @@
 """
 API routes for notification management
 """
-from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Request, Response
 from typing import List, Optional
 from datetime import datetime
 
-from database import get_notifications_collection
+from database import get_notifications_collection, run_in_transaction
 from models.schemas import (
     NotificationCreate, NotificationResponse, NotificationInDB,
     NotificationType, UserInDB
 )
 from utils.auth import get_current_user, get_admin_user
+from utils.http_cache import compute_list_etag, conditional_response
+from utils.responses import list_response
+from utils.sync import record_tombstone
+from utils.notification_retention import mark_read_update
+from utils.policies import (
+    notification_read_filter, notification_delete_filter, with_policy
+)
 
 router = APIRouter()
 
+async def raise_notification_not_accessible(notification_id: str, forbidden_detail: str):
+    """
+    Raise 404 or 403 after a policy-filtered lookup matched nothing
+    """
+    exists = await get_notifications_collection().find_one(
+        {"id": notification_id}, {"_id": 1}
+    )
+    if not exists:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Notification not found"
+        )
+    raise HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail=forbidden_detail
+    )
+
 @router.post("/", response_model=dict, status_code=status.HTTP_201_CREATED)
 async def create_notification(
     notification_data: NotificationCreate,
@@ -62,13 +86,8 @@ async def get_notifications(
     """
     notifications_collection = get_notifications_collection()
     
-    # Build filter query
-    filter_query = {
-        "$or": [
-            {"user_id": current_user.id},  # User-specific notifications
-            {"user_id": None}  # System-wide notifications
-        ]
-    }
+    # Build filter query: user-specific and system-wide notifications
+    filter_query = notification_read_filter(current_user)
     
     # Add filters
     if unread_only:
@@ -110,23 +129,17 @@ async def get_notification(
     """
     notifications_collection = get_notifications_collection()
     
-    # Find notification
-    notification_doc = await notifications_collection.find_one({"id": notification_id})
+    # Find notification, only if the user may see it
+    notification_doc = await notifications_collection.find_one(
+        with_policy({"id": notification_id}, notification_read_filter(current_user))
+    )
     if not notification_doc:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Notification not found"
+        await raise_notification_not_accessible(
+            notification_id, "You can only view your own notifications"
         )
     
     notification = NotificationInDB(**notification_doc)
     
-    # Check permissions
-    if notification.user_id and notification.user_id != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You can only view your own notifications"
-        )
-    
     return NotificationResponse(
         id=notification.id,
         title=notification.title,
@@ -150,41 +163,20 @@ async def mark_notification_as_read(
     """
     notifications_collection = get_notifications_collection()
     
-    # Find notification first to check permissions
-    notification_doc = await notifications_collection.find_one({"id": notification_id})
-    if not notification_doc:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Notification not found"
-        )
-    
-    notification = NotificationInDB(**notification_doc)
-    
-    # Check permissions
-    if notification.user_id and notification.user_id != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You can only mark your own notifications as read"
-        )
-    
-    # Update notification
+    # Update notification, only if the user may see it. System-wide
+    # notifications are not given an expiry, as other users still show them
+    now = datetime.utcnow()
     result = await notifications_collection.update_one(
-        {"id": notification_id},
-        {
-            "$set": {
-                "is_read": True,
-                "read_at": datetime.utcnow()
-            }
-        }
+        with_policy({"id": notification_id}, notification_read_filter(current_user)),
+        mark_read_update(now)
     )
     
-    if result.modified_count:
-        return {"message": "Notification marked as read"}
-    else:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to mark notification as read"
+    if not result.matched_count:
+        await raise_notification_not_accessible(
+            notification_id, "You can only mark your own notifications as read"
         )
+    
+    return {"message": "Notification marked as read"}
 
 @router.put("/mark-all-read")
 async def mark_all_notifications_as_read(
@@ -196,20 +188,10 @@ async def mark_all_notifications_as_read(
     notifications_collection = get_notifications_collection()
     
     # Update all unread notifications for the user
+    now = datetime.utcnow()
     result = await notifications_collection.update_many(
-        {
-            "$or": [
-                {"user_id": current_user.id},
-                {"user_id": None}
-            ],
-            "is_read": False
-        },
-        {
-            "$set": {
-                "is_read": True,
-                "read_at": datetime.utcnow()
-            }
-        }
+        with_policy(notification_read_filter(current_user), {"is_read": False}),
+        mark_read_update(now)
     )
     
     return {
@@ -226,34 +208,28 @@ async def delete_notification(
     """
     notifications_collection = get_notifications_collection()
     
-    # Find notification first to check permissions
-    notification_doc = await notifications_collection.find_one({"id": notification_id})
-    if not notification_doc:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Notification not found"
+    # Delete notification if the user may, leaving a tombstone for syncing
+    # clients
+    async def write_delete(session):
+        notification_doc = await notifications_collection.find_one_and_delete(
+            with_policy({"id": notification_id}, notification_delete_filter(current_user)),
+            projection={"user_id": 1},
+            session=session
         )
-    
-    notification = NotificationInDB(**notification_doc)
-    
-    # Check permissions
-    if (current_user.user_type != "admin" and 
-        notification.user_id and notification.user_id != current_user.id):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You can only delete your own notifications"
+        if notification_doc:
+            await record_tombstone(
+                "notifications", notification_id, notification_doc.get("user_id"),
+                session=session
+            )
+        return notification_doc
+    
+    notification_doc = await run_in_transaction(write_delete)
+    if not notification_doc:
+        await raise_notification_not_accessible(
+            notification_id, "You can only delete your own notifications"
         )
     
-    # Delete notification
-    result = await notifications_collection.delete_one({"id": notification_id})
-    
-    if result.deleted_count:
-        return {"message": "Notification deleted successfully"}
-    else:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to delete notification"
-        )
+    return {"message": "Notification deleted successfully"}
 
 @router.get("/stats/unread-count")
 async def get_unread_count(
@@ -265,13 +241,9 @@ async def get_unread_count(
     notifications_collection = get_notifications_collection()
     
     # Count unread notifications
-    count = await notifications_collection.count_documents({
-        "$or": [
-            {"user_id": current_user.id},
-            {"user_id": None}
-        ],
-        "is_read": False
-    })
+    count = await notifications_collection.count_documents(
+        with_policy(notification_read_filter(current_user), {"is_read": False})
+    )
     
     return {"unread_count": count}
 
@@ -313,6 +285,8 @@ async def broadcast_notification(
 
 @router.get("/admin/all", response_model=List[NotificationResponse])
 async def get_all_notifications_admin(
+    request: Request,
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     current_user: UserInDB = Depends(get_admin_user)
@@ -322,6 +296,15 @@ async def get_all_notifications_admin(
     """
     notifications_collection = get_notifications_collection()
     
+    # Notifications are never edited except for being read, so creation,
+    # read time and count together identify the current state
+    etag = await compute_list_etag(
+        notifications_collection, {}, ("created_at", "read_at"), skip=skip, limit=limit
+    )
+    not_modified = conditional_response(request, response, etag)
+    if not_modified:
+        return not_modified
+    
     # Query all notifications
     cursor = notifications_collection.find({}).skip(skip).limit(limit).sort("created_at", -1)
     notifications_docs = await cursor.to_list(length=limit)
@@ -343,4 +326,4 @@ async def get_all_notifications_admin(
             read_at=notification.read_at
         ))
     
-    return notifications
\ No newline at end of file
+    return list_response(notifications, response)
\ No newline at end of file
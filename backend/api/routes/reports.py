@@ -1,19 +1,90 @@
 """
 API routes for managing reports
 """
-from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Request, Response
 from typing import List, Optional
 from datetime import datetime
+from pymongo import ReadPreference, ReturnDocument
+import os
 
-from database import get_reports_collection, get_users_collection
+from database import (
+    get_reports_collection, get_users_collection, run_in_transaction, routed, causal_read
+)
 from models.schemas import (
     ReportCreate, ReportResponse, ReportInDB, ReportUpdate,
-    UserInDB, ReportStatus
+    UserInDB, ReportStatus, OutboxEventType
 )
 from utils.auth import get_current_user, get_officer_or_admin_user
+from utils.outbox import record_event
+from utils.http_cache import compute_list_etag, conditional_response
+from utils.responses import list_response
+from utils.policies import (
+    report_read_filter, report_write_filter, report_stats_filter, report_read_scopes,
+    report_view_department, with_policy
+)
+from utils.workflow import (
+    OPEN_STATUSES, transition_filter, sla_fields, sla_transition_fields, queue_rank_stage
+)
+from utils.report_archive import find_archived_report, restore_report, union_with_archive
+from utils.cache import cache, cache_key, report_namespace
+from utils.coalescing import coalescer, query_key
+from utils.sharding import report_key
+
+# How long a listing page or stats summary is reused between report writes
+REPORTS_CACHE_SECONDS = float(os.getenv("REPORTS_CACHE_SECONDS", 30))
 
 router = APIRouter()
 
+async def raise_report_not_accessible(report_id: str, forbidden_detail: str):
+    """
+    Raise 404 or 403 after a policy-filtered lookup matched nothing. Only
+    this failure path pays for the extra existence check.
+    """
+    report_filter = await report_key(report_id)
+    exists = (
+        await get_reports_collection().find_one(report_filter, {"_id": 1})
+        or await find_archived_report(report_filter, {"_id": 1})
+    )
+    if not exists:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Report not found"
+        )
+    raise HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail=forbidden_detail
+    )
+
+async def raise_status_update_rejected(
+    report_id: str,
+    new_status: ReportStatus,
+    expected_version: Optional[int],
+    current_user: UserInDB
+):
+    """
+    Explain why a conditional status update matched no report
+    """
+    report_query = with_policy(await report_key(report_id), report_write_filter(current_user))
+    report_doc = (
+        await get_reports_collection().find_one(report_query, {"status": 1, "version": 1})
+        or await find_archived_report(report_query, {"status": 1, "version": 1})
+    )
+    if not report_doc:
+        await raise_report_not_accessible(
+            report_id, "You can only update reports from your department or assigned to you"
+        )
+    
+    version = report_doc.get("version", 0)
+    if expected_version is not None and version != expected_version:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Report was modified by someone else (now at version {version})"
+        )
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=f"Cannot change status from {report_doc['status']} to {new_status.value}"
+    )
+
 @router.post("/", response_model=dict, status_code=status.HTTP_201_CREATED)
 async def create_report(
     report_data: ReportCreate,
@@ -24,7 +95,10 @@ async def create_report(
     """
     reports_collection = get_reports_collection()
     
-    # Create report document
+    # Create report document, with its SLA deadline
+    now = datetime.utcnow()
+    department = report_data.department.lower()
+    priority = report_data.priority.lower()
     report = ReportInDB(
         title=report_data.title,
         description=report_data.description,
@@ -33,17 +107,42 @@ async def create_report(
         address=report_data.address,
         latitude=report_data.latitude,
         longitude=report_data.longitude,
-        priority=report_data.priority.lower(),
-        department=report_data.department.lower(),
+        priority=priority,
+        department=department,
         reporter_id=current_user.id if current_user else "anonymous",
         reporter_name=report_data.reporter_name,
         reporter_email=report_data.reporter_email,
-        reporter_phone=report_data.reporter_phone
+        reporter_phone=report_data.reporter_phone,
+        created_at=now,
+        updated_at=now,
+        **sla_fields(department, priority, now)
     )
     
-    # Insert into database
+    # Insert into database together with its outbox event
     report_dict = report.dict()
-    result = await reports_collection.insert_one(report_dict)
+
+    async def write_report(session):
+        result = await reports_collection.insert_one(report_dict, session=session)
+        await record_event(
+            OutboxEventType.REPORT_CREATED,
+            report.id,
+            {
+                "status": report.status.value,
+                "department": report.department,
+                "category": report.category,
+                "priority": report.priority,
+                "reporter_id": report.reporter_id,
+                "sla_due_at": report.sla_due_at,
+                "title": report.title,
+                "latitude": report.latitude,
+                "longitude": report.longitude,
+                "created_at": report.created_at
+            },
+            session=session
+        )
+        return result
+
+    result = await run_in_transaction(write_report)
     
     if result.inserted_id:
         return {
@@ -59,77 +158,216 @@ async def create_report(
 
 @router.get("/", response_model=List[ReportResponse])
 async def get_all_reports(
+    request: Request,
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     status_filter: Optional[str] = Query(None),
     category_filter: Optional[str] = Query(None),
     department_filter: Optional[str] = Query(None),
+    include_archived: bool = Query(False),
     current_user: UserInDB = Depends(get_current_user)
 ):
     """
     Get all reports with optional filtering and pagination
+
+    Reports finished long ago are archived and only listed with
+    ``include_archived``. Pages are served from the cache until a report
+    changes, and officers of a department opening the same page at once
+    share one query. Read from the members set by READ_PREFERENCE_LISTS.
     """
-    reports_collection = get_reports_collection()
-    
-    # Build filter query
-    filter_query = {}
-    
-    # Filter by user role
-    if current_user.user_type == "public":
-        # Public users can only see their own reports
-        filter_query["reporter_id"] = current_user.id
-    elif current_user.user_type == "officer":
-        # Officers can see reports from their department or assigned to them
-        if current_user.department:
-            filter_query["$or"] = [
-                {"department": current_user.department.lower()},
-                {"assigned_officer_id": current_user.id}
-            ]
-    # Admins can see all reports (no additional filter)
+    reports_collection = routed(get_reports_collection(), "lists")
     
     # Apply optional filters
+    filters = {}
     if status_filter:
-        filter_query["status"] = status_filter.lower()
+        filters["status"] = status_filter.lower()
     if category_filter:
-        filter_query["category"] = category_filter.lower()
+        filters["category"] = category_filter.lower()
     if department_filter:
-        filter_query["department"] = department_filter.lower()
+        filters["department"] = department_filter.lower()
+    
+    # Build filter query, restricted to the reports the user may see
+    filter_query = {**report_read_filter(current_user), **filters}
+    shared_scope, personal_scope = report_read_scopes(current_user)
+    
+    async def page_query(session=None) -> dict:
+        """
+        The query shared with colleagues, unless the user also sees
+        personal reports matching the filters
+        """
+        if personal_scope is not None:
+            personal_query = with_policy(filters, personal_scope)
+            if (
+                await reports_collection.find_one(personal_query, {"_id": 1}, session=session)
+                or include_archived and await find_archived_report(personal_query, {"_id": 1})
+            ):
+                return filter_query
+        return with_policy(filters, shared_scope)
     
-    # Query database
-    cursor = reports_collection.find(filter_query).skip(skip).limit(limit).sort("created_at", -1)
+    async def fetch_etag(query: dict, session=None) -> str:
+        return await compute_list_etag(
+            reports_collection, query, ("updated_at",), session=session,
+            skip=skip, limit=limit, include_archived=include_archived
+        )
+    
+    async def fetch_page(query: dict, session=None, etag: Optional[str] = None) -> dict:
+        # The ETag summary is computed with the page so both stay consistent
+        # (archiving changes the hot collection's summary too)
+        if etag is None:
+            etag = await fetch_etag(query, session)
+        
+        # Query database
+        if include_archived:
+            cursor = reports_collection.aggregate([
+                {"$match": query},
+                union_with_archive(query),
+                {"$sort": {"created_at": -1}},
+                {"$skip": skip},
+                {"$limit": limit}
+            ], session=session)
+        else:
+            cursor = reports_collection.find(query, session=session).skip(skip).limit(limit).sort("created_at", -1)
+        reports_docs = await cursor.to_list(length=limit)
+        
+        # Convert to response models
+        reports = []
+        for report_doc in reports_docs:
+            report = ReportInDB(**report_doc)
+            reports.append(ReportResponse(
+                id=report.id,
+                title=report.title,
+                description=report.description,
+                category=report.category,
+                location=report.location,
+                address=report.address,
+                latitude=report.latitude,
+                longitude=report.longitude,
+                created_at=report.created_at,
+                updated_at=report.updated_at,
+                status=report.status,
+                reporter_id=report.reporter_id,
+                reporter_name=report.reporter_name,
+                reporter_email=report.reporter_email,
+                reporter_phone=report.reporter_phone,
+                assigned_officer_id=report.assigned_officer_id,
+                assigned_officer_name=report.assigned_officer_name,
+                image_urls=report.image_urls,
+                priority=report.priority,
+                department=report.department,
+                estimated_resolution_time=report.estimated_resolution_time,
+                department_contact=report.department_contact,
+                updates=report.updates,
+                version=report.version,
+                sla_due_at=report.sla_due_at,
+                escalation_level=report.escalation_level,
+                duplicate_of=report.duplicate_of,
+                duplicate_count=report.duplicate_count
+            ))
+        
+        return {"etag": etag, "reports": reports}
+    
+    async def load_etag():
+        query = await page_query()
+        return await coalescer.run(
+            "report_list_etags",
+            query_key(query, sort="-created_at", skip=skip, limit=limit, include_archived=include_archived),
+            lambda: fetch_etag(query)
+        )
+    
+    async def load_page():
+        query = await page_query()
+        return await coalescer.run(
+            "report_lists",
+            query_key(query, sort="-created_at", skip=skip, limit=limit, include_archived=include_archived),
+            lambda: fetch_page(query)
+        )
+    
+    # A client revalidating its copy is answered from the ETag summary
+    # alone, before the page is read
+    revalidating = "if-none-match" in request.headers
+    # Invalidated by writes to this department's reports, if the view is one's
+    lists_namespace = report_namespace(
+        "report_lists", report_view_department(current_user, department_filter)
+    )
+    
+    async def read_page(session):
+        if session is not None:
+            # The caller's own write must show: read past it, without the
+            # cache or other requests' results
+            query = await page_query(session)
+            etag = None
+            if revalidating:
+                etag = await fetch_etag(query, session)
+                not_modified = conditional_response(request, response, etag)
+                if not_modified:
+                    return not_modified
+            return await fetch_page(query, session, etag)
+        if revalidating:
+            # Summaries are cached apart from pages, until the next report write
+            etag = await cache.get_or_load(
+                lists_namespace,
+                cache_key("etag", filter_query, skip, limit, include_archived),
+                load_etag,
+                REPORTS_CACHE_SECONDS
+            )
+            not_modified = conditional_response(request, response, etag)
+            if not_modified:
+                return not_modified
+        # Pages are cached until the next report write
+        return await cache.get_or_load(
+            lists_namespace,
+            cache_key(filter_query, skip, limit, include_archived),
+            load_page,
+            REPORTS_CACHE_SECONDS
+        )
+    
+    page = await causal_read(read_page)
+    if not isinstance(page, dict):
+        # Not modified since the client's copy
+        return page
+    
+    # Send the ETag the page was read with; a page cached before the
+    # summary may still be current for the client
+    not_modified = conditional_response(request, response, page["etag"])
+    if not_modified:
+        return not_modified
+    return list_response(page["reports"], response)
+
+@router.get("/queue", response_model=List[ReportResponse])
+async def get_work_queue(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200),
+    assigned_only: bool = Query(False),
+    current_user: UserInDB = Depends(get_officer_or_admin_user)
+):
+    """
+    Get the open reports the current officer can act on, most urgent first
+    (officers and admins only)
+
+    Urgency combines priority, age, closeness to the SLA deadline and the
+    number of duplicate reports, precomputed as queue_rank_at.
+    """
+    reports_collection = get_reports_collection()
+    
+    filter_query = {"status": {"$in": [open_status.value for open_status in OPEN_STATUSES]}}
+    if assigned_only:
+        filter_query["assigned_officer_id"] = current_user.id
+    # Officers may act on what they may read. Without reports assigned to
+    # them elsewhere, the queue is their department's, on its own shard.
+    shared_scope, personal_scope = report_read_scopes(current_user)
+    if personal_scope is not None and not await reports_collection.find_one(
+        with_policy(filter_query, personal_scope), {"_id": 1}
+    ):
+        filter_query = with_policy(filter_query, shared_scope)
+    else:
+        filter_query = with_policy(filter_query, report_write_filter(current_user))
+    
+    # Served from the (policy field, status, queue_rank_at) indexes
+    cursor = reports_collection.find(filter_query).sort("queue_rank_at", 1).skip(skip).limit(limit)
     reports_docs = await cursor.to_list(length=limit)
     
-    # Convert to response models
-    reports = []
-    for report_doc in reports_docs:
-        report = ReportInDB(**report_doc)
-        reports.append(ReportResponse(
-            id=report.id,
-            title=report.title,
-            description=report.description,
-            category=report.category,
-            location=report.location,
-            address=report.address,
-            latitude=report.latitude,
-            longitude=report.longitude,
-            created_at=report.created_at,
-            updated_at=report.updated_at,
-            status=report.status,
-            reporter_id=report.reporter_id,
-            reporter_name=report.reporter_name,
-            reporter_email=report.reporter_email,
-            reporter_phone=report.reporter_phone,
-            assigned_officer_id=report.assigned_officer_id,
-            assigned_officer_name=report.assigned_officer_name,
-            image_urls=report.image_urls,
-            priority=report.priority,
-            department=report.department,
-            estimated_resolution_time=report.estimated_resolution_time,
-            department_contact=report.department_contact,
-            updates=report.updates
-        ))
-    
-    return reports
+    return [ReportResponse(**ReportInDB(**report_doc).dict()) for report_doc in reports_docs]
 
 @router.get("/{report_id}", response_model=ReportResponse)
 async def get_report(
@@ -138,33 +376,29 @@ async def get_report(
 ):
     """
     Get a specific report by ID
+
+    Read from the members set by READ_PREFERENCE_REPORT; requests carrying
+    a write token see that write.
     """
-    reports_collection = get_reports_collection()
+    reports_collection = routed(get_reports_collection(), "report")
     
-    # Find report
-    report_doc = await reports_collection.find_one({"id": report_id})
+    # Find report, only if the user may see it
+    report_query = with_policy(await report_key(report_id), report_read_filter(current_user))
+    report_doc = await causal_read(
+        lambda session: reports_collection.find_one(report_query, session=session)
+    )
+    if not report_doc and reports_collection.read_preference != ReadPreference.PRIMARY:
+        # A lagging member may not have it yet
+        report_doc = await get_reports_collection().find_one(report_query)
     if not report_doc:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Report not found"
+        report_doc = await find_archived_report(report_query)
+    if not report_doc:
+        await raise_report_not_accessible(
+            report_id, "You can only view your own reports or those of your department"
         )
     
     report = ReportInDB(**report_doc)
     
-    # Check permissions
-    if current_user.user_type == "public" and report.reporter_id != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You can only view your own reports"
-        )
-    elif (current_user.user_type == "officer" and 
-          report.department != current_user.department.lower() and 
-          report.assigned_officer_id != current_user.id):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You can only view reports from your department or assigned to you"
-        )
-    
     return ReportResponse(
         id=report.id,
         title=report.title,
@@ -188,7 +422,12 @@ async def get_report(
         department=report.department,
         estimated_resolution_time=report.estimated_resolution_time,
         department_contact=report.department_contact,
-        updates=report.updates
+        updates=report.updates,
+        version=report.version,
+        sla_due_at=report.sla_due_at,
+        escalation_level=report.escalation_level,
+        duplicate_of=report.duplicate_of,
+        duplicate_count=report.duplicate_count
     )
 
 @router.put("/{report_id}/status")
@@ -196,32 +435,17 @@ async def update_report_status(
     report_id: str,
     new_status: ReportStatus,
     update_message: str = "",
+    expected_version: Optional[int] = Query(None, ge=0),
     current_user: UserInDB = Depends(get_officer_or_admin_user)
 ):
     """
     Update report status (officers and admins only)
+
+    Pass ``expected_version`` (the report's ``version`` as last read) to
+    have the update rejected with 409 if someone else changed it since.
     """
     reports_collection = get_reports_collection()
     
-    # Find report
-    report_doc = await reports_collection.find_one({"id": report_id})
-    if not report_doc:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Report not found"
-        )
-    
-    report = ReportInDB(**report_doc)
-    
-    # Check permissions for officers
-    if (current_user.user_type == "officer" and 
-        report.department != current_user.department.lower() and 
-        report.assigned_officer_id != current_user.id):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You can only update reports from your department or assigned to you"
-        )
-    
     # Create update record
     update_record = ReportUpdate(
         message=update_message or f"Status changed to {new_status.value}",
@@ -230,36 +454,87 @@ async def update_report_status(
         updated_by_name=current_user.name
     )
     
-    # Update report
-    update_data = {
+    # Update report; user input goes through $literal so a leading "$" is
+    # never read as a field path
+    now = datetime.utcnow()
+    set_fields = {
+        "previous_status": "$status",
+        "previous_assigned_officer_id": {"$ifNull": ["$assigned_officer_id", None]},
         "status": new_status.value,
-        "updated_at": datetime.utcnow(),
-        "$push": {"updates": update_record.dict()}
+        "updated_at": now,
+        "version": {"$add": [{"$ifNull": ["$version", 0]}, 1]},
+        "updates": {
+            "$concatArrays": [
+                {"$ifNull": ["$updates", []]},
+                [{"$literal": update_record.dict()}]
+            ]
+        }
     }
     
     # If assigning, set officer information
     if new_status in [ReportStatus.IN_PROGRESS, ReportStatus.RESOLVE_SOON]:
-        update_data.update({
-            "assigned_officer_id": current_user.id,
-            "assigned_officer_name": current_user.name
+        set_fields.update({
+            "assigned_officer_id": {"$literal": current_user.id},
+            "assigned_officer_name": {"$literal": current_user.name}
         })
     
-    result = await reports_collection.update_one(
-        {"id": report_id},
-        update_data
+    # Stop the SLA timer on close, restart it on reopen
+    set_fields.update(sla_transition_fields(new_status, now))
+    
+    # Permission, allowed transition and version are all part of the filter,
+    # so the check and the write are one atomic operation
+    update_filter = with_policy(
+        {**await report_key(report_id), **transition_filter(new_status, expected_version)},
+        report_write_filter(current_user)
     )
     
-    if result.modified_count:
-        return {
-            "message": "Report status updated successfully",
-            "new_status": new_status.value,
-            "updated_by": current_user.name
-        }
-    else:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to update report status"
+    async def write_status(session):
+        report_doc = await reports_collection.find_one_and_update(
+            update_filter,
+            [{"$set": set_fields}, queue_rank_stage()],
+            return_document=ReturnDocument.AFTER,
+            session=session
         )
+        if report_doc:
+            report = ReportInDB(**report_doc)
+            await record_event(
+                OutboxEventType.REPORT_STATUS_CHANGED,
+                report_id,
+                {
+                    "old_status": report.previous_status.value,
+                    "new_status": new_status.value,
+                    "department": report.department,
+                    "priority": report.priority,
+                    "reporter_id": report.reporter_id,
+                    "updated_by": current_user.id,
+                    "message": update_record.message,
+                    "version": report.version,
+                    "assigned_officer_id": report.assigned_officer_id,
+                    "previous_assigned_officer_id": report.previous_assigned_officer_id,
+                    "category": report.category,
+                    "created_at": report.created_at,
+                    "latitude": report.latitude,
+                    "longitude": report.longitude
+                },
+                session=session
+            )
+        return report_doc
+    
+    report_doc = await run_in_transaction(write_status)
+    if not report_doc and await restore_report(update_filter):
+        # Reopening an archived report brings it back first
+        report_doc = await run_in_transaction(write_status)
+    if not report_doc:
+        await raise_status_update_rejected(report_id, new_status, expected_version, current_user)
+    
+    report = ReportInDB(**report_doc)
+    return {
+        "message": "Report status updated successfully",
+        "previous_status": report.previous_status.value,
+        "new_status": report.status.value,
+        "version": report.version,
+        "updated_by": current_user.name
+    }
 
 @router.get("/stats/summary")
 async def get_report_stats(
@@ -267,43 +542,69 @@ async def get_report_stats(
 ):
     """
     Get report statistics summary (officers and admins only)
+
+    Read from the members set by READ_PREFERENCE_STATS.
     """
-    reports_collection = get_reports_collection()
+    reports_collection = routed(get_reports_collection(), "stats")
     
-    # Build base filter for user role
-    base_filter = {}
-    if current_user.user_type == "officer" and current_user.department:
-        base_filter["department"] = current_user.department.lower()
-    
-    # Aggregate statistics
-    pipeline = [
-        {"$match": base_filter},
-        {
-            "$group": {
-                "_id": "$status",
-                "count": {"$sum": 1}
+    # Build base filter for user role: an officer's department, shared by
+    # every officer of it
+    base_filter = report_stats_filter(current_user)
+    
+    async def count_by_status(match: dict, session=None) -> list:
+        # Aggregate statistics
+        pipeline = [
+            {"$match": match},
+            union_with_archive(match),
+            {"$project": {"status": 1}},
+            {
+                "$group": {
+                    "_id": "$status",
+                    "count": {"$sum": 1}
+                }
             }
-        }
-    ]
-    
-    stats_cursor = reports_collection.aggregate(pipeline)
-    stats_result = await stats_cursor.to_list(length=None)
-    
-    # Process results
-    stats = {
-        "total": 0,
-        "submitted": 0,
-        "in_progress": 0,
-        "done": 0,
-        "rejected": 0
-    }
+        ]
+        
+        stats_cursor = reports_collection.aggregate(pipeline, session=session)
+        return await stats_cursor.to_list(length=None)
     
-    for stat in stats_result:
-        status = stat["_id"]
-        count = stat["count"]
-        stats["total"] += count
+    async def load_stats(session=None):
+        if session is None:
+            stats_result = await coalescer.run(
+                "report_stats", query_key(base_filter), lambda: count_by_status(base_filter)
+            )
+        else:
+            stats_result = await count_by_status(base_filter, session)
+        
+        # Process results
+        stats = {
+            "total": 0,
+            "submitted": 0,
+            "in_progress": 0,
+            "done": 0,
+            "rejected": 0
+        }
         
-        if status in stats:
-            stats[status] = count
+        for stat in stats_result:
+            status = stat["_id"]
+            count = stat["count"]
+            stats["total"] += count
+            
+            if status in stats:
+                stats[status] += count
+        
+        return stats
+    
+    async def read_stats(session):
+        if session is not None:
+            # Counts including the caller's own write
+            return await load_stats(session)
+        # Shared by every user with the same view, until the next report write
+        return await cache.get_or_load(
+            report_namespace("report_stats", report_view_department(current_user)),
+            cache_key(base_filter),
+            load_stats,
+            REPORTS_CACHE_SECONDS
+        )
     
-    return stats
\ No newline at end of file
+    return await causal_read(read_stats)
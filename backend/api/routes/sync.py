@@ -0,0 +1,106 @@
+"""
+API routes for delta sync of offline-first clients
+"""
+from fastapi import APIRouter, Depends, Query
+from typing import Optional
+from datetime import datetime
+
+from database import (
+    get_reports_collection,
+    get_notifications_collection,
+    get_tombstones_collection
+)
+from models.schemas import (
+    ReportInDB, ReportResponse, NotificationInDB, NotificationResponse,
+    UserInDB, UserResponse, SyncResponse, SyncDeleted
+)
+from utils.auth import get_current_user_from_db
+from utils.sync import (
+    SYNC_FEEDS, decode_sync_token, encode_sync_token, caught_up_cursor,
+    token_expired, read_feed
+)
+from utils.policies import report_read_filter, notification_read_filter
+
+router = APIRouter()
+
+@router.get("/", response_model=SyncResponse)
+async def sync_changes(
+    since: Optional[str] = Query(None, description="Token from the previous sync"),
+    limit: int = Query(200, ge=1, le=1000),
+    current_user: UserInDB = Depends(get_current_user_from_db)
+):
+    """
+    Get reports, notifications and profile changes since the last sync.
+
+    Without a token (or with one older than the tombstone retention) every
+    visible item is returned and ``reset`` tells the client to drop its local
+    copy first. When ``has_more`` is set the client should call again
+    straight away with the returned token.
+
+    Only deletions produce tombstones. Reports that leave the user's view
+    otherwise (archived as long finished, or reassigned away from an
+    officer outside their department) are not reported, and the client
+    keeps its last copy of them until the next reset.
+    """
+    synced_at = datetime.utcnow()
+    position = decode_sync_token(since)
+    reset = position is None or token_expired(position)
+    if reset:
+        position = {feed: None for feed in SYNC_FEEDS}
+        position["profile"] = None
+
+    # Reports and notifications changed since the client's cursors
+    reports_docs, reports_cursor = await read_feed(
+        get_reports_collection(),
+        report_read_filter(current_user),
+        position["reports"],
+        limit
+    )
+    notifications_docs, notifications_cursor = await read_feed(
+        get_notifications_collection(),
+        notification_read_filter(current_user),
+        position["notifications"],
+        limit
+    )
+
+    # Deletions, skipped on a reset since the client starts from scratch
+    deleted = SyncDeleted()
+    deleted_cursor = None
+    if not reset:
+        tombstones_docs, deleted_cursor = await read_feed(
+            get_tombstones_collection(),
+            notification_read_filter(current_user),
+            position["deleted"],
+            limit,
+            ts_field="deleted_at"
+        )
+        for tombstone_doc in tombstones_docs:
+            ids = getattr(deleted, tombstone_doc["collection"], None)
+            if ids is not None:
+                ids.append(tombstone_doc["doc_id"])
+
+    # Profile, only when it changed
+    profile = None
+    profile_changed_at = current_user.updated_at or current_user.created_at
+    if position["profile"] is None or profile_changed_at >= position["profile"]:
+        profile = UserResponse(**current_user.dict())
+
+    next_position = {
+        "reports": reports_cursor or caught_up_cursor(synced_at),
+        "notifications": notifications_cursor or caught_up_cursor(synced_at),
+        "deleted": deleted_cursor or caught_up_cursor(synced_at),
+        "profile": caught_up_cursor(synced_at)[0]
+    }
+
+    return SyncResponse(
+        token=encode_sync_token(next_position),
+        reset=reset,
+        has_more=any([reports_cursor, notifications_cursor, deleted_cursor]),
+        reports=[ReportResponse(**ReportInDB(**doc).dict()) for doc in reports_docs],
+        notifications=[
+            NotificationResponse(**NotificationInDB(**doc).dict())
+            for doc in notifications_docs
+        ],
+        profile=profile,
+        deleted=deleted
+    )
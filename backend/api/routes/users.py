@@ -15,7 +15,8 @@ from models.schemas import (
     RegistrationRequestResponse, RegistrationRequestInDB, RegistrationStatus,
     PasswordResetRequestCreate, PasswordResetRequestResponse, PasswordResetRequestInDB
 )
-from utils.auth import get_current_user, get_admin_user, get_password_hash
+from utils.auth import get_current_user, get_admin_user, get_password_hash, revoke_user_tokens
+from utils.sessions import revoke_all_sessions
 
 router = APIRouter()
 
@@ -120,6 +121,9 @@ async def activate_user(
             detail="User not found"
         )
     
+    # Tokens issued while inactive carry is_active=False
+    await revoke_user_tokens(user_id, "activated")
+    
     return {"message": "User activated successfully"}
 
 @router.put("/{user_id}/deactivate")
@@ -143,6 +147,9 @@ async def deactivate_user(
             detail="User not found"
         )
     
+    await revoke_user_tokens(user_id, "deactivated")
+    await revoke_all_sessions(user_id, "deactivated")
+    
     return {"message": "User deactivated successfully"}
 
 # Registration Requests Management
@@ -369,10 +376,14 @@ async def approve_password_reset(
     request = PasswordResetRequestInDB(**request_doc)
     
     # Update user's password
-    await users_collection.update_one(
+    user_doc = await users_collection.find_one_and_update(
         {"email": request.email},
-        {"$set": {"password_hash": request.new_password_hash}}
+        {"$set": {"password_hash": request.new_password_hash, "updated_at": datetime.utcnow()}},
+        projection={"id": 1}
     )
+    if user_doc:
+        await revoke_user_tokens(user_doc["id"], "password_reset")
+        await revoke_all_sessions(user_doc["id"], "password_reset")
     
     # Update the request status
     await password_reset_requests_collection.update_one(
@@ -1,13 +1,41 @@
 import os
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
 # Import database connection functions
-from database.mongodb import connect_to_mongodb, close_mongodb_connection
+from database.mongodb import connect_to_mongodb, close_mongodb_connection, for_each_tenant
+from utils.responses import FastJSONResponse
+from utils.outbox import outbox_relay, ensure_outbox_indexes, OUTBOX_RELAY_ENABLED
+from utils.sync import ensure_sync_indexes
+from utils.rate_limit import RateLimitMiddleware, ensure_rate_limit_indexes, RATE_LIMIT_ENABLED
+from utils.load_shedding import LoadSheddingMiddleware, load_monitor, LOAD_SHEDDING_ENABLED
+from utils.auth import AUTH_STATELESS
+from utils.cache import cache, CACHE_ENABLED
+from utils.coalescing import coalescer
+from utils.consistency import CausalConsistencyMiddleware
+from utils.sharding import ShardCheckMiddleware, scatter_gather_checker, SHARD_CHECK_ENABLED
+from utils.tenancy import TenantMiddleware, tenant_limiter
+from utils.loop_monitor import LoopMonitorMiddleware, loop_monitor, LOOP_MONITOR_ENABLED
+from utils.revocation import revocation_list
+from utils.sessions import ensure_session_indexes
+from utils.login_guard import login_guard
+from utils.workflow import ensure_workflow_indexes
+from utils.sla_monitor import sla_monitor, SLA_MONITOR_ENABLED
+from utils.routing import ensure_routing_indexes
+from utils.work_queue import ensure_queue_indexes
+from utils.analytics import ensure_analytics_indexes
+from utils.columnar_export import columnar_exporter, COLUMNAR_EXPORT_ENABLED
+from utils.hotspots import hotspot_job, ensure_hotspot_indexes, HOTSPOTS_ENABLED
+from utils.report_archive import report_archiver, ensure_report_archive_indexes, REPORT_ARCHIVE_ENABLED
+from utils.notification_retention import (
+    notification_retention, ensure_notification_retention_indexes, NOTIFICATION_RETENTION_ENABLED
+)
+import utils.report_events  # registers outbox consumers
 
 # Import API routers with error handling
 try:
@@ -38,12 +66,34 @@ except Exception as e:
     print(f"❌ Failed to import notifications router: {e}")
     notifications_router = None
 
+try:
+    from api.routes.sync import router as sync_router
+    print("✅ Sync router imported successfully")
+except Exception as e:
+    print(f"❌ Failed to import sync router: {e}")
+    sync_router = None
+
+try:
+    from api.routes.analytics import router as analytics_router
+    print("✅ Analytics router imported successfully")
+except Exception as e:
+    print(f"❌ Failed to import analytics router: {e}")
+    analytics_router = None
+
+try:
+    from api.routes.diagnostics import router as diagnostics_router
+    print("✅ Diagnostics router imported successfully")
+except Exception as e:
+    print(f"❌ Failed to import diagnostics router: {e}")
+    diagnostics_router = None
+
 app = FastAPI(
     title="CivicReporter API",
     description="Civic Welfare Reporting System - MongoDB Backend",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=FastJSONResponse
 )
 
 # CORS configuration for production
@@ -56,27 +106,112 @@ origins = [
     "*"  # Allow all origins for development
 ]
 
+# Protection against clients hammering the API. Added before CORS so CORS
+# wraps them and 429/503 responses still carry CORS headers.
+if RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware)
+if LOAD_SHEDDING_ENABLED:
+    app.add_middleware(LoadSheddingMiddleware)
+
+# Write tokens for read-your-writes on replica reads
+app.add_middleware(CausalConsistencyMiddleware)
+
+# Attribution of scatter-gather queries to routes
+if SHARD_CHECK_ENABLED:
+    app.add_middleware(ShardCheckMiddleware)
+
+# Tenant of each request, current for everything inside it
+app.add_middleware(TenantMiddleware)
+
+# Routes of requests blocking the event loop
+if LOOP_MONITOR_ENABLED:
+    app.add_middleware(LoopMonitorMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Retry-After", "X-Read-After"],
 )
 
+# Response compression - Brotli when brotli-asgi is installed, GZip otherwise.
+# Small bodies are sent as-is, compressing them costs more than it saves.
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", 1024))
+try:
+    from brotli_asgi import BrotliMiddleware
+    app.add_middleware(
+        BrotliMiddleware,
+        quality=4,
+        minimum_size=COMPRESSION_MINIMUM_SIZE,
+        gzip_fallback=True
+    )
+    print("✅ Brotli/GZip response compression enabled")
+except ImportError:
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESSION_MINIMUM_SIZE)
+    print("✅ GZip response compression enabled")
+
 # Database events
+async def ensure_indexes():
+    await ensure_outbox_indexes()
+    await ensure_sync_indexes()
+    await ensure_rate_limit_indexes()
+    await ensure_session_indexes()
+    await login_guard.ensure_indexes()
+    await ensure_workflow_indexes()
+    await ensure_routing_indexes()
+    await ensure_queue_indexes()
+    await ensure_analytics_indexes()
+    await ensure_hotspot_indexes()
+    await ensure_notification_retention_indexes()
+    await ensure_report_archive_indexes()
+
 @app.on_event("startup")
 async def startup_db_client():
     await connect_to_mongodb()
     print("✅ Database connected successfully")
+    await for_each_tenant(ensure_indexes)
+    await load_monitor.start()
+    if LOOP_MONITOR_ENABLED:
+        await loop_monitor.start()
+    if CACHE_ENABLED:
+        await cache.start()
+    if AUTH_STATELESS:
+        await revocation_list.start()
+    if OUTBOX_RELAY_ENABLED:
+        await outbox_relay.start()
+    if SLA_MONITOR_ENABLED:
+        await sla_monitor.start()
+    if COLUMNAR_EXPORT_ENABLED:
+        await columnar_exporter.start()
+    if HOTSPOTS_ENABLED:
+        await hotspot_job.start()
+    if NOTIFICATION_RETENTION_ENABLED:
+        await notification_retention.start()
+    if REPORT_ARCHIVE_ENABLED:
+        await report_archiver.start()
     print("🔗 API Routes registered:")
     print("   - /api/auth/* (Authentication)")
     print("   - /api/users/* (Users)")
     print("   - /api/reports/* (Reports)")
     print("   - /api/notifications/* (Notifications)")
+    print("   - /api/sync (Delta sync)")
+    print("   - /api/analytics/* (Analytics)")
+    print("   - /api/diagnostics/* (Diagnostics)")
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await report_archiver.stop()
+    await notification_retention.stop()
+    await hotspot_job.stop()
+    await columnar_exporter.stop()
+    await sla_monitor.stop()
+    await outbox_relay.stop()
+    await load_monitor.stop()
+    await loop_monitor.stop()
+    await cache.stop()
+    await revocation_list.stop()
     await close_mongodb_connection()
 
 # Include API routers with safety checks
@@ -96,6 +231,18 @@ if notifications_router:
     app.include_router(notifications_router, prefix="/api/notifications", tags=["Notifications"])
     print("✅ Notifications routes registered: /api/notifications/*")
 
+if sync_router:
+    app.include_router(sync_router, prefix="/api/sync", tags=["Sync"])
+    print("✅ Sync routes registered: /api/sync")
+
+if analytics_router:
+    app.include_router(analytics_router, prefix="/api/analytics", tags=["Analytics"])
+    print("✅ Analytics routes registered: /api/analytics/*")
+
+if diagnostics_router:
+    app.include_router(diagnostics_router, prefix="/api/diagnostics", tags=["Diagnostics"])
+    print("✅ Diagnostics routes registered: /api/diagnostics/*")
+
 @app.get("/")
 async def root():
     return {
@@ -113,7 +260,13 @@ async def health_check():
         "status": "healthy", 
         "service": "CivicReporter API",
         "database": "MongoDB Atlas Connected",
-        "environment": os.getenv("ENVIRONMENT", "production")
+        "environment": os.getenv("ENVIRONMENT", "production"),
+        "load": load_monitor.stats(),
+        "cache": cache.stats(),
+        "coalescing": coalescer.stats(),
+        "sharding": scatter_gather_checker.stats(),
+        "tenants": tenant_limiter.stats(),
+        "loop": loop_monitor.stats()
     }
 
 @app.get("/healthz")
@@ -0,0 +1,119 @@
+"""
+Micro-benchmark for JSON encoding of report/notification list responses
+
+Compares the encode paths a list endpoint can take:
+  - jsonable_encoder + json.dumps   (FastAPI routes without a response_model)
+  - pydantic JSON-mode dump + json  (FastAPI default JSONResponse)
+  - pydantic JSON-mode dump + orjson (routes returning data with a response_model)
+  - orjson on model_dump()          (FastJSONResponse on models directly)
+  - list_response()                 (hot list routes: the above, as a response)
+
+Usage:
+    python benchmark_json_encoding.py [rows] [repeat]
+"""
+import json
+import sys
+import timeit
+from datetime import datetime, timedelta
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from models.schemas import (
+    ReportResponse, ReportUpdate, ReportStatus,
+    NotificationResponse, NotificationType
+)
+from utils.responses import dumps, list_response, orjson
+
+def make_reports(rows: int) -> List[ReportResponse]:
+    """Build report payloads shaped like production data"""
+    now = datetime.utcnow()
+    reports = []
+    for i in range(rows):
+        created = now - timedelta(hours=i)
+        reports.append(ReportResponse(
+            id=f"report-{i:06d}",
+            title=f"Overflowing drain near block {i % 40}",
+            description="Water has been stagnant for three days and is spreading onto the road. " * 2,
+            category="drainage",
+            location=f"Ward {i % 12}",
+            address=f"{i} Main Street, Sector {i % 9}",
+            latitude=13.08 + (i % 100) * 0.001,
+            longitude=80.27 + (i % 100) * 0.001,
+            created_at=created,
+            updated_at=created + timedelta(minutes=30),
+            status=ReportStatus.IN_PROGRESS if i % 3 else ReportStatus.SUBMITTED,
+            reporter_id=f"user-{i % 500}",
+            reporter_name="Citizen Reporter",
+            reporter_email=f"citizen{i % 500}@example.com",
+            reporter_phone="+91 90000 00000",
+            assigned_officer_id="officer-1" if i % 3 else None,
+            assigned_officer_name="Drainage Officer" if i % 3 else None,
+            image_urls=[f"https://cdn.example.com/reports/{i}/1.jpg"],
+            priority="high" if i % 5 == 0 else "medium",
+            department="drainage",
+            department_contact={"phone": "1913", "email": "drainage@city.gov"},
+            updates=[
+                ReportUpdate(
+                    message="Status changed to inProgress",
+                    status=ReportStatus.IN_PROGRESS,
+                    updated_by="officer-1",
+                    updated_by_name="Drainage Officer",
+                    created_at=created + timedelta(minutes=30)
+                )
+            ] if i % 3 else []
+        ))
+    return reports
+
+def make_notifications(rows: int) -> List[NotificationResponse]:
+    now = datetime.utcnow()
+    return [
+        NotificationResponse(
+            id=f"notification-{i:06d}",
+            title="Report status updated",
+            message="Your report is now inProgress",
+            type=NotificationType.STATUS_UPDATE,
+            user_id=f"user-{i % 500}",
+            issue_id=f"report-{i:06d}",
+            data={"old_status": "submitted", "new_status": "inProgress"},
+            is_read=bool(i % 2),
+            created_at=now - timedelta(minutes=i),
+            read_at=now if i % 2 else None
+        )
+        for i in range(rows)
+    ]
+
+def run(name: str, items: list, model, repeat: int):
+    adapter = TypeAdapter(List[model])
+    candidates = {
+        "jsonable_encoder + json": lambda: json.dumps(jsonable_encoder(items)).encode("utf-8"),
+        "pydantic json-mode + json": lambda: json.dumps(
+            adapter.dump_python(items, mode="json")
+        ).encode("utf-8"),
+        "pydantic json-mode + FastJSON": lambda: dumps(adapter.dump_python(items, mode="json")),
+        "model_dump + FastJSON": lambda: dumps([item.model_dump() for item in items]),
+        "list_response": lambda: list_response(items).body,
+    }
+
+    print(f"\n📊 {name}: {len(items)} rows, best of {repeat}")
+    baseline = None
+    for label, encode in candidates.items():
+        best = min(timeit.repeat(encode, number=1, repeat=repeat))
+        baseline = baseline or best
+        size_kb = len(encode()) / 1024
+        print(f"   {label:<32} {best * 1000:8.2f} ms  "
+              f"{len(items) / best:>10,.0f} rows/s  {baseline / best:5.1f}x  ({size_kb:,.0f} KB)")
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    if orjson is None:
+        print("⚠️  orjson is not installed - FastJSON rows use the stdlib fallback")
+
+    run("ReportResponse", make_reports(rows), ReportResponse, repeat)
+    run("NotificationResponse", make_notifications(rows), NotificationResponse, repeat)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark of tenant isolation under a noisy tenant
+
+Two tenants share one worker and one connection pool. The noisy tenant
+keeps many requests in flight; the quiet one sends a few at a time. Each
+request holds a pool connection for the query time, as a list endpoint
+does. The run is repeated without and with a per-tenant concurrency limit
+(TenantMiddleware, see utils/tenancy.py), printing the quiet tenant's
+latency and both tenants' throughput and rejections.
+
+The pool is modelled by a semaphore of --pool connections, so the numbers
+show queueing for connections, not MongoDB itself.
+
+Usage:
+    python benchmark_tenants.py [--pool 20] [--limit 10] [--noisy 200] [--quiet 4]
+                                [--query-ms 20] [--seconds 5]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ.setdefault("TENANTS", "noisy,quiet")
+
+from utils.tenancy import TenantLimiter, TenantMiddleware
+
+def pool_app(pool: asyncio.Semaphore, query_seconds: float):
+    """ASGI app answering after holding a pool connection for one query"""
+    async def app(scope, receive, send):
+        async with pool:
+            await asyncio.sleep(query_seconds)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"[]"})
+    return app
+
+async def request(app, tenant: str) -> int:
+    scope = {
+        "type": "http", "method": "GET", "path": "/api/reports/",
+        "headers": [(b"x-tenant", tenant.encode("latin-1"))]
+    }
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+async def client(app, tenant: str, deadline: float, latencies: list, statuses: dict):
+    while time.monotonic() < deadline:
+        start = time.monotonic()
+        status = await request(app, tenant)
+        statuses[status] = statuses.get(status, 0) + 1
+        if status == 200:
+            latencies.append((time.monotonic() - start) * 1000)
+        else:
+            # A rejected client backs off as Retry-After asks, scaled down
+            await asyncio.sleep(0.05)
+
+async def run(args, limit: int) -> dict:
+    pool = asyncio.Semaphore(args.pool)
+    app = TenantMiddleware(
+        pool_app(pool, args.query_ms / 1000),
+        limiter=TenantLimiter(max_concurrent=limit, queue_timeout=1.0)
+    )
+    deadline = time.monotonic() + args.seconds
+    results = {tenant: {"latencies": [], "statuses": {}} for tenant in ("noisy", "quiet")}
+    await asyncio.gather(*(
+        client(app, tenant, deadline, results[tenant]["latencies"], results[tenant]["statuses"])
+        for tenant, clients in (("noisy", args.noisy), ("quiet", args.quiet))
+        for _ in range(clients)
+    ))
+    return results
+
+def report(label: str, results: dict, seconds: float):
+    print(f"\n{label}")
+    print(f"{'tenant':<8}{'req/s':>9}{'503':>8}{'p50 ms':>9}{'p99 ms':>9}")
+    for tenant, result in results.items():
+        latencies = sorted(result["latencies"])
+        p50 = statistics.median(latencies) if latencies else float("nan")
+        p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else float("nan")
+        print(f"{tenant:<8}{len(latencies) / seconds:>9.0f}{result['statuses'].get(503, 0):>8}"
+              f"{p50:>9.1f}{p99:>9.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pool", type=int, default=20, help="connections in the shared pool")
+    parser.add_argument("--limit", type=int, default=10, help="requests in flight per tenant")
+    parser.add_argument("--noisy", type=int, default=200, help="concurrent noisy clients")
+    parser.add_argument("--quiet", type=int, default=4, help="concurrent quiet clients")
+    parser.add_argument("--query-ms", type=float, default=20, help="time a query holds a connection")
+    parser.add_argument("--seconds", type=float, default=5, help="duration of each run")
+    args = parser.parse_args()
+
+    print(f"🏙️  Pool of {args.pool}, {args.noisy} noisy and {args.quiet} quiet clients, "
+          f"{args.query_ms:.0f}ms queries")
+    report("Shared pool, no tenant limit", asyncio.run(run(args, 0)), args.seconds)
+    report(f"Limit of {args.limit} requests per tenant", asyncio.run(run(args, args.limit)), args.seconds)
+
+if __name__ == "__main__":
+    main()
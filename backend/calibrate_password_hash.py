@@ -0,0 +1,66 @@
+"""
+Password hash cost calibration
+
+Measures verify time on this machine for each supported scheme and picks
+the highest cost whose median verify time stays within the target, so
+login CPU is predictable. Prints the environment settings to use.
+
+Usage:
+    python calibrate_password_hash.py [target_ms] [samples]
+"""
+import statistics
+import sys
+import time
+
+from utils import passwords
+
+def median_verify_ms(scheme: str, cost: int, samples: int) -> float:
+    """Median time to verify a password hashed at ``cost``"""
+    hashed = passwords.hash_password("calibration-password", scheme=scheme, cost=cost)
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        passwords.verify_password("calibration-password", hashed)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def calibrate(scheme: str, costs, target_ms: float, samples: int):
+    """Return (cost, ms) for the highest cost within ``target_ms``"""
+    best = None
+    for cost in costs:
+        elapsed = median_verify_ms(scheme, cost, samples)
+        print(f"   {scheme:<14} cost {cost:>8}: {elapsed:8.1f} ms")
+        if elapsed > target_ms:
+            break
+        best = (cost, elapsed)
+    return best
+
+def main():
+    target_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 250
+    samples = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    print(f"🔐 Calibrating password hashing for a {target_ms:.0f} ms verify target")
+    results = {}
+
+    if passwords.bcrypt is not None:
+        results[passwords.BCRYPT] = calibrate(passwords.BCRYPT, range(8, 17), target_ms, samples)
+    else:
+        print("⚠️  bcrypt is not installed, skipping bcrypt")
+
+    pbkdf2_costs = [25000 * 2 ** i for i in range(10)]
+    results[passwords.PBKDF2_SHA256] = calibrate(
+        passwords.PBKDF2_SHA256, pbkdf2_costs, target_ms, samples
+    )
+
+    print("\n📋 Suggested settings:")
+    for scheme, best in results.items():
+        if best is None:
+            print(f"   {scheme}: even the lowest cost exceeds the target")
+            continue
+        cost, elapsed = best
+        setting = "PASSWORD_BCRYPT_ROUNDS" if scheme == passwords.BCRYPT else "PASSWORD_PBKDF2_ITERATIONS"
+        print(f"   PASSWORD_HASH_SCHEME={scheme} {setting}={cost}   (~{elapsed:.0f} ms per verify)")
+    print("\nExisting hashes move to the new cost on each user's next login.")
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,42 @@ from .mongodb import (
     connect_to_mongodb,
     close_mongodb_connection,
     get_database,
+    get_client,
+    TENANTS,
+    MULTI_TENANT,
+    DEFAULT_TENANT,
+    current_tenant,
+    set_current_tenant,
+    tenant_scope,
+    for_each_tenant,
+    run_in_transaction,
+    read_preference,
+    READ_MAX_STALENESS_SECONDS,
+    routed,
+    begin_causal_scope,
+    causal_token,
+    causal_session,
+    causal_read,
+    register_event_listener,
     get_users_collection,
     get_reports_collection,
+    get_reports_archive_collection,
     get_notifications_collection,
+    get_notifications_archive_collection,
     get_registration_requests_collection,
     get_password_reset_requests_collection,
-    get_need_requests_collection
+    get_need_requests_collection,
+    get_outbox_collection,
+    get_outbox_checkpoints_collection,
+    get_outbox_dead_letters_collection,
+    get_counters_collection,
+    get_tombstones_collection,
+    get_rate_limits_collection,
+    get_revocations_collection,
+    get_sessions_collection,
+    get_login_failures_collection,
+    get_officer_workloads_collection,
+    get_report_rollups_collection,
+    get_hotspots_collection,
+    get_cache_invalidations_collection
 )
\ No newline at end of file
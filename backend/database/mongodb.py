@@ -4,9 +4,16 @@ Supports switching between local development and cloud production databases
 """
 from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo import MongoClient
+from pymongo.errors import OperationFailure
+from pymongo.read_preferences import (
+    Primary, PrimaryPreferred, Secondary, SecondaryPreferred, Nearest
+)
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
 import os
+import re
 from dotenv import load_dotenv
-from typing import Optional
+from typing import Any, Awaitable, Callable, Dict, Optional
 
 load_dotenv()
 
@@ -23,46 +30,315 @@ else:
     DATABASE_NAME = os.getenv("DATABASE_NAME", "civic_welfare")
     print(f"🚀 Running in PRODUCTION mode - Using CLOUD MongoDB Atlas")
 
-print(f"📊 Database: {DATABASE_NAME}")
-print(f"🔗 Connection: {MONGODB_URL.split('@')[0] + '@***' if '@' in MONGODB_URL else MONGODB_URL}")
+# Multi-document transactions need a replica set (Atlas always is one).
+# Set MONGODB_TRANSACTIONS=false for a standalone local mongod.
+USE_TRANSACTIONS = os.getenv("MONGODB_TRANSACTIONS", "true").lower() == "true"
 
-# Global database client instance
-client: Optional[AsyncIOMotorClient] = None
-database = None
+# Read preference per kind of read. Non-primary reads skip members lagging
+# more than READ_MAX_STALENESS_SECONDS (90 at least)
+READ_MAX_STALENESS_SECONDS = int(os.getenv("READ_MAX_STALENESS_SECONDS", 90))
+READ_PREFERENCES = {
+    "lists": os.getenv("READ_PREFERENCE_LISTS", "secondaryPreferred"),
+    "stats": os.getenv("READ_PREFERENCE_STATS", "secondaryPreferred"),
+    "exports": os.getenv("READ_PREFERENCE_EXPORTS", "secondaryPreferred"),
+    "report": os.getenv("READ_PREFERENCE_REPORT", "primary")
+}
+
+# Connections per client (cluster), shared by the tenants it serves
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", 100))
+
+def _mask(url: str) -> str:
+    return url.split('@')[0] + '@***' if '@' in url else url
+
+# Tenants (municipalities) served by this deployment, e.g.
+# TENANTS=chennai,madurai. Each tenant has its own database,
+# <DATABASE_NAME>_<tenant> unless TENANT_<TENANT>_DATABASE_NAME is set, on
+# MONGODB_URL unless TENANT_<TENANT>_MONGODB_URL is set. Without TENANTS a
+# single tenant, "default", uses DATABASE_NAME.
+TENANT_NAMES = [name.strip() for name in os.getenv("TENANTS", "").split(",") if name.strip()]
+MULTI_TENANT = bool(TENANT_NAMES)
+TENANTS: Dict[str, Dict[str, str]] = {}
+for _name in TENANT_NAMES:
+    if not re.fullmatch(r"[a-z0-9][a-z0-9_-]*", _name):
+        raise ValueError(f"Invalid tenant name {_name!r}: use lowercase letters, digits, - and _")
+    _env = _name.upper().replace("-", "_")
+    TENANTS[_name] = {
+        "url": os.getenv(f"TENANT_{_env}_MONGODB_URL", MONGODB_URL),
+        "database": os.getenv(f"TENANT_{_env}_DATABASE_NAME", f"{DATABASE_NAME}_{_name}")
+    }
+if not TENANTS:
+    TENANTS["default"] = {"url": MONGODB_URL, "database": DATABASE_NAME}
+# Tenant of requests that name none; empty to require one on every request
+DEFAULT_TENANT = os.getenv("DEFAULT_TENANT", next(iter(TENANTS)))
+if DEFAULT_TENANT and DEFAULT_TENANT not in TENANTS:
+    raise ValueError(f"DEFAULT_TENANT {DEFAULT_TENANT!r} is not one of TENANTS")
+
+if MULTI_TENANT:
+    for _name, _tenant in TENANTS.items():
+        print(f"🏙️  Tenant {_name}: {_tenant['database']} on {_mask(_tenant['url'])}")
+else:
+    print(f"📊 Database: {DATABASE_NAME}")
+    print(f"🔗 Connection: {_mask(MONGODB_URL)}")
+
+# Client registry: one client, and so one connection pool, per cluster URL
+_clients: Dict[str, AsyncIOMotorClient] = {}
+_databases: Dict[str, Any] = {}
+
+# Tenant of the current request or background job run
+_current_tenant: ContextVar[Optional[str]] = ContextVar("tenant", default=None)
+
+# pymongo monitoring listeners, registered before connect_to_mongodb()
+event_listeners = []
+
+def register_event_listener(listener):
+    """Add a pymongo monitoring listener to the clients created on connect"""
+    event_listeners.append(listener)
 
 async def connect_to_mongodb():
-    """Create database connection"""
-    global client, database
-    client = AsyncIOMotorClient(MONGODB_URL)
-    database = client[DATABASE_NAME]
-    print(f"Connected to MongoDB: {DATABASE_NAME}")
+    """Create database connections, one client per cluster"""
+    for name, tenant in TENANTS.items():
+        tenant_client = _clients.get(tenant["url"])
+        if tenant_client is None:
+            tenant_client = AsyncIOMotorClient(
+                tenant["url"], maxPoolSize=MONGODB_MAX_POOL_SIZE, event_listeners=event_listeners
+            )
+            _clients[tenant["url"]] = tenant_client
+        _databases[name] = tenant_client[tenant["database"]]
+        print(f"Connected to MongoDB: {tenant['database']}")
 
 async def close_mongodb_connection():
-    """Close database connection"""
-    global client
-    if client:
-        client.close()
+    """Close database connections"""
+    if _clients:
+        for tenant_client in _clients.values():
+            tenant_client.close()
+        _clients.clear()
+        _databases.clear()
         print("Disconnected from MongoDB")
 
+def current_tenant() -> Optional[str]:
+    """Tenant of the current request or job, else DEFAULT_TENANT (None if unset)"""
+    return _current_tenant.get() or DEFAULT_TENANT or None
+
+def set_current_tenant(name: str):
+    """Make ``name`` the tenant of the current context, returning the reset token"""
+    if name not in TENANTS:
+        raise KeyError(f"Unknown tenant {name!r}")
+    return _current_tenant.set(name)
+
+@contextmanager
+def tenant_scope(name: str):
+    """Run the enclosed code against tenant ``name``"""
+    token = set_current_tenant(name)
+    try:
+        yield
+    finally:
+        _current_tenant.reset(token)
+
+async def for_each_tenant(callback: Callable[[], Awaitable[Any]]) -> Dict[str, Any]:
+    """
+    Await ``callback()`` once per tenant, with that tenant current, and
+    return the results by tenant. Every tenant is run even when one fails;
+    the first failure is then raised, naming its tenant.
+    """
+    results = {}
+    failure = None
+    for name in TENANTS:
+        with tenant_scope(name):
+            try:
+                results[name] = await callback()
+            except Exception as e:
+                if not MULTI_TENANT:
+                    raise
+                failure = failure or RuntimeError(f"tenant {name}: {e}")
+    if failure is not None:
+        raise failure
+    return results
+
+def _tenant() -> str:
+    name = current_tenant()
+    if name is None:
+        raise RuntimeError("No tenant selected and no DEFAULT_TENANT configured")
+    return name
+
 def get_database():
-    """Get database instance"""
-    return database
+    """Database of the current tenant"""
+    return _databases[_tenant()]
+
+def get_client():
+    """Motor client holding the current tenant's database"""
+    return _clients[TENANTS[_tenant()]["url"]]
+
+async def run_in_transaction(callback):
+    """
+    Run ``callback(session)`` inside a multi-document transaction.
+
+    The callback may be retried on transient errors, so it must only perform
+    database writes. Falls back to ``callback(None)`` when transactions are
+    disabled or the server is a standalone mongod.
+    """
+    global USE_TRANSACTIONS
+    if not USE_TRANSACTIONS:
+        return await callback(None)
+
+    try:
+        async with await get_client().start_session() as session:
+            result = await session.with_transaction(callback)
+            _record_write(session)
+            return result
+    except OperationFailure as e:
+        # 20 = IllegalOperation: "Transaction numbers are only allowed on a
+        # replica set member or mongos"
+        if e.code != 20:
+            raise
+        print("⚠️  MongoDB transactions unavailable, running without transaction")
+        USE_TRANSACTIONS = False
+        return await callback(None)
+
+# Read routing
+_READ_MODES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest
+}
+
+def read_preference(route: str):
+    """Read preference configured for ``route`` (lists, stats, exports, report)"""
+    mode = _READ_MODES.get(READ_PREFERENCES.get(route, "primary"))
+    if mode is None:
+        print(f"⚠️  Unknown read preference for {route}: {READ_PREFERENCES[route]}, using primary")
+        mode = Primary
+    if mode is Primary:
+        return Primary()
+    return mode(max_staleness=READ_MAX_STALENESS_SECONDS)
+
+def routed(collection, route: str):
+    """``collection`` reading with the preference configured for ``route``"""
+    return collection.with_options(read_preference=read_preference(route))
+
+# Causal consistency: a request that wrote in a transaction, or that carries
+# the token of an earlier write, reads through a causally consistent
+# session, so a lagging secondary waits until it has applied that write.
+_causal_state: ContextVar[Optional[dict]] = ContextVar("causal_state", default=None)
+
+def begin_causal_scope(read_after: Optional[dict] = None) -> dict:
+    """
+    Start tracking writes for the current request; ``read_after`` is the
+    token of a write the client made earlier
+    """
+    state = {"read_after": read_after, "written": None}
+    _causal_state.set(state)
+    return state
+
+def _record_write(session):
+    state = _causal_state.get()
+    if state is not None and session.operation_time is not None:
+        state["written"] = {
+            "clusterTime": session.cluster_time,
+            "operationTime": session.operation_time
+        }
+
+def causal_token() -> Optional[dict]:
+    """Token of the newest write the current request must see, if any"""
+    state = _causal_state.get()
+    if state is None:
+        return None
+    return state["written"] or state["read_after"]
+
+@asynccontextmanager
+async def causal_session():
+    """
+    Causally consistent session positioned after the current request's
+    write token, or None when it has none (any member may answer)
+    """
+    token = causal_token()
+    if token is None:
+        yield None
+        return
+    async with await get_client().start_session(causal_consistency=True) as session:
+        session.advance_cluster_time(token["clusterTime"])
+        session.advance_operation_time(token["operationTime"])
+        yield session
+
+async def causal_read(read: Callable[[Any], Awaitable[Any]]) -> Any:
+    """
+    Await ``read(session)`` with the session of causal_session(). A token
+    sent by the client that the cluster rejects (forged, or from another
+    cluster) fails the read; it is then dropped and the read runs again
+    without it, as if the header had not been sent.
+    """
+    try:
+        async with causal_session() as session:
+            return await read(session)
+    except OperationFailure as e:
+        state = _causal_state.get()
+        if state is None or state["written"] or state["read_after"] is None:
+            raise
+        print(f"⚠️  Ignoring X-Read-After token rejected by the cluster: {e}")
+        state["read_after"] = None
+        return await read(None)
 
 # Collections
 def get_users_collection():
-    return database.users
+    return get_database().users
 
 def get_reports_collection():
-    return database.reports
+    return get_database().reports
+
+def get_reports_archive_collection():
+    return get_database().reports_archive
 
 def get_notifications_collection():
-    return database.notifications
+    return get_database().notifications
+
+def get_notifications_archive_collection():
+    return get_database().notifications_archive
 
 def get_registration_requests_collection():
-    return database.registration_requests
+    return get_database().registration_requests
 
 def get_password_reset_requests_collection():
-    return database.password_reset_requests
+    return get_database().password_reset_requests
 
 def get_need_requests_collection():
-    return database.need_requests
\ No newline at end of file
+    return get_database().need_requests
+
+def get_outbox_collection():
+    return get_database().outbox
+
+def get_outbox_checkpoints_collection():
+    return get_database().outbox_checkpoints
+
+def get_outbox_dead_letters_collection():
+    return get_database().outbox_dead_letters
+
+def get_counters_collection():
+    return get_database().counters
+
+def get_tombstones_collection():
+    return get_database().tombstones
+
+def get_rate_limits_collection():
+    return get_database().rate_limits
+
+def get_revocations_collection():
+    return get_database().revocations
+
+def get_sessions_collection():
+    return get_database().sessions
+
+def get_login_failures_collection():
+    return get_database().login_failures
+
+def get_officer_workloads_collection():
+    return get_database().officer_workloads
+
+def get_report_rollups_collection():
+    return get_database().report_rollups
+
+def get_hotspots_collection():
+    return get_database().hotspots
+
+def get_cache_invalidations_collection():
+    return get_database().cache_invalidations
@@ -0,0 +1,83 @@
+"""
+Detect report hotspots
+
+Recomputes and stores hotspots for every department and window from the
+database (see utils/hotspots.py), or times detection on a generated city
+with --synthetic.
+
+Usage:
+    python detect_hotspots.py [--synthetic REPORTS]
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from utils.hotspots import HOTSPOT_WINDOWS_DAYS, compute_hotspots, detect_all
+
+def synthetic_coordinates(count: int, seed: int = 7) -> dict:
+    """Reports over a year, 30% of them around a few dozen hotspots"""
+    rng = np.random.default_rng(seed)
+    departments = np.array(
+        ["garbagecollection", "drainage", "roadmaintenance", "streetlights", "watersupply"],
+        dtype=object
+    )
+    centers = np.column_stack([
+        13.0 + rng.uniform(-0.15, 0.15, 40), 80.2 + rng.uniform(-0.15, 0.15, 40)
+    ])
+    clustered = rng.random(count) < 0.3
+    latitudes = 13.0 + rng.uniform(-0.2, 0.2, count)
+    longitudes = 80.2 + rng.uniform(-0.2, 0.2, count)
+    center = rng.integers(0, len(centers), count)
+    latitudes[clustered] = centers[center[clustered], 0] + rng.normal(0, 0.002, clustered.sum())
+    longitudes[clustered] = centers[center[clustered], 1] + rng.normal(0, 0.002, clustered.sum())
+    now = datetime.utcnow()
+    return {
+        "department": departments[rng.integers(0, len(departments), count)],
+        "latitude": latitudes,
+        "longitude": longitudes,
+        "created_at": now.timestamp() - rng.uniform(0, 365 * 86400, count),
+    }
+
+async def recompute():
+    from database import connect_to_mongodb, close_mongodb_connection
+
+    await connect_to_mongodb()
+    try:
+        start = time.perf_counter()
+        stored = await compute_hotspots()
+        print(f"🗺️  {stored} hotspots stored in {time.perf_counter() - start:.1f}s")
+    finally:
+        await close_mongodb_connection()
+
+def benchmark(count: int):
+    coordinates = synthetic_coordinates(count)
+    now = datetime.utcnow()
+    start = time.perf_counter()
+    hotspots = detect_all(coordinates, now)
+    elapsed = time.perf_counter() - start
+    print(f"🧪 {count} reports, {len(HOTSPOT_WINDOWS_DAYS)} windows: "
+          f"{len(hotspots)} hotspots in {elapsed:.2f}s")
+    print(f"\n{'department':<20}{'window':>7}{'rank':>6}{'reports':>9}{'cells':>7}{'peak':>8}  center")
+    for hotspot in hotspots:
+        if hotspot["rank"] <= 3:
+            center = hotspot["center"]
+            print(f"{hotspot['department']:<20}{hotspot['window_days']:>6}d{hotspot['rank']:>6}"
+                  f"{hotspot['report_count']:>9}{hotspot['cell_count']:>7}{hotspot['peak_density']:>8.1f}"
+                  f"  {center['latitude']:.4f}, {center['longitude']:.4f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--synthetic", type=int, metavar="REPORTS",
+                        help="time detection on generated reports instead of the database")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        benchmark(args.synthetic)
+    else:
+        asyncio.run(recompute())
+
+if __name__ == "__main__":
+    main()
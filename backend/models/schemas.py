@@ -89,6 +89,7 @@ class UserInDB(BaseModel):
     password_hash: str
     is_active: bool = True
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: Optional[datetime] = None
     last_login_at: Optional[datetime] = None
     profile_image_url: Optional[str] = None
 
@@ -139,6 +140,11 @@ class ReportResponse(BaseModel):
     estimated_resolution_time: str = "Within 5 days"
     department_contact: Dict[str, str] = {}
     updates: List[ReportUpdate] = []
+    version: int = 0
+    sla_due_at: Optional[datetime] = None
+    escalation_level: int = 0
+    duplicate_of: Optional[str] = None
+    duplicate_count: int = 0
 
 class ReportInDB(BaseModel):
     id: str = Field(default_factory=generate_id)
@@ -158,12 +164,28 @@ class ReportInDB(BaseModel):
     reporter_phone: Optional[str] = None
     assigned_officer_id: Optional[str] = None
     assigned_officer_name: Optional[str] = None
+    assigned_at: Optional[datetime] = None
+    previous_assigned_officer_id: Optional[str] = None
     image_urls: List[str] = []
     priority: str = "medium"
     department: str = "others"
     estimated_resolution_time: str = "Within 5 days"
     department_contact: Dict[str, str] = {}
     updates: List[ReportUpdate] = []
+    # Bumped on every status change, for optimistic concurrency
+    version: int = 0
+    previous_status: Optional[ReportStatus] = None
+    # SLA timer, see utils/workflow.py
+    sla_hours: Optional[int] = None
+    sla_due_at: Optional[datetime] = None
+    sla_breach_at: Optional[datetime] = None
+    escalation_level: int = 0
+    escalated_at: Optional[datetime] = None
+    # Work queue order and duplicate tracking, see utils/work_queue.py
+    queue_rank_at: Optional[datetime] = None
+    duplicate_of: Optional[str] = None
+    duplicate_ids: List[str] = []
+    duplicate_count: int = 0
 
 # Notification Models
 class NotificationCreate(BaseModel):
@@ -196,7 +218,9 @@ class NotificationInDB(BaseModel):
     data: Optional[Dict[str, Any]] = None
     is_read: bool = False
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
     read_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = None  # Set when read, see utils/notification_retention.py
 
 # Registration Request Models
 class RegistrationRequestCreate(BaseModel):
@@ -313,10 +337,74 @@ class NeedRequestInDB(BaseModel):
     requester_id: str
     assigned_officer_id: Optional[str] = None
 
+# Sync Models
+class TombstoneInDB(BaseModel):
+    id: str = Field(default_factory=generate_id)
+    collection: str
+    doc_id: str
+    user_id: Optional[str] = None  # None = visible to every user
+    deleted_at: datetime = Field(default_factory=datetime.utcnow)
+
+class SyncDeleted(BaseModel):
+    reports: List[str] = []
+    notifications: List[str] = []
+
+class SyncResponse(BaseModel):
+    token: str
+    reset: bool = False
+    has_more: bool = False
+    reports: List[ReportResponse] = []
+    notifications: List[NotificationResponse] = []
+    profile: Optional[UserResponse] = None
+    deleted: SyncDeleted = SyncDeleted()
+
+# Session Models (refresh tokens)
+class SessionInDB(BaseModel):
+    id: str = Field(default_factory=generate_id)
+    user_id: str
+    token_hash: str
+    previous_token_hashes: List[str] = []
+    device_name: Optional[str] = None
+    user_agent: Optional[str] = None
+    ip_address: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    last_used_at: datetime = Field(default_factory=datetime.utcnow)
+    rotated_at: Optional[datetime] = None
+    expires_at: datetime
+    revoked_at: Optional[datetime] = None
+    revoked_reason: Optional[str] = None
+
+class SessionResponse(BaseModel):
+    id: str
+    device_name: Optional[str] = None
+    user_agent: Optional[str] = None
+    ip_address: Optional[str] = None
+    created_at: datetime
+    last_used_at: datetime
+    expires_at: datetime
+    current: bool = False
+
 # Token Models
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
 
 class TokenData(BaseModel):
-    email: Optional[str] = None
\ No newline at end of file
+    email: Optional[str] = None
+
+
+# Outbox Models
+class OutboxEventType(str, Enum):
+    REPORT_CREATED = "report.created"
+    REPORT_STATUS_CHANGED = "report.status_changed"
+    REPORT_SLA_BREACHED = "report.sla_breached"
+    REPORT_ASSIGNED = "report.assigned"
+
+class OutboxEventInDB(BaseModel):
+    id: str = Field(default_factory=generate_id)
+    seq: int
+    type: OutboxEventType
+    aggregate_id: str
+    payload: Dict[str, Any] = {}
+    created_at: datetime = Field(default_factory=datetime.utcnow)
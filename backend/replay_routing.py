@@ -0,0 +1,171 @@
+"""
+Replay historical reports through the routing strategies
+
+Loads officers and reports from MongoDB (or generates a synthetic city
+with --synthetic) and routes every report in creation order with each
+strategy, using the in-memory workload store. A report stops counting
+towards its officer's load when its history shows it was closed. Prints
+load spread, travel distance and decision time per strategy.
+
+Usage:
+    python replay_routing.py [--synthetic REPORTS] [--strategy NAME]
+"""
+import argparse
+import asyncio
+import heapq
+import random
+import statistics
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from utils.routing import (
+    STRATEGIES, LocationDelta, MemoryWorkloadStore, OfficerLoad, RoutingEngine,
+    haversine_km, priority_weight
+)
+from utils.workflow import CLOSED_STATUSES
+
+_CLOSED_VALUES = {closed.value for closed in CLOSED_STATUSES}
+
+# (created_at, closed_at or None, department, priority, latitude, longitude)
+ReplayReport = Tuple[datetime, Optional[datetime], str, str, Optional[float], Optional[float]]
+
+def closed_at(report_doc: dict) -> Optional[datetime]:
+    """When the report's history first shows it closed"""
+    for update in report_doc.get("updates") or []:
+        if update.get("status") in _CLOSED_VALUES:
+            return update.get("created_at")
+    return None
+
+async def load_history() -> Tuple[List[OfficerLoad], List[ReplayReport]]:
+    from database import connect_to_mongodb, get_users_collection, get_reports_collection
+
+    await connect_to_mongodb()
+    officers = [
+        OfficerLoad(
+            officer_id=user_doc["id"],
+            department=(user_doc.get("department") or "").lower() or None,
+            name=user_doc.get("name", "")
+        )
+        async for user_doc in get_users_collection().find(
+            {"user_type": "officer", "is_active": True}
+        )
+    ]
+    reports = [
+        (
+            report_doc["created_at"], closed_at(report_doc),
+            report_doc.get("department", "others"), report_doc.get("priority", "medium"),
+            report_doc.get("latitude"), report_doc.get("longitude")
+        )
+        async for report_doc in get_reports_collection().find(
+            {}, {"created_at": 1, "updates": 1, "department": 1, "priority": 1,
+                 "latitude": 1, "longitude": 1}
+        ).sort("created_at", 1)
+    ]
+    return officers, reports
+
+def synthetic_history(count: int, seed: int = 7) -> Tuple[List[OfficerLoad], List[ReplayReport]]:
+    """A city of a few departments with clustered reports"""
+    rng = random.Random(seed)
+    departments = ["garbagecollection", "drainage", "roadmaintenance", "streetlights", "watersupply"]
+    officers = [
+        OfficerLoad(officer_id=f"officer-{department}-{i}", department=department)
+        for department in departments
+        for i in range(rng.randint(3, 12))
+    ]
+    hotspots = [(13.0 + rng.uniform(-0.2, 0.2), 80.2 + rng.uniform(-0.2, 0.2)) for _ in range(8)]
+    start = datetime(2025, 1, 1)
+    reports = []
+    for i in range(count):
+        created = start + timedelta(minutes=10 * i)
+        lat, lon = rng.choice(hotspots)
+        priority = rng.choices(["low", "medium", "high", "critical"], [3, 5, 2, 1])[0]
+        reports.append((
+            created,
+            created + timedelta(hours=rng.expovariate(1 / 48)) if rng.random() < 0.9 else None,
+            rng.choice(departments),
+            priority,
+            lat + rng.gauss(0, 0.02),
+            lon + rng.gauss(0, 0.02)
+        ))
+    return officers, reports
+
+async def replay(strategy_name: str, officers: List[OfficerLoad], reports: List[ReplayReport]) -> dict:
+    store = MemoryWorkloadStore()
+    for officer in officers:
+        await store.add_officer(OfficerLoad(
+            officer_id=officer.officer_id, department=officer.department, name=officer.name
+        ))
+    engine = RoutingEngine(store, strategy_name)
+    closures: List[Tuple[datetime, int, str, float, Optional[LocationDelta]]] = []
+    distances, spreads, decision_us = [], [], []
+    peak: Dict[str, float] = defaultdict(float)
+    unassigned = 0
+
+    for index, (created, closed, department, priority, lat, lon) in enumerate(reports):
+        while closures and closures[0][0] <= created:
+            _, _, officer_id, weight, location = heapq.heappop(closures)
+            if location is not None:
+                location = (-location[0], -location[1], -1)
+            await store.apply(officer_id, -weight, -1, location_delta=location)
+
+        start = time.perf_counter()
+        officer = await engine.choose(department, priority, lat, lon)
+        decision_us.append((time.perf_counter() - start) * 1e6)
+        if officer is None:
+            unassigned += 1
+            continue
+
+        centroid = officer.centroid()
+        if centroid and lat is not None and lon is not None:
+            distances.append(haversine_km(lat, lon, *centroid))
+        weight = priority_weight(priority)
+        location = (lat, lon, 1) if lat is not None and lon is not None else None
+        await store.apply(officer.officer_id, weight, 1, location_delta=location)
+        peak[officer.officer_id] = max(peak[officer.officer_id], officer.load)
+        if closed is not None:
+            heapq.heappush(closures, (closed, index, officer.officer_id, weight, location))
+
+        if index % 25 == 0:
+            department_loads = store.loads(department)
+            if len(department_loads) > 1:
+                spreads.append(statistics.pstdev(department_loads))
+
+    return {
+        "strategy": strategy_name,
+        "unassigned": unassigned,
+        "mean_load_stdev": statistics.mean(spreads) if spreads else 0.0,
+        "max_peak_load": max(peak.values(), default=0.0),
+        "mean_distance_km": statistics.mean(distances) if distances else 0.0,
+        "p95_distance_km": sorted(distances)[int(len(distances) * 0.95)] if distances else 0.0,
+        "mean_decision_us": statistics.mean(decision_us) if decision_us else 0.0,
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--synthetic", type=int, metavar="REPORTS",
+                        help="replay a generated history instead of the database")
+    parser.add_argument("--strategy", choices=sorted(STRATEGIES),
+                        help="replay one strategy only")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        officers, reports = synthetic_history(args.synthetic)
+        print(f"🧪 Synthetic history: {len(officers)} officers, {len(reports)} reports")
+    else:
+        officers, reports = await load_history()
+        print(f"📚 History: {len(officers)} officers, {len(reports)} reports")
+
+    strategies = [args.strategy] if args.strategy else list(STRATEGIES)
+    print(f"\n{'strategy':<14}{'unassigned':>11}{'load sd':>9}{'peak':>7}"
+          f"{'dist km':>9}{'p95 km':>8}{'µs/decision':>13}")
+    for strategy_name in strategies:
+        result = await replay(strategy_name, officers, reports)
+        print(f"{result['strategy']:<14}{result['unassigned']:>11}"
+              f"{result['mean_load_stdev']:>9.2f}{result['max_peak_load']:>7.1f}"
+              f"{result['mean_distance_km']:>9.2f}{result['p95_distance_km']:>8.2f}"
+              f"{result['mean_decision_us']:>13.1f}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,50 @@
+#!/bin/bash
+# Local sharded cluster for trying the shard keys: a config server, two
+# shards (single-member replica sets) and a mongos on port 27017.
+# Usage: ./shard_cluster.sh [DATA_DIR]    (stop with: pkill -f "$DATA_DIR")
+
+DATA_DIR=${1:-./shard_data}
+
+echo "🔀 Civic Welfare - local sharded cluster in $DATA_DIR"
+echo "=================================================="
+
+for tool in mongod mongos mongosh; do
+    if ! command -v $tool > /dev/null; then
+        echo "❌ $tool not found. Please install MongoDB 6.0 or higher."
+        exit 1
+    fi
+done
+
+mkdir -p "$DATA_DIR/config" "$DATA_DIR/shard1" "$DATA_DIR/shard2"
+
+start_replica_set() {
+    # name, role, port, directory
+    echo "🚀 Starting $1 on port $3..."
+    mongod --$2 --replSet "$1" --port "$3" --dbpath "$4" --bind_ip localhost \
+        --fork --logpath "$4/mongod.log" > /dev/null || { echo "❌ Failed to start $1"; exit 1; }
+    mongosh --quiet --port "$3" --eval \
+        "try { rs.status() } catch (e) { rs.initiate({_id: '$1', $( [ "$2" = configsvr ] && echo 'configsvr: true,' ) members: [{_id: 0, host: 'localhost:$3'}]}) }" > /dev/null
+}
+
+start_replica_set configReplSet configsvr 27019 "$DATA_DIR/config"
+start_replica_set shard1 shardsvr 27118 "$DATA_DIR/shard1"
+start_replica_set shard2 shardsvr 27218 "$DATA_DIR/shard2"
+
+# Wait for the primaries
+sleep 5
+
+echo "🚀 Starting mongos on port 27017..."
+mongos --configdb configReplSet/localhost:27019 --port 27017 --bind_ip localhost \
+    --fork --logpath "$DATA_DIR/mongos.log" > /dev/null || { echo "❌ Failed to start mongos"; exit 1; }
+
+echo "🔗 Adding shards..."
+mongosh --quiet --port 27017 --eval '
+    sh.addShard("shard1/localhost:27118");
+    sh.addShard("shard2/localhost:27218");
+    db.adminCommand({listShards: 1}).shards.forEach(s => print("   " + s._id + " " + s.host));
+'
+
+echo ""
+echo "✅ Sharded cluster ready. Then run:"
+echo "   export MONGODB_URL=mongodb://localhost:27017 SHARDED_CLUSTER=true SHARD_CHECK_ENABLED=true"
+echo "   python shard_collections.py"
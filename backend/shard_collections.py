@@ -0,0 +1,35 @@
+"""
+Shard collections
+
+Enables sharding on the database and shards reports, archived reports and
+notifications on the keys of utils/sharding.py, creating the indexes they
+need, in the database of every tenant. MONGODB_URL (or the tenant's own
+URL) must point to a mongos. Collections already sharded are reported and
+left as they are.
+
+Usage:
+    python shard_collections.py
+"""
+import argparse
+import asyncio
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from database.mongodb import TENANTS
+from utils.sharding import shard_collections
+
+async def run():
+    for name, tenant in TENANTS.items():
+        print(f"🏙️  Tenant {name}: {tenant['database']}")
+        client = AsyncIOMotorClient(tenant["url"])
+        try:
+            await shard_collections(client, tenant["database"])
+        finally:
+            client.close()
+
+def main():
+    argparse.ArgumentParser(description=__doc__.strip().splitlines()[0]).parse_args()
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    main()
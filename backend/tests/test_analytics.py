@@ -0,0 +1,55 @@
+"""
+Tests for the rollup buckets and the time-to-resolve histogram
+"""
+from datetime import datetime
+
+from utils.analytics import (
+    HISTOGRAM_STEPS_PER_DOUBLING,
+    bin_hours,
+    bucket_start,
+    histogram_bin,
+    histogram_percentile,
+)
+
+def test_bucket_start():
+    timestamp = datetime(2024, 3, 14, 15, 9, 26, 535)  # a Thursday
+    assert bucket_start(timestamp, "hour") == datetime(2024, 3, 14, 15)
+    assert bucket_start(timestamp, "day") == datetime(2024, 3, 14)
+    assert bucket_start(timestamp, "week") == datetime(2024, 3, 11)
+    assert bucket_start(timestamp, "month") == datetime(2024, 3, 1)
+
+def test_bucket_start_on_boundaries():
+    monday = datetime(2024, 1, 1)
+    for interval in ("hour", "day", "week", "month"):
+        assert bucket_start(monday, interval) == monday
+    # ISO weeks cross month and year boundaries
+    assert bucket_start(datetime(2023, 12, 31, 23, 59), "week") == datetime(2023, 12, 25)
+
+def test_histogram_bin():
+    assert histogram_bin(0) == 0
+    assert histogram_bin(-30) == 0
+    # One doubling of (1 + minutes) per HISTOGRAM_STEPS_PER_DOUBLING bins
+    assert histogram_bin(60) == HISTOGRAM_STEPS_PER_DOUBLING
+    assert histogram_bin(3 * 60) == 2 * HISTOGRAM_STEPS_PER_DOUBLING
+    assert histogram_bin(3 * 60 - 1) == 2 * HISTOGRAM_STEPS_PER_DOUBLING - 1
+
+def test_bin_hours_within_its_bin():
+    for seconds in (90, 3600, 6 * 3600, 3 * 24 * 3600, 40 * 24 * 3600):
+        hours = seconds / 3600
+        estimate = bin_hours(histogram_bin(seconds))
+        # Off by at most the width of a bin
+        assert hours / 2 ** (1 / HISTOGRAM_STEPS_PER_DOUBLING) <= estimate
+        assert estimate <= hours * 2 ** (1 / HISTOGRAM_STEPS_PER_DOUBLING)
+
+def test_histogram_percentile():
+    assert histogram_percentile({}, 0.5) is None
+    hour, day, week = histogram_bin(3600), histogram_bin(24 * 3600), histogram_bin(7 * 24 * 3600)
+    histogram = {hour: 50, day: 40, week: 10}
+    assert histogram_percentile(histogram, 0.5) == round(bin_hours(hour), 2)
+    assert histogram_percentile(histogram, 0.9) == round(bin_hours(day), 2)
+    assert histogram_percentile(histogram, 0.95) == round(bin_hours(week), 2)
+    assert histogram_percentile(histogram, 1.0) == round(bin_hours(week), 2)
+
+def test_histogram_percentile_ignores_key_order():
+    histogram = {histogram_bin(7 * 24 * 3600): 1, histogram_bin(60): 3}
+    assert histogram_percentile(histogram, 0.5) == round(bin_hours(histogram_bin(60)), 2)
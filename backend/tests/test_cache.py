@@ -0,0 +1,109 @@
+"""
+Tests for the per-worker cache tier and single-flight loading
+"""
+import asyncio
+
+import pytest
+
+from utils import cache as cache_module
+from utils.cache import LocalTier, SingleFlight, cache_key, report_namespace
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, "monotonic", clock)
+    return clock
+
+def test_local_tier_expiry(clock):
+    tier = LocalTier()
+    tier.set("a", 1, ttl=10)
+    assert tier.get("a") == (True, 1)
+    clock.now += 10
+    assert tier.get("a") == (False, None)
+    assert len(tier) == 0
+
+def test_local_tier_evicts_least_recently_used(clock):
+    tier = LocalTier(max_entries=2)
+    tier.set("a", 1, ttl=60)
+    tier.set("b", 2, ttl=60)
+    tier.get("a")
+    tier.set("c", 3, ttl=60)
+    assert tier.get("b") == (False, None)
+    assert tier.get("a") == (True, 1)
+    assert tier.get("c") == (True, 3)
+    assert tier.evictions == 1
+
+def test_local_tier_drop_namespace(clock):
+    tier = LocalTier()
+    tier.set("report_lists.drainage:1:k", 1, ttl=60)
+    tier.set("report_lists.all:1:k", 2, ttl=60)
+    tier.drop_namespace("report_lists.drainage")
+    assert tier.get("report_lists.drainage:1:k") == (False, None)
+    assert tier.get("report_lists.all:1:k") == (True, 2)
+
+def test_cache_key_is_order_independent():
+    assert cache_key({"a": 1, "b": 2}, 0) == cache_key({"b": 2, "a": 1}, 0)
+    assert cache_key({"a": 1}, 0) != cache_key({"a": 1}, 1)
+
+def test_report_namespace():
+    assert report_namespace("report_lists", "roadMaintenance") == "report_lists.roadmaintenance"
+    assert report_namespace("report_stats") == "report_stats.all"
+
+@pytest.mark.asyncio
+async def test_single_flight_shares_one_load():
+    flights = SingleFlight()
+    release = asyncio.Event()
+    loads = []
+
+    async def loader():
+        loads.append(1)
+        await release.wait()
+        return "value"
+
+    callers = [asyncio.ensure_future(flights.do("k", loader)) for _ in range(3)]
+    await asyncio.sleep(0)
+    assert "k" in flights
+    release.set()
+    results = await asyncio.gather(*callers)
+    assert loads == [1]
+    assert sorted(shared for _, shared in results) == [False, True, True]
+    assert all(value == "value" for value, _ in results)
+    assert "k" not in flights
+
+@pytest.mark.asyncio
+async def test_single_flight_survives_a_cancelled_caller():
+    flights = SingleFlight()
+    release = asyncio.Event()
+
+    async def loader():
+        await release.wait()
+        return "value"
+
+    first = asyncio.ensure_future(flights.do("k", loader))
+    second = asyncio.ensure_future(flights.do("k", loader))
+    await asyncio.sleep(0)
+    first.cancel()
+    release.set()
+    assert await second == ("value", True)
+    assert first.cancelled()
+
+@pytest.mark.asyncio
+async def test_single_flight_releases_the_key_after_a_failure():
+    flights = SingleFlight()
+
+    async def failing():
+        raise RuntimeError("load failed")
+
+    async def loader():
+        return "value"
+
+    with pytest.raises(RuntimeError):
+        await flights.do("k", failing)
+    assert await flights.do("k", loader) == ("value", False)
@@ -0,0 +1,65 @@
+"""
+Tests for hotspot detection on synthetic report coordinates
+"""
+import math
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from utils.hotspots import detect_hotspots
+
+def grid(latitude, longitude, rows, columns, step=0.0001):
+    """Points ``step`` degrees apart (about 11 m), starting at a corner"""
+    return [
+        (latitude + row * step, longitude + column * step)
+        for row in range(rows) for column in range(columns)
+    ]
+
+# 40 reports around one place, 15 around another about 7 km away, and
+# isolated reports about a kilometre apart
+LARGE = grid(13.0001, 80.0001, 8, 5)
+SMALL = grid(13.0501, 80.0501, 5, 3)
+SCATTERED = [(13.1 + index * 0.01, 80.2) for index in range(20)]
+
+def detect(points, **options):
+    options = {"min_density": 0.5, "min_reports": 10, **options}
+    latitudes, longitudes = zip(*points)
+    return detect_hotspots(latitudes, longitudes, **options)
+
+def test_clusters_found_largest_first():
+    hotspots = detect(SCATTERED + SMALL + LARGE)
+    assert [hotspot["report_count"] for hotspot in hotspots] == [40, 15]
+
+    center = hotspots[0]["center"]
+    assert math.isclose(center["latitude"], 13.0001 + 0.00035, abs_tol=1e-6)
+    assert math.isclose(center["longitude"], 80.0001 + 0.0002, abs_tol=1e-6)
+
+def test_outline_covers_the_reports():
+    hotspot = detect(LARGE)[0]
+    polygon = hotspot["polygon"]
+    assert polygon["type"] == "Polygon"
+    ring = polygon["coordinates"][0]
+    assert ring[0] == ring[-1]
+    longitudes = [point[0] for point in ring]
+    latitudes = [point[1] for point in ring]
+    for latitude, longitude in LARGE:
+        assert min(latitudes) <= latitude <= max(latitudes)
+        assert min(longitudes) <= longitude <= max(longitudes)
+    assert hotspot["area_km2"] == round(hotspot["cell_count"] * 0.2 ** 2, 3)
+
+def test_scattered_reports_are_no_hotspot():
+    assert detect(SCATTERED) == []
+
+def test_thresholds_and_limit():
+    # Too few reports to look for hotspots at all
+    assert detect(LARGE[:9]) == []
+    assert [hotspot["report_count"] for hotspot in detect(SMALL + LARGE, min_reports=20)] == [40]
+    assert [hotspot["report_count"] for hotspot in detect(SMALL + LARGE, limit=1)] == [40]
+    # The small cluster alone is not dense enough by default
+    assert [hotspot["report_count"] for hotspot in detect(SMALL + LARGE, min_density=2.0)] == [40]
+
+def test_invalid_coordinates_are_ignored():
+    invalid = [(float("nan"), 80.0), (13.0, float("inf")), (91.0, 80.0), (13.0, 181.0)]
+    hotspots = detect(invalid * 5 + LARGE)
+    assert [hotspot["report_count"] for hotspot in hotspots] == [40]
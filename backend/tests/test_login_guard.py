@@ -0,0 +1,45 @@
+"""
+Tests for the per-IP login lockout and the client address it is keyed on
+"""
+import pytest
+from fastapi import HTTPException
+
+from utils import rate_limit
+from utils.login_guard import LOGIN_FREE_ATTEMPTS_IP, LoginGuard, MemoryFailureStore
+from utils.rate_limit import client_ip
+
+def scope(forwarded_for=None, client=("10.0.0.7", 50000)):
+    headers = []
+    if forwarded_for is not None:
+        headers.append((b"x-forwarded-for", forwarded_for.encode("latin-1")))
+    return {"type": "http", "headers": headers, "client": client}
+
+def test_forwarded_for_ignored_without_trusted_proxy(monkeypatch):
+    monkeypatch.setattr(rate_limit, "TRUSTED_PROXY_COUNT", 0)
+    assert client_ip(scope("203.0.113.9")) == "10.0.0.7"
+
+def test_forged_hops_before_trusted_proxy_are_ignored(monkeypatch):
+    monkeypatch.setattr(rate_limit, "TRUSTED_PROXY_COUNT", 1)
+    assert client_ip(scope("198.51.100.1")) == "198.51.100.1"
+    assert client_ip(scope("203.0.113.9, 198.51.100.1")) == "198.51.100.1"
+    assert client_ip(scope("1.1.1.1, 2.2.2.2,198.51.100.1")) == "198.51.100.1"
+
+def test_more_trusted_proxies_than_hops(monkeypatch):
+    monkeypatch.setattr(rate_limit, "TRUSTED_PROXY_COUNT", 2)
+    assert client_ip(scope("198.51.100.1")) == "198.51.100.1"
+    assert client_ip(scope()) == "10.0.0.7"
+
+@pytest.mark.asyncio
+async def test_forged_header_cannot_reset_ip_lockout(monkeypatch):
+    monkeypatch.setattr(rate_limit, "TRUSTED_PROXY_COUNT", 1)
+    guard = LoginGuard(store=MemoryFailureStore())
+
+    # Every attempt forges a new first hop; the proxy appends the real address
+    for attempt in range(LOGIN_FREE_ATTEMPTS_IP):
+        ip_address = client_ip(scope(f"203.0.113.{attempt}, 198.51.100.1"))
+        await guard.record_failure(f"user{attempt}@example.com", ip_address)
+
+    ip_address = client_ip(scope("192.0.2.250, 198.51.100.1"))
+    with pytest.raises(HTTPException) as error:
+        await guard.check("someone.else@example.com", ip_address)
+    assert error.value.status_code == 429
@@ -0,0 +1,71 @@
+"""
+Tests for password hash identification, verification and rehashing
+"""
+import pytest
+
+from utils import passwords
+from utils.passwords import (
+    BCRYPT,
+    LEGACY_PBKDF2,
+    LEGACY_PBKDF2_ITERATIONS,
+    PBKDF2_SHA256,
+    hash_password,
+    identify,
+    needs_rehash,
+    verify_and_update,
+    verify_password,
+)
+
+def test_identify():
+    assert identify(hash_password("secret", PBKDF2_SHA256, 1000)) == (PBKDF2_SHA256, 1000)
+    assert identify(hash_password("secret", LEGACY_PBKDF2)) == (LEGACY_PBKDF2, LEGACY_PBKDF2_ITERATIONS)
+    assert identify("$2b$12$" + "a" * 53) == (BCRYPT, 12)
+    assert identify("") is None
+    assert identify("plaintext") is None
+
+@pytest.mark.parametrize("hashed_password", [
+    "$pbkdf2-sha256$",
+    "$pbkdf2-sha256$1000$c2FsdA",
+    "$pbkdf2-sha256$abc$c2FsdA$Y2hlY2s",
+    "$pbkdf2-sha256$0$c2FsdA$Y2hlY2s",
+    "$pbkdf2-sha256$1000$c2FsdA$Y2hlY2s$extra",
+])
+def test_malformed_pbkdf2_hashes(hashed_password):
+    assert identify(hashed_password) is None
+    assert verify_password("secret", hashed_password) is False
+
+def test_invalid_base64_does_not_verify():
+    assert verify_password("secret", "$pbkdf2-sha256$1000$abcde$Y2hlY2s") is False
+
+@pytest.mark.parametrize("scheme, cost", [(PBKDF2_SHA256, 1000), (LEGACY_PBKDF2, None)])
+def test_verify(scheme, cost):
+    hashed_password = hash_password("secret", scheme, cost)
+    assert verify_password("secret", hashed_password)
+    assert not verify_password("wrong", hashed_password)
+
+def test_bcrypt_verify():
+    if passwords.bcrypt is None:
+        pytest.skip("bcrypt is not installed")
+    hashed_password = hash_password("secret", BCRYPT, 4)
+    assert identify(hashed_password) == (BCRYPT, 4)
+    assert verify_password("secret", hashed_password)
+    assert not verify_password("wrong", hashed_password)
+
+def test_rehash_to_target(monkeypatch):
+    monkeypatch.setattr(passwords, "PASSWORD_HASH_SCHEME", PBKDF2_SHA256)
+    monkeypatch.setattr(passwords, "PASSWORD_PBKDF2_ITERATIONS", 2000)
+
+    current = hash_password("secret", PBKDF2_SHA256, 2000)
+    assert not needs_rehash(current)
+    assert verify_and_update("secret", current) == (True, None)
+
+    for outdated in (hash_password("secret", PBKDF2_SHA256, 1000), hash_password("secret", LEGACY_PBKDF2)):
+        assert needs_rehash(outdated)
+        verified, replacement = verify_and_update("secret", outdated)
+        assert verified
+        assert identify(replacement) == (PBKDF2_SHA256, 2000)
+        assert verify_password("secret", replacement)
+
+def test_no_rehash_on_wrong_password(monkeypatch):
+    monkeypatch.setattr(passwords, "PASSWORD_HASH_SCHEME", PBKDF2_SHA256)
+    assert verify_and_update("wrong", hash_password("secret", LEGACY_PBKDF2)) == (False, None)
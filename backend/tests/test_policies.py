@@ -0,0 +1,68 @@
+"""
+Tests for the access policy filter fragments
+"""
+from types import SimpleNamespace
+
+from models.schemas import Department, UserType
+from utils.policies import (
+    notification_delete_filter,
+    notification_read_filter,
+    report_read_filter,
+    report_read_scopes,
+    report_stats_filter,
+    report_write_filter,
+    with_policy,
+)
+
+def user(user_type, department=None, user_id="u1"):
+    return SimpleNamespace(id=user_id, user_type=user_type, department=department)
+
+ADMIN = user(UserType.ADMIN)
+OFFICER = user(UserType.OFFICER, Department.ROAD_MAINTENANCE)
+OFFICER_WITHOUT_DEPARTMENT = user(UserType.OFFICER)
+PUBLIC = user(UserType.PUBLIC)
+
+def test_with_policy():
+    assert with_policy({"status": "done"}, {}) == {"status": "done"}
+    assert with_policy({}, {"reporter_id": "u1"}) == {"reporter_id": "u1"}
+    assert with_policy({"status": "done"}, {"reporter_id": "u1"}) == {
+        "$and": [{"status": "done"}, {"reporter_id": "u1"}]
+    }
+
+def test_report_read_filter():
+    assert report_read_filter(ADMIN) == {}
+    assert report_read_filter(OFFICER) == {
+        "$or": [{"department": "roadmaintenance"}, {"assigned_officer_id": "u1"}]
+    }
+    assert report_read_filter(OFFICER_WITHOUT_DEPARTMENT) == {"assigned_officer_id": "u1"}
+    assert report_read_filter(PUBLIC) == {"reporter_id": "u1"}
+
+def test_report_read_filter_accepts_plain_strings():
+    assert report_read_filter(user("officer", "waterSupply")) == {
+        "$or": [{"department": "watersupply"}, {"assigned_officer_id": "u1"}]
+    }
+
+def test_report_write_filter():
+    assert report_write_filter(ADMIN) == {}
+    assert report_write_filter(OFFICER) == report_read_filter(OFFICER)
+    # Public users match no report
+    assert report_write_filter(PUBLIC) == {"id": {"$exists": False}}
+
+def test_report_stats_filter():
+    # Reports assigned to the officer in other departments are not counted
+    assert report_stats_filter(OFFICER) == {"department": "roadmaintenance"}
+    assert report_stats_filter(OFFICER_WITHOUT_DEPARTMENT) == {"assigned_officer_id": "u1"}
+    assert report_stats_filter(ADMIN) == {}
+
+def test_report_read_scopes():
+    shared, personal = report_read_scopes(OFFICER)
+    assert shared == {"department": "roadmaintenance"}
+    assert personal == {"assigned_officer_id": "u1", "department": {"$ne": "roadmaintenance"}}
+    assert report_read_scopes(ADMIN) == ({}, None)
+    assert report_read_scopes(PUBLIC) == ({"reporter_id": "u1"}, None)
+    assert report_read_scopes(OFFICER_WITHOUT_DEPARTMENT) == ({"assigned_officer_id": "u1"}, None)
+
+def test_notification_filters():
+    assert notification_read_filter(PUBLIC) == {"user_id": {"$in": ["u1", None]}}
+    assert notification_delete_filter(PUBLIC) == notification_read_filter(PUBLIC)
+    assert notification_delete_filter(ADMIN) == {}
@@ -0,0 +1,79 @@
+"""
+Tests for the in-memory token buckets and the client address behind proxies
+"""
+import pytest
+
+from utils import rate_limit
+from utils.rate_limit import MemoryBucketStore, RateLimitRule, client_ip
+
+RULE = RateLimitRule("test", r"^/", capacity=3, refill_per_second=0.5)
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    return clock
+
+def scope(*forwarded_for, client=("10.0.0.7", 50000)):
+    headers = [(b"x-forwarded-for", value.encode("latin-1")) for value in forwarded_for]
+    return {"type": "http", "headers": headers, "client": client}
+
+@pytest.mark.asyncio
+async def test_take_allows_a_burst_of_capacity(clock):
+    store = MemoryBucketStore()
+    assert [await store.take("k", RULE) for _ in range(4)] == [
+        (True, 2), (True, 1), (True, 0), (False, 0)
+    ]
+
+@pytest.mark.asyncio
+async def test_take_refills_over_time_up_to_capacity(clock):
+    store = MemoryBucketStore()
+    for _ in range(3):
+        await store.take("k", RULE)
+    clock.now += 1
+    assert await store.take("k", RULE) == (False, 0.5)
+    clock.now += 1
+    assert await store.take("k", RULE) == (True, 0)
+    clock.now += 3600
+    assert await store.take("k", RULE) == (True, 2)
+
+@pytest.mark.asyncio
+async def test_take_with_cost(clock):
+    store = MemoryBucketStore()
+    assert await store.take("k", RULE, cost=2) == (True, 1)
+    # A denied request takes nothing
+    assert await store.take("k", RULE, cost=2) == (False, 1)
+    assert await store.take("k", RULE) == (True, 0)
+
+@pytest.mark.asyncio
+async def test_buckets_are_per_key_and_evicted_least_recently_used(clock):
+    store = MemoryBucketStore(max_buckets=2)
+    await store.take("a", RULE, cost=3)
+    await store.take("b", RULE, cost=3)
+    await store.take("a", RULE)
+    await store.take("c", RULE)
+    # a was kept; b was evicted and starts full again
+    assert await store.take("a", RULE) == (False, 0)
+    assert await store.take("b", RULE) == (True, 2)
+
+def test_client_ip_across_header_lines(monkeypatch):
+    monkeypatch.setattr(rate_limit, "TRUSTED_PROXY_COUNT", 2)
+    # Repeated headers are one list of hops, in order
+    assert client_ip(scope("203.0.113.9, 198.51.100.1", "192.0.2.1")) == "198.51.100.1"
+    assert client_ip(scope("203.0.113.9", "198.51.100.1 , 192.0.2.1")) == "198.51.100.1"
+
+def test_client_ip_ignores_empty_hops(monkeypatch):
+    monkeypatch.setattr(rate_limit, "TRUSTED_PROXY_COUNT", 1)
+    assert client_ip(scope("198.51.100.1, ,")) == "198.51.100.1"
+    assert client_ip(scope(" , ")) == "10.0.0.7"
+
+def test_client_ip_without_client(monkeypatch):
+    monkeypatch.setattr(rate_limit, "TRUSTED_PROXY_COUNT", 0)
+    assert client_ip(scope("198.51.100.1", client=None)) == "unknown"
@@ -0,0 +1,91 @@
+"""
+Tests for the in-memory officer workloads and the deltas of status changes
+"""
+import pytest
+
+from utils.routing import MemoryWorkloadStore, OfficerLoad, status_workload_deltas
+
+def officer(officer_id, load=0.0, department="drainage", active=True):
+    return OfficerLoad(officer_id=officer_id, department=department, load=load, active=active)
+
+async def store_with(*officers):
+    store = MemoryWorkloadStore()
+    for entry in officers:
+        await store.add_officer(entry)
+    return store
+
+@pytest.mark.asyncio
+async def test_candidates_least_loaded_first():
+    store = await store_with(officer("a", 3.0), officer("b", 1.0), officer("c", 2.0))
+    assert [entry.officer_id for entry in await store.candidates("drainage", 2)] == ["b", "c"]
+    # Reading candidates leaves the heap intact
+    assert [entry.officer_id for entry in await store.candidates("drainage", 3)] == ["b", "c", "a"]
+
+@pytest.mark.asyncio
+async def test_candidates_skip_outdated_entries():
+    store = await store_with(officer("a", 1.0), officer("b", 2.0))
+    # a's old (1.0) entry stays in the heap until it is popped
+    await store.apply("a", 5.0, 1)
+    assert [entry.officer_id for entry in await store.candidates("drainage", 2)] == ["b", "a"]
+    assert [entry.load for entry in await store.candidates("drainage", 2)] == [2.0, 6.0]
+
+@pytest.mark.asyncio
+async def test_candidates_skip_inactive_and_other_departments():
+    store = await store_with(
+        officer("a", 1.0, active=False),
+        officer("b", 2.0, department="watersupply"),
+        officer("c", 3.0)
+    )
+    assert [entry.officer_id for entry in await store.candidates("drainage", 5)] == ["c"]
+    assert await store.candidates("streetlights", 5) == []
+
+@pytest.mark.asyncio
+async def test_stale_entries_are_compacted():
+    store = await store_with(officer("a"), officer("b"))
+    for _ in range(100):
+        await store.apply("a", 1.0, 1)
+    assert len(store._heaps["drainage"]) <= 4 * 2 + 16
+    assert [entry.officer_id for entry in await store.candidates("drainage", 2)] == ["b", "a"]
+
+@pytest.mark.asyncio
+async def test_location_deltas_move_the_centroid():
+    store = await store_with(officer("a"))
+    await store.apply("a", 1.0, 1, location_delta=(10.0, 20.0, 1))
+    await store.apply("a", 1.0, 1, location_delta=(12.0, 22.0, 1))
+    assert (await store.get("a")).centroid() == (11.0, 21.0)
+    await store.apply("a", -1.0, -1, location_delta=(-10.0, -20.0, -1))
+    assert (await store.get("a")).centroid() == (12.0, 22.0)
+    await store.apply("a", -1.0, -1, location_delta=(-12.0, -22.0, -1))
+    assert (await store.get("a")).centroid() is None
+
+def payload(old_status, new_status, previous=None, current=None, priority="high"):
+    return {
+        "old_status": old_status,
+        "new_status": new_status,
+        "previous_assigned_officer_id": previous,
+        "assigned_officer_id": current,
+        "priority": priority,
+        "latitude": 13.0,
+        "longitude": 80.0
+    }
+
+def test_status_workload_deltas_on_closing():
+    assert status_workload_deltas(payload("inProgress", "done", "a", "a")) == {
+        "a": (-2.0, -1, (-13.0, -80.0, -1))
+    }
+
+def test_status_workload_deltas_on_reassignment():
+    assert status_workload_deltas(payload("inProgress", "inProgress", "a", "b")) == {
+        "a": (-2.0, -1, (-13.0, -80.0, -1)),
+        "b": (2.0, 1, (13.0, 80.0, 1))
+    }
+
+def test_status_workload_deltas_without_changes():
+    # Same officer, still open: the changes cancel out
+    assert status_workload_deltas(payload("submitted", "inProgress", "a", "a")) == {}
+    # Closed reports count for nobody
+    assert status_workload_deltas(payload("done", "rejected", "a", "a")) == {}
+
+def test_status_workload_deltas_on_reopening():
+    deltas = status_workload_deltas({**payload("done", "submitted", None, "a"), "latitude": None})
+    assert deltas == {"a": (2.0, 1, None)}
@@ -0,0 +1,57 @@
+"""
+Tests for delta sync token encoding
+"""
+import base64
+import json
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from utils.sync import SYNC_FEEDS, decode_sync_token, encode_sync_token, token_expired
+
+POSITION = {
+    "profile": datetime(2026, 3, 1, 8, 30),
+    "reports": (datetime(2026, 3, 1, 9, 0, 0, 123000), "r-42"),
+    "notifications": (datetime(2026, 3, 1, 9, 5), "n-7"),
+    "deleted": (datetime(2026, 2, 28, 23, 59), ""),
+}
+
+def test_round_trip():
+    assert decode_sync_token(encode_sync_token(POSITION)) == POSITION
+
+def test_token_is_url_safe():
+    token = encode_sync_token(POSITION)
+    assert "=" not in token
+    assert all(character.isalnum() or character in "-_" for character in token)
+
+def test_first_sync():
+    assert decode_sync_token(None) is None
+    assert decode_sync_token("") is None
+
+def encode_raw(raw: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(raw).encode("utf-8")).decode("ascii").rstrip("=")
+
+@pytest.mark.parametrize("token", [
+    "not a token",
+    encode_raw({"v": 99, "profile": "2026-03-01T08:30:00"}),
+    encode_raw({"v": 1, "profile": "2026-03-01T08:30:00"}),
+    encode_raw({"v": 1, "profile": "yesterday", **{feed: ["2026-03-01T09:00:00", "x"] for feed in SYNC_FEEDS}}),
+    encode_raw({"v": 1, "profile": "2026-03-01T08:30:00", **{feed: "2026-03-01" for feed in SYNC_FEEDS}}),
+])
+def test_invalid_tokens(token):
+    with pytest.raises(HTTPException) as error:
+        decode_sync_token(token)
+    assert error.value.status_code == 400
+
+def test_offset_timestamps_become_naive_utc():
+    raw = {
+        "v": 1,
+        "profile": "2026-03-01T10:30:00+02:00",
+        **{feed: ["2026-03-01T09:00:00Z", "x"] for feed in SYNC_FEEDS}
+    }
+    position = decode_sync_token(encode_raw(raw))
+    assert position["profile"] == datetime(2026, 3, 1, 8, 30)
+    assert position["reports"] == (datetime(2026, 3, 1, 9, 0), "x")
+    # Compared with naive utcnow() without a TypeError
+    assert token_expired(position) in (True, False)
@@ -0,0 +1,77 @@
+"""
+Tests for the report status transitions and SLA deadlines
+"""
+from datetime import datetime, timedelta
+
+from models.schemas import ReportStatus
+from utils.workflow import (
+    ALLOWED_TRANSITIONS,
+    CLOSED_STATUSES,
+    DEFAULT_SLA_HOURS,
+    DEPARTMENT_SLA_HOURS,
+    OPEN_STATUSES,
+    SLA_HOURS,
+    allowed_sources,
+    describe_sla,
+    sla_fields,
+    sla_hours,
+    sla_transition_fields,
+    transition_filter,
+)
+
+def test_every_status_has_transitions():
+    assert set(ALLOWED_TRANSITIONS) == set(ReportStatus)
+
+def test_closed_is_final():
+    assert ALLOWED_TRANSITIONS[ReportStatus.CLOSED] == set()
+    assert ReportStatus.CLOSED.value not in allowed_sources(ReportStatus.IN_PROGRESS)
+
+def test_allowed_sources_follow_transitions():
+    for new_status in ReportStatus:
+        sources = set(allowed_sources(new_status))
+        for old_status, targets in ALLOWED_TRANSITIONS.items():
+            assert (old_status.value in sources) == (new_status in targets)
+
+def test_reopen_from_done_or_rejected():
+    assert set(allowed_sources(ReportStatus.CLOSED)) == {
+        ReportStatus.DONE.value, ReportStatus.REJECTED.value
+    }
+    assert ReportStatus.DONE.value in allowed_sources(ReportStatus.IN_PROGRESS)
+
+def test_transition_filter():
+    assert transition_filter(ReportStatus.DONE) == {
+        "status": {"$in": allowed_sources(ReportStatus.DONE)}
+    }
+    assert transition_filter(ReportStatus.DONE, 3)["version"] == 3
+    # Reports written before versioning have no version field
+    assert transition_filter(ReportStatus.DONE, 0)["version"] == {"$in": [0, None]}
+    # Nothing may become submitted again
+    assert transition_filter(ReportStatus.SUBMITTED) == {"status": {"$in": []}}
+
+def test_open_and_closed_statuses_partition():
+    assert OPEN_STATUSES | CLOSED_STATUSES == set(ReportStatus)
+    assert not OPEN_STATUSES & CLOSED_STATUSES
+
+def test_sla_hours():
+    assert sla_hours("roads", "high") == SLA_HOURS["high"]
+    assert sla_hours("WaterSupply", "CRITICAL") == DEPARTMENT_SLA_HOURS[("watersupply", "critical")]
+    assert sla_hours("roads", None) == DEFAULT_SLA_HOURS
+    assert sla_hours(None, "unknown") == DEFAULT_SLA_HOURS
+
+def test_describe_sla():
+    assert describe_sla(24) == "Within 1 day"
+    assert describe_sla(72) == "Within 3 days"
+    assert describe_sla(12) == "Within 12 hours"
+
+def test_sla_fields():
+    start = datetime(2026, 5, 1, 9, 0)
+    fields = sla_fields("drainage", "critical", start)
+    assert fields["sla_hours"] == 12
+    assert fields["sla_due_at"] == fields["sla_breach_at"] == start + timedelta(hours=12)
+    assert fields["estimated_resolution_time"] == "Within 12 hours"
+
+def test_closing_stops_the_sla_timer():
+    now = datetime(2026, 5, 1, 9, 0)
+    for closed_status in CLOSED_STATUSES:
+        assert sla_transition_fields(closed_status, now) == {"sla_breach_at": None}
+    assert "sla_due_at" in sla_transition_fields(ReportStatus.IN_PROGRESS, now)
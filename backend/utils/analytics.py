@@ -0,0 +1,311 @@
+"""
+Pre-aggregated report analytics
+
+Report events are folded into rollup documents in report_rollups, one per
+(hour or day, department, category), counting reports created, resolved,
+rejected and reopened. Time to resolve is kept as a sum plus a histogram
+with HISTOGRAM_STEPS_PER_DOUBLING log-spaced bins per doubling of the
+duration (about 19% wide), so medians and percentiles can be merged across
+any range of rollups without keeping raw durations. Analytics queries read
+rollups only: a year of daily data for one department is a few thousand
+small documents, however many reports there are.
+
+Hourly rollups expire after ANALYTICS_HOURLY_RETENTION_DAYS; daily ones
+are kept.
+"""
+import math
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+
+from database import (
+    get_report_rollups_collection,
+    get_reports_collection,
+    get_counters_collection,
+    routed
+)
+from models.schemas import OutboxEventInDB, OutboxEventType, ReportStatus
+from utils.workflow import OPEN_STATUSES
+from utils.report_archive import union_with_archive
+
+# Configuration
+ANALYTICS_HOURLY_RETENTION_DAYS = int(os.getenv("ANALYTICS_HOURLY_RETENTION_DAYS", 90))
+HISTOGRAM_STEPS_PER_DOUBLING = 4
+
+GRANULARITIES = ("hour", "day")
+INTERVALS = ("hour", "day", "week", "month")
+COUNTERS = ("created", "resolved", "rejected", "reopened")
+
+_OPEN_VALUES = {open_status.value for open_status in OPEN_STATUSES}
+_FINISHED_VALUES = {ReportStatus.DONE.value, ReportStatus.REJECTED.value}
+
+def bucket_start(timestamp: datetime, interval: str) -> datetime:
+    """Start of the hour, day, ISO week or month containing ``timestamp``"""
+    if interval == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    day = timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    if interval == "week":
+        return day - timedelta(days=day.weekday())
+    if interval == "month":
+        return day.replace(day=1)
+    return day
+
+def histogram_bin(seconds: float) -> int:
+    """Histogram bin of a time to resolve"""
+    return int(HISTOGRAM_STEPS_PER_DOUBLING * math.log2(1 + max(seconds, 0) / 60))
+
+def bin_hours(index: int) -> float:
+    """Representative duration of a bin (its geometric middle), in hours"""
+    minutes = 2 ** ((index + 0.5) / HISTOGRAM_STEPS_PER_DOUBLING) - 1
+    return minutes / 60
+
+def histogram_percentile(histogram: Dict[int, int], fraction: float) -> Optional[float]:
+    """Approximate percentile, in hours, of a merged histogram"""
+    total = sum(histogram.values())
+    if not total:
+        return None
+    rank = fraction * total
+    seen = 0
+    for index in sorted(histogram):
+        seen += histogram[index]
+        if seen >= rank:
+            return round(bin_hours(index), 2)
+    return round(bin_hours(max(histogram)), 2)
+
+def _rollup_id(granularity: str, start: datetime, department: str, category: str) -> str:
+    return f"{granularity}:{start.isoformat()}:{department}:{category}"
+
+async def ensure_analytics_indexes():
+    """Create rollup indexes and build rollups on first deployment"""
+    rollups_collection = get_report_rollups_collection()
+    await rollups_collection.create_index(
+        [("granularity", ASCENDING), ("bucket_start", ASCENDING), ("department", ASCENDING)]
+    )
+    await rollups_collection.create_index(
+        [("expires_at", ASCENDING)], expireAfterSeconds=0
+    )
+    if not await rollups_collection.find_one({}, {"_id": 1}):
+        await rebuild_rollups()
+
+async def _apply(
+    timestamp: datetime,
+    department: Optional[str],
+    category: Optional[str],
+    increments: dict,
+    seq: Optional[int] = None
+):
+    """
+    Add ``increments`` to the hourly and daily rollups of ``timestamp``.
+    Each rollup sees events in seq order, so one already applied is
+    recognised and skipped on redelivery.
+    """
+    department = (department or "others").lower()
+    category = (category or "other").lower()
+    rollups_collection = get_report_rollups_collection()
+    for granularity in GRANULARITIES:
+        start = bucket_start(timestamp, granularity)
+        query = {"_id": _rollup_id(granularity, start, department, category)}
+        update = {
+            "$inc": increments,
+            "$setOnInsert": {
+                "granularity": granularity,
+                "bucket_start": start,
+                "department": department,
+                "category": category,
+                "expires_at": (
+                    start + timedelta(days=ANALYTICS_HOURLY_RETENTION_DAYS)
+                    if granularity == "hour" else None
+                )
+            }
+        }
+        if seq is not None:
+            query["applied_seq"] = {"$not": {"$gte": seq}}
+            update["$set"] = {"applied_seq": seq}
+        try:
+            await rollups_collection.update_one(query, update, upsert=True)
+        except DuplicateKeyError:
+            # Already applied
+            pass
+
+def resolution_increments(created_at: Optional[datetime], resolved_at: datetime) -> dict:
+    increments = {"resolved": 1}
+    if created_at is not None:
+        seconds = (resolved_at - created_at).total_seconds()
+        increments.update({
+            "resolve_seconds": seconds,
+            "resolve_count": 1,
+            f"histogram.{histogram_bin(seconds)}": 1
+        })
+    return increments
+
+async def record_report_event(event: OutboxEventInDB):
+    """Fold one report event into the rollups"""
+    payload = event.payload
+    department, category = payload.get("department"), payload.get("category")
+
+    if event.type == OutboxEventType.REPORT_CREATED:
+        await _apply(
+            payload.get("created_at") or event.created_at,
+            department, category, {"created": 1}, event.seq
+        )
+        return
+
+    old_status, new_status = payload.get("old_status"), payload.get("new_status")
+    increments = {}
+    if new_status == ReportStatus.DONE.value:
+        increments.update(resolution_increments(payload.get("created_at"), event.created_at))
+    elif new_status == ReportStatus.REJECTED.value:
+        increments["rejected"] = 1
+    if old_status in _FINISHED_VALUES and new_status in _OPEN_VALUES:
+        increments["reopened"] = 1
+    if increments:
+        await _apply(event.created_at, department, category, increments, event.seq)
+
+async def rebuild_rollups():
+    """
+    Build rollups from existing reports and their update history. Events
+    up to the current outbox seq are treated as already applied.
+    """
+    counter = await get_counters_collection().find_one({"_id": "outbox"})
+    applied_seq = counter["seq"] if counter else 0
+
+    # (granularity, bucket start, department, category) -> field totals
+    totals: Dict[tuple, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+
+    def add(timestamp: datetime, department: str, category: str, increments: dict):
+        for granularity in GRANULARITIES:
+            key = (granularity, bucket_start(timestamp, granularity),
+                   (department or "others").lower(), (category or "other").lower())
+            for field, value in increments.items():
+                totals[key][field] += value
+
+    cursor = get_reports_collection().aggregate([
+        {"$project": {"created_at": 1, "department": 1, "category": 1, "updates": 1}},
+        union_with_archive({})
+    ])
+    async for report_doc in cursor:
+        created_at = report_doc.get("created_at")
+        if created_at is None:
+            continue
+        department, category = report_doc.get("department"), report_doc.get("category")
+        add(created_at, department, category, {"created": 1})
+        previous = ReportStatus.SUBMITTED.value
+        for update in report_doc.get("updates") or []:
+            status, updated_at = update.get("status"), update.get("created_at")
+            if updated_at is None:
+                continue
+            if status == ReportStatus.DONE.value:
+                add(updated_at, department, category, resolution_increments(created_at, updated_at))
+            elif status == ReportStatus.REJECTED.value:
+                add(updated_at, department, category, {"rejected": 1})
+            if previous in _FINISHED_VALUES and status in _OPEN_VALUES:
+                add(updated_at, department, category, {"reopened": 1})
+            previous = status
+
+    rollups_collection = get_report_rollups_collection()
+    for (granularity, start, department, category), values in totals.items():
+        rollup = {
+            "granularity": granularity,
+            "bucket_start": start,
+            "department": department,
+            "category": category,
+            "applied_seq": applied_seq,
+            "expires_at": (
+                start + timedelta(days=ANALYTICS_HOURLY_RETENTION_DAYS)
+                if granularity == "hour" else None
+            ),
+            "histogram": {}
+        }
+        for field, value in values.items():
+            if field.startswith("histogram."):
+                rollup["histogram"][field.split(".", 1)[1]] = int(value)
+            else:
+                rollup[field] = value
+        await rollups_collection.replace_one(
+            {"_id": _rollup_id(granularity, start, department, category)},
+            rollup,
+            upsert=True
+        )
+    print(f"📊 Report rollups rebuilt: {len(totals)} buckets (events up to seq {applied_seq} included)")
+
+def _read_rollups(
+    start: datetime,
+    end: datetime,
+    interval: str,
+    department: Optional[str],
+    category: Optional[str]
+):
+    query = {
+        "granularity": "hour" if interval == "hour" else "day",
+        "bucket_start": {"$gte": bucket_start(start, "hour" if interval == "hour" else "day"), "$lt": end}
+    }
+    if department:
+        query["department"] = department.lower()
+    if category:
+        query["category"] = category.lower()
+    return routed(get_report_rollups_collection(), "stats").find(
+        query, {"applied_seq": 0, "expires_at": 0}
+    )
+
+def _merge(target: dict, rollup: dict):
+    for field in COUNTERS + ("resolve_seconds", "resolve_count"):
+        target[field] = target.get(field, 0) + rollup.get(field, 0)
+    histogram = target.setdefault("histogram", defaultdict(int))
+    for index, count in (rollup.get("histogram") or {}).items():
+        histogram[int(index)] += count
+
+def _summarize(merged: dict) -> dict:
+    histogram = merged.get("histogram") or {}
+    resolve_count = merged.get("resolve_count", 0)
+    return {
+        **{field: int(merged.get(field, 0)) for field in COUNTERS},
+        "avg_resolution_hours": (
+            round(merged["resolve_seconds"] / resolve_count / 3600, 2) if resolve_count else None
+        ),
+        "median_resolution_hours": histogram_percentile(histogram, 0.5),
+        "p90_resolution_hours": histogram_percentile(histogram, 0.9),
+        "p95_resolution_hours": histogram_percentile(histogram, 0.95),
+    }
+
+async def query_timeseries(
+    start: datetime,
+    end: datetime,
+    interval: str = "day",
+    department: Optional[str] = None,
+    category: Optional[str] = None,
+    group_by: Optional[str] = None
+) -> List[dict]:
+    """Counts and resolution times per interval, optionally per group"""
+    merged: Dict[tuple, dict] = {}
+    async for rollup in _read_rollups(start, end, interval, department, category):
+        group = rollup.get(group_by) if group_by else None
+        key = (bucket_start(rollup["bucket_start"], interval), group)
+        _merge(merged.setdefault(key, {}), rollup)
+
+    points = []
+    for (point_start, group), values in sorted(merged.items(), key=lambda item: (item[0][0], item[0][1] or "")):
+        point = {"bucket_start": point_start, **_summarize(values)}
+        if group_by:
+            point[group_by] = group
+        points.append(point)
+    return points
+
+async def query_resolution(
+    start: datetime,
+    end: datetime,
+    group_by: str = "department",
+    department: Optional[str] = None,
+    category: Optional[str] = None
+) -> List[dict]:
+    """Totals and resolution percentiles per group over the whole range"""
+    merged: Dict[str, dict] = {}
+    async for rollup in _read_rollups(start, end, "day", department, category):
+        _merge(merged.setdefault(rollup.get(group_by), {}), rollup)
+    return [
+        {group_by: group, **_summarize(values)}
+        for group, values in sorted(merged.items(), key=lambda item: item[0] or "")
+    ]
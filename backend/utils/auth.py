@@ -6,13 +6,16 @@ from typing import Optional
 import jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
 import os
 from dotenv import load_dotenv
 
 # TODO: Add MongoDB imports when implementing database integration
-from database import get_users_collection
-from models.schemas import UserInDB, TokenData
+from database import get_users_collection, current_tenant, MULTI_TENANT, DEFAULT_TENANT
+from models.schemas import UserInDB, TokenData, UserType, Department
+from utils.revocation import revocation_list
+from utils.cache import cache
+from utils import passwords
 
 load_dotenv()
 
@@ -20,53 +23,129 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
-
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Authorize requests from token claims alone, without loading the user
+AUTH_STATELESS = os.getenv("AUTH_STATELESS", "false").lower() == "true"
+# How long a loaded user is reused by later requests of the same user
+AUTH_USER_CACHE_SECONDS = float(os.getenv("AUTH_USER_CACHE_SECONDS", 60))
 
 # Security scheme
 security = HTTPBearer()
 
+# Hash verified for unknown emails so they take as long as known ones
+_dummy_password_hash: Optional[str] = None
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a plaintext password against its hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    """Verify a plaintext password against its hash (any supported format)"""
+    return passwords.verify_password(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
     """Hash a password for storing in database"""
-    return pwd_context.hash(password)
+    return passwords.hash_password(password)
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    """Create a JWT access token"""
+def user_token_claims(user: UserInDB) -> dict:
+    """Claims embedded in access tokens for stateless authorization"""
+    return {
+        "sub": user.email,
+        "uid": user.id,
+        "name": user.name,
+        "user_type": user.user_type.value,
+        "department": user.department.value if user.department else None,
+        "is_active": user.is_active
+    }
+
+def create_access_token(
+    data: dict,
+    expires_delta: Optional[timedelta] = None,
+    user: Optional[UserInDB] = None
+):
+    """Create a JWT access token, embedding ``user``'s claims when given"""
     to_encode = data.copy()
+    if user is not None:
+        to_encode.update(user_token_claims(user))
+    if MULTI_TENANT:
+        to_encode["tenant"] = current_tenant()
+    now = datetime.utcnow()
     if expires_delta:
-        expire = datetime.utcnow() + expires_delta
+        expire = now + expires_delta
     else:
-        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        expire = now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "iat": now})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 def verify_token(token: str) -> dict:
-    """Verify and decode a JWT token"""
+    """Verify and decode a JWT token issued for the current tenant"""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
     except jwt.PyJWTError:
+        payload = None
+    # Tokens from before multi-tenancy belong to the default tenant
+    if payload is None or (MULTI_TENANT and payload.get("tenant", DEFAULT_TENANT) != current_tenant()):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    return payload
+
+def user_from_claims(payload: dict) -> Optional[UserInDB]:
+    """
+    Build the current user from verified token claims.
+
+    Returns None when the token predates embedded claims or has been
+    revoked, in which case the user must be loaded from the database. The
+    result only carries the fields in user_token_claims(); endpoints that
+    need the full profile depend on get_current_user_from_db instead.
+    """
+    if "uid" not in payload or "user_type" not in payload:
+        return None
+    
+    issued_at = datetime.utcfromtimestamp(payload.get("iat", 0))
+    if revocation_list.is_revoked(payload["uid"], issued_at):
+        return None
+    
+    return UserInDB.model_construct(
+        id=payload["uid"],
+        name=payload.get("name", ""),
+        email=payload["sub"],
+        phone="",
+        user_type=UserType(payload["user_type"]),
+        department=Department(payload["department"]) if payload.get("department") else None,
+        password_hash="",
+        is_active=payload.get("is_active", True),
+        created_at=issued_at
+    )
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security)
 ) -> UserInDB:
     """
     Dependency to get current authenticated user from JWT token
-    """
-    token = credentials.credentials
     
+    In stateless mode the user comes from the token claims and no database
+    call is made unless the token has been revoked. Otherwise the user is
+    read through the cache, without its password hash.
+    """
+    return await _resolve_current_user(credentials.credentials, AUTH_STATELESS, cached=True)
+
+async def get_current_user_from_db(
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+) -> UserInDB:
+    """
+    Dependency to get the full, current user document for the JWT token
+    """
+    return await _resolve_current_user(credentials.credentials, False)
+
+async def _load_user(email: str) -> Optional[dict]:
+    return await get_users_collection().find_one(
+        {"email": email}, {"_id": 0, "password_hash": 0}
+    )
+
+async def _resolve_current_user(token: str, allow_stateless: bool, cached: bool = False) -> UserInDB:
+    """
+    Verify the token and return its user, from claims when allowed
+    """
     try:
         payload = verify_token(token)
         user_email: str = payload.get("sub")
@@ -81,8 +160,24 @@ async def get_current_user(
             detail="Could not validate credentials",
         )
     
-    users_collection = get_users_collection()
-    user_doc = await users_collection.find_one({"email": user_email})
+    if allow_stateless:
+        user = user_from_claims(payload)
+        if user is not None:
+            if not user.is_active:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Inactive user",
+                )
+            return user
+    
+    if cached:
+        user_doc = await cache.get_or_load(
+            "users", user_email, lambda: _load_user(user_email), AUTH_USER_CACHE_SECONDS
+        )
+        if user_doc is not None:
+            user_doc = {**user_doc, "password_hash": ""}
+    else:
+        user_doc = await get_users_collection().find_one({"email": user_email})
     if user_doc is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -120,17 +215,48 @@ async def get_officer_or_admin_user(current_user: UserInDB = Depends(get_current
         )
     return current_user
 
+async def revoke_user_tokens(user_id: str, reason: str):
+    """
+    Void access tokens already issued to a user, e.g. after deactivation or
+    a role change, so their embedded claims are no longer trusted. Cached
+    users are dropped as well; they are cached by email, not id.
+    """
+    await revocation_list.revoke(
+        user_id, reason, timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    await cache.invalidate("users")
+
 async def authenticate_user(email: str, password: str) -> Optional[UserInDB]:
     """
     Authenticate a user by email and password
+    
+    Hashing runs in a worker thread so it does not stall the event loop. A
+    hash on an outdated scheme or cost is replaced after a successful login.
     """
+    global _dummy_password_hash
     users_collection = get_users_collection()
     user_doc = await users_collection.find_one({"email": email})
     if not user_doc:
+        # Same work as a wrong password, so response time does not reveal
+        # which emails are registered
+        if _dummy_password_hash is None:
+            _dummy_password_hash = await run_in_threadpool(get_password_hash, "dummy-password")
+        await run_in_threadpool(verify_password, password, _dummy_password_hash)
         return None
     
     user = UserInDB(**user_doc)
-    if not verify_password(password, user.password_hash):
+    verified, new_hash = await run_in_threadpool(
+        passwords.verify_and_update, password, user.password_hash
+    )
+    if not verified:
         return None
     
+    if new_hash:
+        # Only replace the hash that was verified, in case it changed meanwhile
+        await users_collection.update_one(
+            {"id": user.id, "password_hash": user.password_hash},
+            {"$set": {"password_hash": new_hash}}
+        )
+        user.password_hash = new_hash
+    
     return user
\ No newline at end of file
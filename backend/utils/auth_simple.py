@@ -5,13 +5,13 @@ Simplified for Render deployment compatibility
 from datetime import datetime, timedelta
 from typing import Optional
 import jwt
-import hashlib
-import secrets
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import os
 from dotenv import load_dotenv
 
+from utils import passwords
+
 load_dotenv()
 
 # Configuration
@@ -23,22 +23,13 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
 security = HTTPBearer()
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a plaintext password against its hash using simple SHA-256"""
-    # Create salt from first 32 chars of hashed password
-    salt = hashed_password[:32]
-    # Hash the plain password with salt
-    key = hashlib.pbkdf2_hmac('sha256', plain_password.encode('utf-8'), salt.encode('utf-8'), 100000)
-    # Compare with stored hash
-    return salt + key.hex() == hashed_password
+    """Verify a plaintext password against its hash (any supported format)"""
+    return passwords.verify_password(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    """Hash a password for storing in database using simple SHA-256"""
-    # Generate a random salt
-    salt = secrets.token_hex(16)
-    # Hash the password with salt
-    key = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt.encode('utf-8'), 100000)
-    # Return salt + hash
-    return salt + key.hex()
+    """Hash a password for storing in database using PBKDF2-SHA256"""
+    # Stays on the stdlib-only scheme so no bcrypt build is needed
+    return passwords.hash_password(password, scheme=passwords.PBKDF2_SHA256)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token"""
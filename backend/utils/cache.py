@@ -0,0 +1,467 @@
+"""
+Two-tier cache for the API workers
+
+Each gunicorn worker keeps an LRU of recently used values (the local tier).
+Behind it sits an optional shared tier seen by every worker on the host:
+files in a tmpfs directory (CACHE_SHARED_BACKEND=shm) or Redis
+(CACHE_SHARED_BACKEND=redis, needs the redis package).
+
+Values live in namespaces. Every namespace has a generation, kept in
+counters and part of each key, so invalidating a whole namespace is a
+generation bump: entries of older generations are never read again and
+age out. Invalidations are written to cache_invalidations and applied by
+every worker when it polls that collection (as the revocation list does);
+the worker that invalidates applies them at once.
+
+A miss is loaded once per worker however many requests ask for the same
+key concurrently (single-flight), and hits, misses and coalesced loads are
+counted per namespace for /health.
+
+With several tenants, namespaces, generations and invalidations are kept
+per tenant: a namespace is qualified with the current tenant, so tenants
+never read each other's entries.
+
+Report views are cached per department (report_namespace()), and report
+writes are invalidated from the outbox, once per batch of report events,
+for the departments the batch touched. Other users see a write once the
+relay has dispatched it; the writer itself reads past the cache with its
+causal token (see database.causal_read()).
+
+Values must be JSON-serializable. A value read from the shared tier comes
+back as parsed JSON (datetimes as ISO strings), so callers rebuild models
+from it rather than relying on Python types. Cached values are shared
+between requests and must not be mutated.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import time
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+from pymongo import ASCENDING, UpdateOne
+
+from database import (
+    get_counters_collection,
+    get_cache_invalidations_collection,
+    current_tenant,
+    for_each_tenant,
+    MULTI_TENANT
+)
+from utils.responses import dumps
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # pragma: no cover - optional dependency
+    redis_asyncio = None
+
+# Configuration
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+CACHE_LOCAL_MAX_ENTRIES = int(os.getenv("CACHE_LOCAL_MAX_ENTRIES", 5000))
+CACHE_SHARED_BACKEND = os.getenv("CACHE_SHARED_BACKEND", "none")  # none, shm or redis
+CACHE_SHARED_DIR = os.getenv(
+    "CACHE_SHARED_DIR",
+    "/dev/shm/civicreporter-cache" if os.path.isdir("/dev/shm")
+    else os.path.join(tempfile.gettempdir(), "civicreporter-cache")
+)
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+CACHE_INVALIDATION_POLL_SECONDS = float(os.getenv("CACHE_INVALIDATION_POLL_SECONDS", 1.0))
+# Re-read window covering invalidations that commit out of created_at order
+CACHE_INVALIDATION_OVERLAP = timedelta(seconds=5)
+CACHE_INVALIDATION_RETENTION = timedelta(hours=1)
+
+def _loads(raw: bytes) -> Any:
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+def cache_key(*parts: Any) -> str:
+    """Key for values derived from ``parts`` (queries, page bounds...)"""
+    fingerprint = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()
+
+class SingleFlight:
+    """
+    Runs one load per key at a time; concurrent callers share its result.
+    The load runs as its own task, so a caller that goes away (e.g. a
+    client disconnecting) does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    async def do(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Result of ``loader()`` for ``key``, and whether it was shared"""
+        task = self._calls.get(key)
+        if task is not None:
+            return await asyncio.shield(task), True
+        task = asyncio.ensure_future(loader())
+        self._calls[key] = task
+        task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task), False
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        self._calls.pop(key, None)
+        # Retrieved here in case every caller went away before it finished
+        if not task.cancelled():
+            task.exception()
+
+class LocalTier:
+    """Per-worker LRU with per-entry expiry"""
+
+    def __init__(self, max_entries: int = CACHE_LOCAL_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.evictions = 0
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires, value = entry
+        if expires <= time.monotonic():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def set(self, key: str, value: Any, ttl: float):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    def drop_namespace(self, namespace: str):
+        prefix = f"{namespace}:"
+        for key in [key for key in self._entries if key.startswith(prefix)]:
+            del self._entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class ShmTier:
+    """
+    Shared tier in a tmpfs directory: one file per key, named by its hash,
+    holding the expiry time and the JSON value. Writes go through a
+    temporary file and a rename, so readers never see a partial value.
+    """
+
+    name = "shm"
+    _EXPIRY = struct.Struct("<d")
+
+    def __init__(self, directory: str = CACHE_SHARED_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(key.encode("utf-8")).hexdigest())
+
+    async def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as entry_file:
+                raw = entry_file.read()
+        except FileNotFoundError:
+            return None
+        if len(raw) < self._EXPIRY.size or self._EXPIRY.unpack_from(raw)[0] <= time.time():
+            return None
+        return raw[self._EXPIRY.size:]
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        path = self._path(key)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "wb") as entry_file:
+            entry_file.write(self._EXPIRY.pack(time.time() + ttl) + value)
+        os.replace(temporary_path, path)
+
+    async def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def sweep(self):
+        """Remove expired entries, including those of old generations"""
+        now = time.time()
+        for entry in os.scandir(self.directory):
+            try:
+                with open(entry.path, "rb") as entry_file:
+                    header = entry_file.read(self._EXPIRY.size)
+                if len(header) < self._EXPIRY.size or self._EXPIRY.unpack(header)[0] <= now:
+                    os.remove(entry.path)
+            except (FileNotFoundError, struct.error):
+                pass
+
+class RedisTier:
+    """Shared tier in Redis; entries expire through Redis TTLs"""
+
+    name = "redis"
+
+    def __init__(self, url: str = CACHE_REDIS_URL):
+        self._client = redis_asyncio.from_url(url)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._client.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self._client.set(key, value, px=max(1, int(ttl * 1000)))
+
+    async def delete(self, key: str):
+        await self._client.delete(key)
+
+    def sweep(self):
+        pass
+
+def _shared_tier(backend: str):
+    if backend == "shm":
+        return ShmTier()
+    if backend == "redis":
+        if redis_asyncio is None:
+            print("⚠️  CACHE_SHARED_BACKEND=redis but the redis package is not installed")
+            return None
+        return RedisTier()
+    return None
+
+class Cache:
+    """Local LRU plus optional shared tier, with cross-worker invalidation"""
+
+    def __init__(self, shared=None, max_entries: int = CACHE_LOCAL_MAX_ENTRIES):
+        self.local = LocalTier(max_entries)
+        self.shared = shared
+        self._generations: Dict[str, int] = defaultdict(int)
+        self._flights = SingleFlight()
+        self._counts: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._last_seen: Dict[str, datetime] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def shared_backend(self) -> str:
+        return self.shared.name if self.shared is not None else "none"
+
+    @staticmethod
+    def _scoped(namespace: str) -> str:
+        """``namespace`` of the current tenant"""
+        return f"{current_tenant()}/{namespace}" if MULTI_TENANT else namespace
+
+    def _key(self, namespace: str, key: str) -> str:
+        return f"{namespace}:{self._generations[namespace]}:{key}"
+
+    async def get_or_load(
+        self,
+        namespace: str,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: float
+    ) -> Any:
+        """Cached value of ``key`` in ``namespace``, loading it on a miss"""
+        if not CACHE_ENABLED:
+            return await loader()
+        namespace = self._scoped(namespace)
+        counts = self._counts[namespace]
+        full_key = self._key(namespace, key)
+
+        found, value = self.local.get(full_key)
+        if found:
+            counts["local_hits"] += 1
+            return value
+
+        if self.shared is not None:
+            try:
+                raw = await self.shared.get(full_key)
+            except Exception as e:
+                counts["shared_errors"] += 1
+                print(f"⚠️  Shared cache read failed: {e}")
+                raw = None
+            if raw is not None:
+                counts["shared_hits"] += 1
+                value = _loads(raw)
+                self.local.set(full_key, value, ttl)
+                return value
+
+        async def load():
+            counts["misses"] += 1
+            loaded = await loader()
+            # Not stored if the namespace was invalidated during the load
+            if self._key(namespace, key) == full_key:
+                self.local.set(full_key, loaded, ttl)
+                if self.shared is not None:
+                    try:
+                        await self.shared.set(full_key, dumps(loaded), ttl)
+                    except Exception as e:
+                        counts["shared_errors"] += 1
+                        print(f"⚠️  Shared cache write failed: {e}")
+            return loaded
+
+        if full_key in self._flights:
+            counts["coalesced"] += 1
+        value, _ = await self._flights.do(full_key, load)
+        return value
+
+    # Invalidation
+    def _apply(self, invalidation: dict):
+        namespace = self._scoped(invalidation["namespace"])
+        if invalidation.get("key") is not None:
+            self.local.delete(self._key(namespace, invalidation["key"]))
+        elif invalidation.get("generation", 0) > self._generations[namespace]:
+            self._generations[namespace] = invalidation["generation"]
+            self.local.drop_namespace(namespace)
+
+    async def invalidate(self, namespace: str, key: Optional[str] = None):
+        """Drop one key, or the whole namespace, in every worker"""
+        if not CACHE_ENABLED:
+            return
+        if key is None:
+            await self.invalidate_namespaces([namespace])
+            return
+        if self.shared is not None:
+            await self.shared.delete(self._key(self._scoped(namespace), key))
+        invalidation = {"namespace": namespace, "key": key, "created_at": datetime.utcnow()}
+        self._counts[self._scoped(namespace)]["invalidations"] += 1
+        self._apply(invalidation)
+        await get_cache_invalidations_collection().insert_one(invalidation)
+
+    async def invalidate_namespaces(self, namespaces: Iterable[str]):
+        """
+        Drop whole namespaces in every worker: one bulk generation bump and
+        one insert however many namespaces there are
+        """
+        if not CACHE_ENABLED:
+            return
+        namespaces = list(dict.fromkeys(namespaces))
+        if not namespaces:
+            return
+        counters_collection = get_counters_collection()
+        counter_ids = [f"cache:{namespace}" for namespace in namespaces]
+        await counters_collection.bulk_write(
+            [UpdateOne({"_id": counter_id}, {"$inc": {"generation": 1}}, upsert=True)
+             for counter_id in counter_ids],
+            ordered=False
+        )
+        # A concurrent bump read here only invalidates a little more
+        generations = {
+            counter["_id"]: counter["generation"]
+            async for counter in counters_collection.find({"_id": {"$in": counter_ids}})
+        }
+        created_at = datetime.utcnow()
+        invalidations = []
+        for namespace, counter_id in zip(namespaces, counter_ids):
+            invalidation = {
+                "namespace": namespace,
+                "key": None,
+                "generation": generations[counter_id],
+                "created_at": created_at
+            }
+            self._counts[self._scoped(namespace)]["invalidations"] += 1
+            self._apply(invalidation)
+            invalidations.append(invalidation)
+        await get_cache_invalidations_collection().insert_many(invalidations)
+
+    async def refresh(self):
+        """Apply the current tenant's invalidations made by other workers since the last poll"""
+        tenant = current_tenant()
+        query = {}
+        if tenant in self._last_seen:
+            query["created_at"] = {"$gt": self._last_seen[tenant] - CACHE_INVALIDATION_OVERLAP}
+        cursor = get_cache_invalidations_collection().find(query).sort("created_at", ASCENDING)
+        async for invalidation in cursor:
+            self._apply(invalidation)
+            self._last_seen[tenant] = max(
+                self._last_seen.get(tenant, invalidation["created_at"]), invalidation["created_at"]
+            )
+
+    async def _load_generations(self):
+        await get_cache_invalidations_collection().create_index(
+            [("created_at", ASCENDING)],
+            expireAfterSeconds=int(CACHE_INVALIDATION_RETENTION.total_seconds())
+        )
+        async for counter in get_counters_collection().find({"_id": {"$regex": "^cache:"}}):
+            self._generations[self._scoped(counter["_id"][len("cache:"):])] = counter.get("generation", 0)
+        self._last_seen[current_tenant()] = datetime.utcnow()
+
+    async def start(self):
+        """Load namespace generations and follow invalidations"""
+        if self._task is not None:
+            return
+        await for_each_tenant(self._load_generations)
+        self._task = asyncio.create_task(self._poll())
+        print(f"🧊 Cache started (shared tier: {self.shared_backend})")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _poll(self):
+        polls = 0
+        while True:
+            await asyncio.sleep(CACHE_INVALIDATION_POLL_SECONDS)
+            try:
+                await for_each_tenant(self.refresh)
+                polls += 1
+                if self.shared is not None and polls % 60 == 0:
+                    await asyncio.to_thread(self.shared.sweep)
+            except Exception as e:
+                print(f"⚠️  Cache invalidation refresh failed: {e}")
+
+    def stats(self) -> dict:
+        """Hit rates and counters per namespace"""
+        namespaces = {}
+        for namespace, counts in self._counts.items():
+            hits = counts["local_hits"] + counts["shared_hits"]
+            lookups = hits + counts["misses"] + counts["coalesced"]
+            namespaces[namespace] = {
+                **counts,
+                "hit_rate": round(hits / lookups, 3) if lookups else None
+            }
+        return {
+            "enabled": CACHE_ENABLED,
+            "shared_backend": self.shared_backend,
+            "local_entries": len(self.local),
+            "local_evictions": self.local.evictions,
+            "namespaces": namespaces
+        }
+
+# Shared cache of this worker
+cache = Cache(_shared_tier(CACHE_SHARED_BACKEND) if CACHE_ENABLED else None)
+
+# Namespaces holding report data, invalidated whenever reports change
+REPORT_NAMESPACES = ("report_lists", "report_stats")
+# Scope of report views that are not limited to one department
+ALL_DEPARTMENTS = "all"
+
+def report_namespace(namespace: str, department: Optional[str] = None) -> str:
+    """
+    ``namespace`` for views of one department's reports, or for views that
+    may span departments when ``department`` is None
+    """
+    return f"{namespace}.{department.lower() if department else ALL_DEPARTMENTS}"
+
+async def invalidate_report_caches(departments: Iterable[Optional[str]]):
+    """
+    Drop cached report views after writes to reports of ``departments``:
+    the views of those departments and every view spanning departments.
+    Views of other departments stay cached.
+    """
+    scopes = {None, *(department.lower() for department in departments if department)}
+    await cache.invalidate_namespaces(
+        report_namespace(namespace, department)
+        for namespace in REPORT_NAMESPACES
+        for department in sorted(scopes, key=lambda scope: scope or "")
+    )
@@ -0,0 +1,61 @@
+"""
+Coalescing of identical concurrent queries
+
+When many requests run the same query at once (e.g. every officer of a
+department opening the report list at shift start), the first one runs it
+and the others wait for its result instead of sending their own copy to
+the database. Queries are identified by tenant, name and a key built from
+what determines their result: the compiled filter, sort and page.
+
+Unlike the cache, nothing is kept once the query finishes; a request that
+starts after it runs the query again. Counts per query name are reported
+under "coalescing" in /health.
+"""
+import os
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict
+
+from database import current_tenant
+from utils.cache import SingleFlight, cache_key
+
+# Configuration
+REQUEST_COALESCING_ENABLED = os.getenv("REQUEST_COALESCING_ENABLED", "true").lower() == "true"
+
+def query_key(query: dict, **page: Any) -> str:
+    """Key of a query: its filter plus sort, skip, limit and the like"""
+    return cache_key(query, page)
+
+class QueryCoalescer:
+    """Shares in-flight query results between identical requests of a worker"""
+
+    def __init__(self):
+        self._flights = SingleFlight()
+        self._counts: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    async def run(self, name: str, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Result of ``loader()``, shared with identical queries already running"""
+        if not REQUEST_COALESCING_ENABLED:
+            return await loader()
+        counts = self._counts[name]
+        flight = (current_tenant(), name, key)
+        counts["coalesced" if flight in self._flights else "executed"] += 1
+        result, _ = await self._flights.do(flight, loader)
+        return result
+
+    def stats(self) -> dict:
+        """Executed and coalesced queries per name"""
+        return {
+            "enabled": REQUEST_COALESCING_ENABLED,
+            "queries": {
+                name: {
+                    **counts,
+                    "coalesced_ratio": round(
+                        counts["coalesced"] / (counts["executed"] + counts["coalesced"]), 3
+                    )
+                }
+                for name, counts in self._counts.items()
+            }
+        }
+
+# Coalescer of this worker
+coalescer = QueryCoalescer()
@@ -0,0 +1,409 @@
+"""
+Columnar snapshot of reports for offline analytics
+
+Reports, their status updates and notifications are copied into Parquet
+files under COLUMNAR_EXPORT_DIR (COLUMNAR_EXPORT_DIR/<tenant> with several
+tenants), hive-partitioned as
+<dataset>/month=YYYY-MM/department=<dept>/ (notifications: month and
+type). The partition comes from creation time, so a document always lands
+in the same partition. Each run reads only documents changed since the
+dataset's (updated_at, id) watermark, from a secondary where one exists,
+and appends them as a new part file. Archived reports are read from
+reports_archive by archived_at instead, as archiving leaves updated_at
+alone. Readers keep the newest row per id
+(see utils/columnar_query.py), and partitions are compacted once they
+pile up parts. Analysis then runs on these files and never on the live
+database.
+
+Scheduled runs take the "columnar_export" lease in counters (see
+utils/leases.py), so one worker of the deployment exports each interval;
+with several hosts COLUMNAR_EXPORT_DIR must be storage they share. A lock
+file in the directory keeps on-demand exports (analytics_snapshot.py) from
+overlapping a scheduled one.
+
+pyarrow is optional: without it the exporter reports itself unavailable.
+Contact details of reporters are not exported.
+"""
+import asyncio
+import json
+import os
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import ReadPreference
+
+from database import (
+    get_reports_collection,
+    get_reports_archive_collection,
+    get_notifications_collection,
+    read_preference,
+    routed,
+    current_tenant,
+    for_each_tenant,
+    MULTI_TENANT,
+    READ_MAX_STALENESS_SECONDS
+)
+from utils.leases import claim_due_run
+from utils.sync import read_feed
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+
+# Configuration
+COLUMNAR_EXPORT_ENABLED = os.getenv("COLUMNAR_EXPORT_ENABLED", "false").lower() == "true"
+COLUMNAR_EXPORT_DIR = os.getenv("COLUMNAR_EXPORT_DIR", "analytics_snapshot")
+COLUMNAR_EXPORT_INTERVAL_SECONDS = float(os.getenv("COLUMNAR_EXPORT_INTERVAL_SECONDS", 3600))
+COLUMNAR_EXPORT_BATCH_SIZE = int(os.getenv("COLUMNAR_EXPORT_BATCH_SIZE", 5000))
+# Documents changed in the last seconds wait for the next run, so a
+# lagging secondary cannot make the watermark pass a write it has not seen
+COLUMNAR_EXPORT_LAG_SECONDS = int(os.getenv("COLUMNAR_EXPORT_LAG_SECONDS", 60))
+COLUMNAR_COMPACT_PARTS = int(os.getenv("COLUMNAR_COMPACT_PARTS", 8))
+
+def _settle_seconds() -> int:
+    """
+    Age after which rows are exported. Reads from a secondary may lag by up
+    to the max staleness, and rows missed that way would be skipped for good.
+    """
+    if read_preference("exports") == ReadPreference.PRIMARY:
+        return COLUMNAR_EXPORT_LAG_SECONDS
+    return COLUMNAR_EXPORT_LAG_SECONDS + READ_MAX_STALENESS_SECONDS
+
+DATASETS = ("reports", "report_updates", "notifications")
+_WATERMARKS_FILE = "_watermarks.json"
+
+def schemas() -> Dict[str, "pa.Schema"]:
+    """Arrow schemas of the exported datasets, without partition columns"""
+    timestamp = pa.timestamp("ms")
+    return {
+        "reports": pa.schema([
+            ("id", pa.string()),
+            ("title", pa.string()),
+            ("category", pa.string()),
+            ("priority", pa.string()),
+            ("status", pa.string()),
+            ("created_at", timestamp),
+            ("updated_at", timestamp),
+            ("reporter_id", pa.string()),
+            ("assigned_officer_id", pa.string()),
+            ("latitude", pa.float64()),
+            ("longitude", pa.float64()),
+            ("sla_due_at", timestamp),
+            ("escalation_level", pa.int32()),
+            ("duplicate_count", pa.int32()),
+            ("version", pa.int32()),
+        ]),
+        "report_updates": pa.schema([
+            ("id", pa.string()),
+            ("report_id", pa.string()),
+            ("status", pa.string()),
+            ("updated_by", pa.string()),
+            ("created_at", timestamp),
+        ]),
+        "notifications": pa.schema([
+            ("id", pa.string()),
+            ("user_id", pa.string()),
+            ("issue_id", pa.string()),
+            ("is_read", pa.bool_()),
+            ("created_at", timestamp),
+            ("read_at", timestamp),
+            ("updated_at", timestamp),
+        ]),
+    }
+
+# Column each dataset is deduplicated on: the newest row per id wins
+ORDER_COLUMNS = {
+    "reports": "updated_at",
+    "report_updates": "created_at",
+    "notifications": "updated_at",
+}
+
+def latest_rows(table: "pa.Table", order_column: str, key: str = "id") -> "pa.Table":
+    """Keep the row with the greatest ``order_column`` for every ``key``"""
+    if table.num_rows == 0:
+        return table
+    order = pc.sort_indices(
+        table, sort_keys=[(key, "ascending"), (order_column, "descending")]
+    )
+    ordered = table.take(order)
+    keys = ordered[key]
+    first_of_key = pc.not_equal(keys.slice(1), keys.slice(0, len(keys) - 1))
+    mask = pa.concat_arrays([
+        pa.array([True]),
+        pc.fill_null(first_of_key, True).combine_chunks()
+    ])
+    return ordered.filter(mask)
+
+def _part_name() -> str:
+    """Unique file name for a new part, sorting by creation time"""
+    return f"part-{datetime.utcnow():%Y%m%d%H%M%S%f}-{uuid.uuid4().hex[:8]}.parquet"
+
+def _try_lock(lock_file) -> bool:
+    """Take a non-blocking exclusive lock on an open file, held until it is closed"""
+    if os.name == "nt":
+        import msvcrt
+        try:
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+    import fcntl
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
+
+def _month(timestamp: Optional[datetime]) -> str:
+    return (timestamp or datetime(1970, 1, 1)).strftime("%Y-%m")
+
+def _report_rows(report_doc: dict) -> Tuple[tuple, dict, List[Tuple[tuple, dict]]]:
+    """Partition and row of a report, plus partitions and rows of its updates"""
+    department = (report_doc.get("department") or "others").lower()
+    row = {
+        "id": report_doc["id"],
+        "title": report_doc.get("title"),
+        "category": report_doc.get("category"),
+        "priority": report_doc.get("priority"),
+        "status": report_doc.get("status"),
+        "created_at": report_doc.get("created_at"),
+        "updated_at": report_doc.get("updated_at"),
+        "reporter_id": report_doc.get("reporter_id"),
+        "assigned_officer_id": report_doc.get("assigned_officer_id"),
+        "latitude": report_doc.get("latitude"),
+        "longitude": report_doc.get("longitude"),
+        "sla_due_at": report_doc.get("sla_due_at"),
+        "escalation_level": report_doc.get("escalation_level", 0),
+        "duplicate_count": report_doc.get("duplicate_count", 0),
+        "version": report_doc.get("version", 0),
+    }
+    updates = [
+        (
+            (("month", _month(update.get("created_at"))), ("department", department)),
+            {
+                "id": update.get("id"),
+                "report_id": report_doc["id"],
+                "status": update.get("status"),
+                "updated_by": update.get("updated_by"),
+                "created_at": update.get("created_at"),
+            }
+        )
+        for update in report_doc.get("updates") or []
+    ]
+    partition = (("month", _month(report_doc.get("created_at"))), ("department", department))
+    return partition, row, updates
+
+def _notification_row(notification_doc: dict) -> Tuple[tuple, dict]:
+    partition = (
+        ("month", _month(notification_doc.get("created_at"))),
+        ("type", notification_doc.get("type") or "info"),
+    )
+    return partition, {
+        "id": notification_doc["id"],
+        "user_id": notification_doc.get("user_id"),
+        "issue_id": notification_doc.get("issue_id"),
+        "is_read": notification_doc.get("is_read", False),
+        "created_at": notification_doc.get("created_at"),
+        "read_at": notification_doc.get("read_at"),
+        "updated_at": notification_doc.get("updated_at") or notification_doc.get("created_at"),
+    }
+
+class ColumnarExporter:
+    """Incremental Parquet export, run periodically or on demand"""
+
+    def __init__(
+        self,
+        directory: str = COLUMNAR_EXPORT_DIR,
+        interval: float = COLUMNAR_EXPORT_INTERVAL_SECONDS,
+        batch_size: int = COLUMNAR_EXPORT_BATCH_SIZE
+    ):
+        self.root_directory = directory
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+
+    @property
+    def directory(self) -> str:
+        """Export directory of the current tenant"""
+        if MULTI_TENANT:
+            return os.path.join(self.root_directory, current_tenant())
+        return self.root_directory
+
+    @property
+    def available(self) -> bool:
+        return pa is not None
+
+    # Watermarks
+    def _watermarks_path(self) -> str:
+        return os.path.join(self.directory, _WATERMARKS_FILE)
+
+    def load_watermarks(self) -> Dict[str, Optional[Tuple[datetime, str]]]:
+        try:
+            with open(self._watermarks_path()) as watermarks_file:
+                raw = json.load(watermarks_file)
+        except FileNotFoundError:
+            return {}
+        return {
+            feed: (datetime.fromisoformat(value[0]), value[1]) if value else None
+            for feed, value in raw.items()
+        }
+
+    def _save_watermarks(self, watermarks: Dict[str, Optional[Tuple[datetime, str]]]):
+        raw = {
+            feed: [value[0].isoformat(), value[1]] if value else None
+            for feed, value in watermarks.items()
+        }
+        temporary_path = self._watermarks_path() + ".tmp"
+        with open(temporary_path, "w") as watermarks_file:
+            json.dump(raw, watermarks_file)
+        os.replace(temporary_path, self._watermarks_path())
+
+    # Files
+    def _write_parts(self, dataset: str, rows_by_partition: Dict[tuple, List[dict]]) -> int:
+        schema = schemas()[dataset]
+        part_name = _part_name()
+        written = 0
+        for partition, rows in rows_by_partition.items():
+            partition_dir = os.path.join(
+                self.directory, dataset, *(f"{name}={value}" for name, value in partition)
+            )
+            os.makedirs(partition_dir, exist_ok=True)
+            table = pa.Table.from_pylist(rows, schema=schema)
+            pq.write_table(table, os.path.join(partition_dir, part_name))
+            written += len(rows)
+            self._compact(dataset, partition_dir)
+        return written
+
+    def _compact(self, dataset: str, partition_dir: str):
+        parts = sorted(
+            name for name in os.listdir(partition_dir) if name.endswith(".parquet")
+        )
+        if len(parts) <= COLUMNAR_COMPACT_PARTS:
+            return
+        table = pa.concat_tables(
+            pq.read_table(os.path.join(partition_dir, name), schema=schemas()[dataset])
+            for name in parts
+        )
+        compacted = latest_rows(table, ORDER_COLUMNS[dataset])
+        # Written before the old parts go, so readers never see a gap
+        pq.write_table(compacted, os.path.join(partition_dir, _part_name()))
+        for name in parts:
+            os.remove(os.path.join(partition_dir, name))
+
+    # Export
+    async def export_once(self) -> Dict[str, int]:
+        """Export everything changed since the last run; returns rows per dataset"""
+        if pa is None:
+            raise RuntimeError("pyarrow is not installed")
+        os.makedirs(self.directory, exist_ok=True)
+
+        # One exporter at a time per export directory, across workers
+        with open(os.path.join(self.directory, ".lock"), "w") as lock_file:
+            if not _try_lock(lock_file):
+                return {}
+
+            watermarks = self.load_watermarks()
+            settled_before = datetime.utcnow() - timedelta(seconds=_settle_seconds())
+            counts = defaultdict(int)
+
+            # Archived reports are exported once more, in archiving order
+            report_feeds = (
+                ("reports", get_reports_collection(), "updated_at"),
+                ("reports_archive", get_reports_archive_collection(), "archived_at"),
+            )
+            for feed, collection, ts_field in report_feeds:
+                collection = routed(collection, "exports")
+                settled = {ts_field: {"$lt": settled_before}}
+                while True:
+                    docs, next_cursor = await read_feed(
+                        collection, settled, watermarks.get(feed), self.batch_size, ts_field
+                    )
+                    if not docs:
+                        break
+                    reports_rows, updates_rows = defaultdict(list), defaultdict(list)
+                    for report_doc in docs:
+                        partition, row, updates = _report_rows(report_doc)
+                        reports_rows[partition].append(row)
+                        for update_partition, update_row in updates:
+                            updates_rows[update_partition].append(update_row)
+                    counts["reports"] += await asyncio.to_thread(
+                        self._write_parts, "reports", reports_rows
+                    )
+                    counts["report_updates"] += await asyncio.to_thread(
+                        self._write_parts, "report_updates", updates_rows
+                    )
+                    watermarks[feed] = (docs[-1][ts_field], docs[-1]["id"])
+                    self._save_watermarks(watermarks)
+                    if next_cursor is None:
+                        break
+
+            notifications_collection = routed(get_notifications_collection(), "exports")
+            while True:
+                docs, next_cursor = await read_feed(
+                    notifications_collection, {"updated_at": {"$lt": settled_before}},
+                    watermarks.get("notifications"), self.batch_size
+                )
+                if not docs:
+                    break
+                notifications_rows = defaultdict(list)
+                for notification_doc in docs:
+                    partition, row = _notification_row(notification_doc)
+                    notifications_rows[partition].append(row)
+                counts["notifications"] += await asyncio.to_thread(
+                    self._write_parts, "notifications", notifications_rows
+                )
+                watermarks["notifications"] = (docs[-1]["updated_at"], docs[-1]["id"])
+                self._save_watermarks(watermarks)
+                if next_cursor is None:
+                    break
+
+            return dict(counts)
+
+    # Scheduling
+    async def start(self):
+        if self._task is not None:
+            return
+        if pa is None:
+            print("⚠️  Columnar export enabled but pyarrow is not installed")
+            return
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._run())
+        print(f"🗄️  Columnar export every {self.interval:.0f}s to {self.root_directory}")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stopping.set()
+        await self._task
+        self._task = None
+
+    async def _run_once(self) -> Dict[str, int]:
+        if await claim_due_run("columnar_export", self.interval):
+            return await self.export_once()
+        return {}
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                exported = {
+                    tenant: counts
+                    for tenant, counts in (await for_each_tenant(self._run_once)).items()
+                    if any(counts.values())
+                }
+                if exported:
+                    print(f"🗄️  Columnar export: {exported}")
+            except Exception as e:
+                print(f"❌ Columnar export error: {e}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+# Shared exporter started with the app when COLUMNAR_EXPORT_ENABLED
+columnar_exporter = ColumnarExporter()
@@ -0,0 +1,146 @@
+"""
+Vectorized summaries over the columnar snapshot
+
+Reads the Parquet datasets written by utils/columnar_export.py with
+pyarrow.dataset, so month and department filters prune whole partition
+directories and only the needed columns are read. Part files may hold
+several versions of a row; every dataset is reduced to the newest row per
+id before it is summarized.
+"""
+import os
+from datetime import datetime
+from typing import List, Optional, Sequence
+
+from models.schemas import ReportStatus
+from utils.columnar_export import COLUMNAR_EXPORT_DIR, ORDER_COLUMNS, latest_rows
+from utils.workflow import OPEN_STATUSES
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+
+def load_dataset(
+    dataset: str,
+    columns: Sequence[str],
+    directory: str = COLUMNAR_EXPORT_DIR,
+    department: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+) -> "pa.Table":
+    """Newest row per id of ``dataset``, restricted to partitions in range"""
+    if pa is None:
+        raise RuntimeError("pyarrow is not installed")
+    path = os.path.join(directory, dataset)
+    if not os.path.isdir(path):
+        return pa.table({column: pa.array([], pa.null()) for column in columns})
+
+    parts = ds.dataset(path, format="parquet", partitioning="hive")
+    expression = None
+    def narrow(condition):
+        return condition if expression is None else expression & condition
+    if department:
+        expression = narrow(ds.field("department") == department.lower())
+    if start:
+        expression = narrow(ds.field("month") >= start.strftime("%Y-%m"))
+    if end:
+        expression = narrow(ds.field("month") <= end.strftime("%Y-%m"))
+
+    order_column = ORDER_COLUMNS[dataset]
+    needed = list(dict.fromkeys(["id", order_column, *columns]))
+    table = latest_rows(parts.to_table(columns=needed, filter=expression), order_column)
+    return table.select(list(columns))
+
+def _aggregate(table: "pa.Table", keys: List[str], aggregations: list, names: List[str]) -> List[dict]:
+    """Group ``table`` by ``keys``; aggregate columns are returned under ``names``"""
+    grouped = table.group_by(keys).aggregate(aggregations)
+    outputs = [f"{column}_{function}" for column, function, *_ in aggregations]
+    return grouped.select(keys + outputs).rename_columns(keys + names).to_pylist()
+
+def status_counts(department: Optional[str] = None, directory: str = COLUMNAR_EXPORT_DIR) -> List[dict]:
+    """Current number of reports per department and status"""
+    reports = load_dataset("reports", ["department", "status"], directory, department)
+    if reports.num_rows == 0:
+        return []
+    counts = _aggregate(reports, ["department", "status"], [("status", "count")], ["count"])
+    return sorted(counts, key=lambda row: (row["department"] or "", row["status"] or ""))
+
+def monthly_summary(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    department: Optional[str] = None,
+    directory: str = COLUMNAR_EXPORT_DIR
+) -> List[dict]:
+    """Reports created, still open and escalated per month and department"""
+    reports = load_dataset(
+        "reports",
+        ["month", "department", "status", "escalation_level", "duplicate_count"],
+        directory, department, start, end
+    )
+    if reports.num_rows == 0:
+        return []
+    reports = reports.append_column(
+        "is_open",
+        pc.is_in(reports["status"], value_set=pa.array(
+            [open_status.value for open_status in OPEN_STATUSES]
+        )).cast(pa.int64())
+    ).append_column(
+        "is_escalated",
+        pc.greater(pc.fill_null(reports["escalation_level"], 0), 0).cast(pa.int64())
+    )
+    summary = _aggregate(
+        reports,
+        ["month", "department"],
+        [("status", "count"), ("is_open", "sum"), ("is_escalated", "sum"), ("duplicate_count", "sum")],
+        ["created", "open", "escalated", "duplicates"]
+    )
+    return sorted(summary, key=lambda row: (row["month"], row["department"] or ""))
+
+def resolution_hours(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    department: Optional[str] = None,
+    directory: str = COLUMNAR_EXPORT_DIR
+) -> List[dict]:
+    """
+    Hours from creation to the first "done" update, as mean, median and
+    90th percentile per department
+    """
+    reports = load_dataset(
+        "reports", ["id", "department", "created_at"], directory, department, start, end
+    )
+    updates = load_dataset(
+        "report_updates", ["report_id", "status", "created_at"], directory, department, start
+    )
+    if reports.num_rows == 0 or updates.num_rows == 0:
+        return []
+
+    done = updates.filter(pc.equal(updates["status"], ReportStatus.DONE.value))
+    first_done = done.group_by("report_id").aggregate([("created_at", "min")])
+    first_done = first_done.select(["report_id", "created_at_min"]).rename_columns(
+        ["report_id", "resolved_at"]
+    )
+    joined = reports.join(first_done, keys="id", right_keys="report_id", join_type="inner")
+    hours = pc.divide(
+        pc.milliseconds_between(joined["created_at"], joined["resolved_at"]).cast(pa.float64()),
+        3600 * 1000
+    )
+    joined = joined.append_column("hours", hours)
+    stats = _aggregate(
+        joined,
+        ["department"],
+        [
+            ("hours", "count"),
+            ("hours", "mean"),
+            ("hours", "approximate_median"),
+            ("hours", "tdigest", pc.TDigestOptions(q=0.9)),
+        ],
+        ["resolved", "mean_hours", "median_hours", "p90_hours"]
+    )
+    for row in stats:
+        row["p90_hours"] = row["p90_hours"][0]
+        for field in ("mean_hours", "median_hours", "p90_hours"):
+            row[field] = round(row[field], 2)
+    return sorted(stats, key=lambda row: row["department"] or "")
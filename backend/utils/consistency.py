@@ -0,0 +1,75 @@
+"""
+Read-your-writes across requests
+
+Heavy reads may be answered by a secondary, which can lag behind the
+primary. After a request writes in a transaction, its response carries an
+X-Read-After header: an opaque token naming that write. A client that
+sends the token back on its next requests reads through a causally
+consistent session, so whichever member answers has applied the write
+first. Without the header, reads follow the configured preferences. A
+token without a cluster time signature is ignored, and one the cluster
+rejects is dropped by database.causal_read().
+"""
+import base64
+import binascii
+from typing import Optional
+
+import bson
+from bson import Timestamp
+from bson.errors import BSONError
+
+from database import begin_causal_scope
+
+READ_AFTER_HEADER = "x-read-after"
+
+def encode_token(token: dict) -> str:
+    return base64.urlsafe_b64encode(bson.encode(token)).decode("ascii")
+
+def decode_token(value: str) -> Optional[dict]:
+    """Token sent by a client, or None when it is malformed"""
+    try:
+        token = bson.decode(base64.urlsafe_b64decode(value.encode("ascii")))
+    except (ValueError, binascii.Error, BSONError):
+        return None
+    cluster_time = token.get("clusterTime")
+    if (
+        not isinstance(cluster_time, dict)
+        or not isinstance(cluster_time.get("clusterTime"), Timestamp)
+        or not isinstance(token.get("operationTime"), Timestamp)
+    ):
+        return None
+    # Replica sets sign the cluster times they hand out; the signature is
+    # only checked by the server, see causal_read()
+    signature = cluster_time.get("signature")
+    if (
+        not isinstance(signature, dict)
+        or not isinstance(signature.get("hash"), bytes)
+        or not isinstance(signature.get("keyId"), int)
+    ):
+        return None
+    return token
+
+class CausalConsistencyMiddleware:
+    """ASGI middleware exchanging write tokens through X-Read-After"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        read_after = None
+        for name, value in scope["headers"]:
+            if name == READ_AFTER_HEADER.encode("latin-1"):
+                read_after = decode_token(value.decode("latin-1"))
+        state = begin_causal_scope(read_after)
+
+        async def send_with_token(message):
+            if message["type"] == "http.response.start" and state["written"]:
+                message["headers"] = list(message.get("headers", [])) + [
+                    (READ_AFTER_HEADER.encode("latin-1"), encode_token(state["written"]).encode("latin-1"))
+                ]
+            await send(message)
+
+        return await self.app(scope, receive, send_with_token)
@@ -0,0 +1,318 @@
+"""
+Report hotspot detection
+
+A batch job finds the places that generate most reports, per department
+and time window. Report coordinates are loaded once into NumPy arrays and
+binned into square cells of HOTSPOT_CELL_METERS; each occupied cell gets a
+kernel density estimate from the counts of the cells within
+HOTSPOT_BANDWIDTH_CELLS of it. Cells at or above HOTSPOT_MIN_DENSITY are
+joined with their hot neighbours into hotspots, and every hotspot with at
+least HOTSPOT_MIN_REPORTS reports is stored with its count, peak density,
+center and outline (the convex hull of its cells) as a GeoJSON polygon.
+
+Only occupied cells are kept (sorted cell codes looked up with
+searchsorted), so the cost follows the number of reports rather than the
+extent of the map: a million reports take a few seconds.
+
+Results of a run are written under a new run_id and published by moving
+the run pointer in counters, so readers never see a half-written run.
+Every worker schedules the job; the one that claims the run lease (see
+utils/leases.py) computes it.
+"""
+import asyncio
+import math
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from pymongo import ASCENDING
+
+from database import (
+    get_hotspots_collection, get_reports_collection, get_counters_collection, routed, for_each_tenant
+)
+from utils.leases import claim_due_run
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+# Configuration
+HOTSPOTS_ENABLED = os.getenv("HOTSPOTS_ENABLED", "true").lower() == "true"
+HOTSPOT_INTERVAL_SECONDS = float(os.getenv("HOTSPOT_INTERVAL_SECONDS", 6 * 3600))
+HOTSPOT_WINDOWS_DAYS = tuple(
+    int(days) for days in os.getenv("HOTSPOT_WINDOWS_DAYS", "7,30,90").split(",")
+)
+HOTSPOT_CELL_METERS = float(os.getenv("HOTSPOT_CELL_METERS", 200))
+HOTSPOT_BANDWIDTH_CELLS = int(os.getenv("HOTSPOT_BANDWIDTH_CELLS", 2))
+HOTSPOT_MIN_DENSITY = float(os.getenv("HOTSPOT_MIN_DENSITY", 2.0))
+HOTSPOT_MIN_REPORTS = int(os.getenv("HOTSPOT_MIN_REPORTS", 10))
+HOTSPOT_MAX_PER_DEPARTMENT = int(os.getenv("HOTSPOT_MAX_PER_DEPARTMENT", 25))
+
+METERS_PER_DEGREE = 111320
+_CELL_OFFSET = 1 << 31
+
+def _cell_codes(ix: "np.ndarray", iy: "np.ndarray") -> "np.ndarray":
+    return ((ix + _CELL_OFFSET) << 32) | (iy + _CELL_OFFSET)
+
+def _lookup(cells: "np.ndarray", codes: "np.ndarray") -> "np.ndarray":
+    """Index of each code in the sorted ``cells``, or -1 when absent"""
+    positions = np.searchsorted(cells, codes)
+    positions[positions == len(cells)] = 0
+    return np.where(cells[positions] == codes, positions, -1)
+
+def _convex_hull(points: List[tuple]) -> List[tuple]:
+    """Counter-clockwise convex hull (monotone chain)"""
+    points = sorted(set(points))
+    if len(points) <= 2:
+        return points
+
+    def half(sequence):
+        chain = []
+        for point in sequence:
+            while len(chain) >= 2 and (
+                (chain[-1][0] - chain[-2][0]) * (point[1] - chain[-2][1])
+                - (chain[-1][1] - chain[-2][1]) * (point[0] - chain[-2][0])
+            ) <= 0:
+                chain.pop()
+            chain.append(point)
+        return chain[:-1]
+
+    return half(points) + half(reversed(points))
+
+def detect_hotspots(
+    latitudes,
+    longitudes,
+    cell_meters: float = HOTSPOT_CELL_METERS,
+    bandwidth: int = HOTSPOT_BANDWIDTH_CELLS,
+    min_density: float = HOTSPOT_MIN_DENSITY,
+    min_reports: int = HOTSPOT_MIN_REPORTS,
+    limit: int = HOTSPOT_MAX_PER_DEPARTMENT
+) -> List[dict]:
+    """Hotspots among the given coordinates, largest first"""
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    valid = (
+        np.isfinite(latitudes) & np.isfinite(longitudes)
+        & (np.abs(latitudes) <= 90) & (np.abs(longitudes) <= 180)
+    )
+    latitudes, longitudes = latitudes[valid], longitudes[valid]
+    if len(latitudes) < min_reports:
+        return []
+
+    # Equirectangular projection around the median latitude
+    lon_scale = METERS_PER_DEGREE * max(math.cos(math.radians(float(np.median(latitudes)))), 0.01)
+    ix = np.floor(longitudes * lon_scale / cell_meters).astype(np.int64)
+    iy = np.floor(latitudes * METERS_PER_DEGREE / cell_meters).astype(np.int64)
+    cells, point_cell, counts = np.unique(
+        _cell_codes(ix, iy), return_inverse=True, return_counts=True
+    )
+    # Codes of columns east of the meridian wrap to negative int64s
+    cell_ix = ((cells >> 32) & 0xFFFFFFFF) - _CELL_OFFSET
+    cell_iy = (cells & 0xFFFFFFFF) - _CELL_OFFSET
+
+    # Epanechnikov kernel over the cells within the bandwidth
+    density = np.zeros(len(cells))
+    total_weight = 0.0
+    for dx in range(-bandwidth, bandwidth + 1):
+        for dy in range(-bandwidth, bandwidth + 1):
+            weight = 1 - (dx * dx + dy * dy) / (bandwidth + 1) ** 2
+            if weight <= 0:
+                continue
+            total_weight += weight
+            neighbours = _lookup(cells, _cell_codes(cell_ix + dx, cell_iy + dy))
+            found = neighbours >= 0
+            density[found] += weight * counts[neighbours[found]]
+    density /= total_weight
+
+    hot = np.flatnonzero(density >= min_density)
+    if len(hot) == 0:
+        return []
+    hot_cells = cells[hot]
+    hot_ix, hot_iy = cell_ix[hot], cell_iy[hot]
+
+    # Connected components of hot cells (8-neighbourhood) by label propagation
+    labels = np.arange(len(hot))
+    neighbour_lists = []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            if dx or dy:
+                neighbours = _lookup(hot_cells, _cell_codes(hot_ix + dx, hot_iy + dy))
+                found = np.flatnonzero(neighbours >= 0)
+                neighbour_lists.append((found, neighbours[found]))
+    while True:
+        updated = labels.copy()
+        for cell_index, neighbour_index in neighbour_lists:
+            np.minimum.at(updated, cell_index, labels[neighbour_index])
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            break
+        labels = updated
+    components, component_of_hot = np.unique(labels, return_inverse=True)
+
+    # Reports per component, counted on the points of its cells
+    component_of_cell = np.full(len(cells), -1)
+    component_of_cell[hot] = component_of_hot
+    component_of_point = component_of_cell[point_cell]
+    in_hotspot = component_of_point >= 0
+    component_of_point = component_of_point[in_hotspot]
+    report_counts = np.bincount(component_of_point, minlength=len(components))
+    latitude_sums = np.bincount(component_of_point, latitudes[in_hotspot], len(components))
+    longitude_sums = np.bincount(component_of_point, longitudes[in_hotspot], len(components))
+    peak_density = np.zeros(len(components))
+    np.maximum.at(peak_density, component_of_hot, density[hot])
+
+    hotspots = []
+    for component in np.argsort(-report_counts, kind="stable")[:limit]:
+        report_count = int(report_counts[component])
+        if report_count < min_reports:
+            break
+        members = np.flatnonzero(component_of_hot == component)
+        corners = [
+            (int(x) + corner_x, int(y) + corner_y)
+            for x, y in zip(hot_ix[members], hot_iy[members])
+            for corner_x in (0, 1) for corner_y in (0, 1)
+        ]
+        outline = [
+            [round(x * cell_meters / lon_scale, 6), round(y * cell_meters / METERS_PER_DEGREE, 6)]
+            for x, y in _convex_hull(corners)
+        ]
+        hotspots.append({
+            "report_count": report_count,
+            "cell_count": len(members),
+            "area_km2": round(len(members) * cell_meters ** 2 / 1e6, 3),
+            "peak_density": round(float(peak_density[component]), 2),
+            "center": {
+                "latitude": round(float(latitude_sums[component]) / report_count, 6),
+                "longitude": round(float(longitude_sums[component]) / report_count, 6)
+            },
+            "polygon": {"type": "Polygon", "coordinates": [outline + outline[:1]]}
+        })
+    return hotspots
+
+async def load_coordinates(since: datetime) -> Dict[str, "np.ndarray"]:
+    """Department, location and creation time of reports created since ``since``"""
+    departments, latitudes, longitudes, created = [], [], [], []
+    cursor = routed(get_reports_collection(), "exports").find(
+        {"created_at": {"$gte": since}, "latitude": {"$ne": None}, "longitude": {"$ne": None}},
+        {"_id": 0, "department": 1, "latitude": 1, "longitude": 1, "created_at": 1}
+    ).batch_size(10000)
+    async for report_doc in cursor:
+        departments.append((report_doc.get("department") or "others").lower())
+        latitudes.append(report_doc["latitude"])
+        longitudes.append(report_doc["longitude"])
+        created.append(report_doc["created_at"].timestamp())
+    return {
+        "department": np.array(departments, dtype=object),
+        "latitude": np.array(latitudes, dtype=np.float64),
+        "longitude": np.array(longitudes, dtype=np.float64),
+        "created_at": np.array(created, dtype=np.float64),
+    }
+
+def detect_all(coordinates: Dict[str, "np.ndarray"], now: datetime, windows=HOTSPOT_WINDOWS_DAYS) -> List[dict]:
+    """Hotspot documents for every department and window"""
+    department_names, department_codes = np.unique(coordinates["department"], return_inverse=True)
+    results = []
+    for code, department in enumerate(department_names):
+        in_department = department_codes == code
+        for window_days in windows:
+            selected = in_department & (
+                coordinates["created_at"] >= (now - timedelta(days=window_days)).timestamp()
+            )
+            found = detect_hotspots(
+                coordinates["latitude"][selected], coordinates["longitude"][selected]
+            )
+            for rank, hotspot in enumerate(found, start=1):
+                results.append({
+                    "department": department,
+                    "window_days": window_days,
+                    "rank": rank,
+                    **hotspot
+                })
+    return results
+
+async def ensure_hotspot_indexes():
+    await get_hotspots_collection().create_index(
+        [("run_id", ASCENDING), ("department", ASCENDING), ("window_days", ASCENDING), ("rank", ASCENDING)]
+    )
+
+async def compute_hotspots() -> int:
+    """Recompute and publish hotspots for all departments and windows"""
+    now = datetime.utcnow()
+    coordinates = await load_coordinates(now - timedelta(days=max(HOTSPOT_WINDOWS_DAYS)))
+    hotspots = await asyncio.to_thread(detect_all, coordinates, now)
+
+    run_id = str(uuid.uuid4())
+    hotspots_collection = get_hotspots_collection()
+    if hotspots:
+        await hotspots_collection.insert_many([
+            {"run_id": run_id, "computed_at": now, "cell_meters": HOTSPOT_CELL_METERS, **hotspot}
+            for hotspot in hotspots
+        ])
+    await get_counters_collection().update_one(
+        {"_id": "hotspots"},
+        {"$set": {"run_id": run_id, "computed_at": now, "report_count": len(coordinates["latitude"])}},
+        upsert=True
+    )
+    await hotspots_collection.delete_many({"run_id": {"$ne": run_id}})
+    return len(hotspots)
+
+async def get_hotspots(department: Optional[str], window_days: int) -> dict:
+    """Hotspots of the latest run, largest first per department"""
+    run = await get_counters_collection().find_one({"_id": "hotspots"}) or {}
+    query = {"run_id": run.get("run_id"), "window_days": window_days}
+    if department:
+        query["department"] = department.lower()
+    cursor = get_hotspots_collection().find(query, {"_id": 0, "run_id": 0}).sort(
+        [("department", ASCENDING), ("rank", ASCENDING)]
+    )
+    return {
+        "computed_at": run.get("computed_at"),
+        "window_days": window_days,
+        "hotspots": await cursor.to_list(length=None)
+    }
+
+class HotspotJob:
+    """Background task recomputing hotspots every HOTSPOT_INTERVAL_SECONDS"""
+
+    def __init__(self, interval: float = HOTSPOT_INTERVAL_SECONDS):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+
+    async def start(self):
+        if self._task is not None:
+            return
+        if np is None:
+            print("⚠️  Hotspot detection enabled but numpy is not installed")
+            return
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._run())
+        print(f"🗺️  Hotspot detection every {self.interval:.0f}s")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stopping.set()
+        await self._task
+        self._task = None
+
+    async def _run_once(self):
+        if await claim_due_run("hotspots", self.interval):
+            stored = await compute_hotspots()
+            print(f"🗺️  Hotspots recomputed: {stored} stored")
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                await for_each_tenant(self._run_once)
+            except Exception as e:
+                print(f"❌ Hotspot detection error: {e}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), min(self.interval, 300))
+            except asyncio.TimeoutError:
+                pass
+
+# Shared job started with the app
+hotspot_job = HotspotJob()
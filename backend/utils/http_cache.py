@@ -0,0 +1,76 @@
+"""
+Conditional GET helpers for list endpoints
+
+A weak ETag is derived from (count, newest change timestamp) of the documents
+matching a query plus the query itself and the page bounds. Computing it is a
+single $group over the filter, so a client polling an unchanged list gets a
+304 without any documents being fetched or serialized.
+"""
+import hashlib
+import json
+from typing import Iterable, Optional
+
+from fastapi import Request, Response, status
+
+from database import current_tenant
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == bare:
+            return True
+    return False
+
+async def compute_list_etag(
+    collection,
+    filter_query: dict,
+    timestamp_fields: Iterable[str] = ("updated_at",),
+    *,
+    session=None,
+    **page
+) -> str:
+    """
+    Build a weak ETag for ``filter_query`` on ``collection``.
+
+    ``timestamp_fields`` are the fields bumped whenever a document changes;
+    the newest value of each is folded into the tag. ``page`` holds anything
+    else that shapes the response (skip, limit, sort...). ``session`` is
+    used for the query only.
+    """
+    group = {"_id": None, "count": {"$sum": 1}}
+    for field in timestamp_fields:
+        group[f"max_{field}"] = {"$max": f"${field}"}
+
+    cursor = collection.aggregate([{"$match": filter_query}, {"$group": group}], session=session)
+    summary = await cursor.to_list(length=1)
+    summary = summary[0] if summary else {"count": 0}
+    summary.pop("_id", None)
+
+    fingerprint = json.dumps(
+        {"tenant": current_tenant(), "filter": filter_query, "page": page, "summary": summary},
+        sort_keys=True,
+        default=str
+    )
+    digest = hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+def conditional_response(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """
+    Return a 304 response when the client already holds ``etag``.
+
+    Otherwise attach the ETag to ``response`` and return None so the
+    endpoint goes on to build the body.
+    """
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,51 @@
+"""
+Run-once leases for periodic jobs
+
+Every gunicorn worker schedules the same background jobs. Before a run, a
+worker moves the job's next_run_at in counters forward by one interval
+with a conditional update; only the worker whose update matched runs the
+job, the others wait for the next interval.
+
+One-time data migrations (backfills of fields added to existing documents)
+leave a "migration:<name>" marker in counters once complete, so later
+startups skip them instead of scanning the collection again.
+"""
+from datetime import datetime, timedelta
+
+from pymongo.errors import DuplicateKeyError
+
+from database import get_counters_collection
+
+async def claim_due_run(name: str, interval: float) -> bool:
+    """Take the next run of job ``name`` if it is due and no other worker has"""
+    now = datetime.utcnow()
+    try:
+        result = await get_counters_collection().update_one(
+            {"_id": name, "next_run_at": {"$not": {"$gt": now}}},
+            {"$set": {"next_run_at": now + timedelta(seconds=interval)}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # Another worker holds the lease
+        return False
+    return bool(result.modified_count or result.upserted_id)
+
+def _migration_id(name: str) -> str:
+    return f"migration:{name}"
+
+async def migration_done(name: str) -> bool:
+    """Whether one-time migration ``name`` has already completed"""
+    marker = await get_counters_collection().find_one({"_id": _migration_id(name)}, {"_id": 1})
+    return marker is not None
+
+async def mark_migration_done(name: str):
+    """Record that migration ``name`` completed; idempotent across workers"""
+    try:
+        await get_counters_collection().update_one(
+            {"_id": _migration_id(name)},
+            {"$setOnInsert": {"completed_at": datetime.utcnow()}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # Another worker completed it at the same time
+        pass
@@ -0,0 +1,202 @@
+"""
+Adaptive load shedding
+
+LoadMonitor keeps smoothed measurements of event-loop lag (how late a
+periodic timer fires) and MongoDB connection-pool wait (time between a
+checkout starting and a connection being handed out). When either exceeds
+its threshold, LoadSheddingMiddleware rejects a growing share of
+non-critical requests with 503 + Retry-After, so report submission keeps
+its latency while the worker recovers.
+
+Its timer is the worker's only loop-lag heartbeat: utils/loop_monitor.py
+watches the same tick (``due``) and receives every raw lag sample through
+add_lag_listener().
+"""
+import asyncio
+import os
+import random
+import re
+import time
+from collections import deque
+from typing import Callable, List, Optional
+
+from pymongo import monitoring
+
+from database import register_event_listener
+from utils.rate_limit import RATE_LIMIT_EXEMPT_PATHS, send_error
+
+# Configuration
+LOAD_SHEDDING_ENABLED = os.getenv("LOAD_SHEDDING_ENABLED", "true").lower() == "true"
+LOOP_LAG_THRESHOLD_MS = float(os.getenv("LOOP_LAG_THRESHOLD_MS", 200))
+POOL_WAIT_THRESHOLD_MS = float(os.getenv("POOL_WAIT_THRESHOLD_MS", 500))
+LOAD_SAMPLE_INTERVAL = float(os.getenv("LOAD_SAMPLE_INTERVAL", 0.1))
+LOAD_SHED_MAX_FRACTION = float(os.getenv("LOAD_SHED_MAX_FRACTION", 0.95))
+# Weight of the newest sample in the moving averages
+EWMA_ALPHA = 0.2
+
+# Requests that are never shed
+CRITICAL_ROUTES = [
+    ("POST", re.compile(r"^/api/reports/?$")),
+    ("POST", re.compile(r"^/api/auth/login/?$")),
+]
+
+class PoolWaitListener(monitoring.ConnectionPoolListener):
+    """
+    Measure connection checkout wait from pool events.
+
+    Checkout events carry no correlation id, so waits are matched first in,
+    first out per server. Runs on pymongo's threads; deque appends and pops
+    are atomic.
+    """
+
+    def __init__(self, monitor: "LoadMonitor"):
+        self.monitor = monitor
+        self._pending = {}
+
+    def _queue(self, address) -> deque:
+        queue = self._pending.get(address)
+        if queue is None:
+            queue = self._pending.setdefault(address, deque())
+        return queue
+
+    def connection_check_out_started(self, event):
+        self._queue(event.address).append(time.monotonic())
+
+    def _finished(self, event):
+        try:
+            started = self._queue(event.address).popleft()
+        except IndexError:
+            return
+        self.monitor.record_pool_wait((time.monotonic() - started) * 1000)
+
+    def connection_checked_out(self, event):
+        self._finished(event)
+
+    def connection_check_out_failed(self, event):
+        self._finished(event)
+
+    # Remaining pool events are not needed
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+    def connection_checked_in(self, event):
+        pass
+
+class LoadMonitor:
+    """Smoothed event-loop lag and DB pool wait for the current worker"""
+
+    def __init__(self, interval: float = LOAD_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.loop_lag_ms = 0.0
+        self.pool_wait_ms = 0.0
+        self._pool_wait_updated = time.monotonic()
+        # Monotonic time the next tick is expected at
+        self.due = time.monotonic() + interval
+        self._lag_listeners: List[Callable[[float], None]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def add_lag_listener(self, listener: Callable[[float], None]):
+        """Call ``listener(lag_ms)`` on the loop after every tick"""
+        if listener not in self._lag_listeners:
+            self._lag_listeners.append(listener)
+
+    def remove_lag_listener(self, listener: Callable[[float], None]):
+        if listener in self._lag_listeners:
+            self._lag_listeners.remove(listener)
+
+    def record_pool_wait(self, wait_ms: float):
+        self.pool_wait_ms += EWMA_ALPHA * (wait_ms - self.pool_wait_ms)
+        self._pool_wait_updated = time.monotonic()
+
+    async def start(self):
+        if self._task is None:
+            self.due = time.monotonic() + self.interval
+            self._task = asyncio.create_task(self._sample_loop_lag())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _sample_loop_lag(self):
+        while True:
+            self.due = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            lag_ms = max(0.0, (time.monotonic() - self.due) * 1000)
+            self.loop_lag_ms += EWMA_ALPHA * (lag_ms - self.loop_lag_ms)
+            for listener in self._lag_listeners:
+                try:
+                    listener(lag_ms)
+                except Exception as e:
+                    print(f"❌ Loop lag listener error: {e}")
+            # With no checkouts the last pool wait goes stale; decay it
+            if time.monotonic() - self._pool_wait_updated > 1:
+                self.pool_wait_ms *= 1 - EWMA_ALPHA
+
+    def overload(self) -> float:
+        """How far over the worse threshold we are (<= 1.0 means healthy)"""
+        return max(
+            self.loop_lag_ms / LOOP_LAG_THRESHOLD_MS,
+            self.pool_wait_ms / POOL_WAIT_THRESHOLD_MS
+        )
+
+    def shed_fraction(self) -> float:
+        """Share of non-critical requests to reject right now"""
+        return min(LOAD_SHED_MAX_FRACTION, max(0.0, self.overload() - 1.0))
+
+    def stats(self) -> dict:
+        return {
+            "loop_lag_ms": round(self.loop_lag_ms, 2),
+            "pool_wait_ms": round(self.pool_wait_ms, 2),
+            "shed_fraction": round(self.shed_fraction(), 3)
+        }
+
+class LoadSheddingMiddleware:
+    """ASGI middleware returning 503 for a share of requests under overload"""
+
+    def __init__(self, app, monitor: "LoadMonitor" = None):
+        self.app = app
+        self.monitor = monitor or load_monitor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in RATE_LIMIT_EXEMPT_PATHS:
+            return await self.app(scope, receive, send)
+
+        method, path = scope["method"], scope["path"]
+        if any(method == m and pattern.match(path) for m, pattern in CRITICAL_ROUTES):
+            return await self.app(scope, receive, send)
+
+        fraction = self.monitor.shed_fraction()
+        if fraction > 0 and random.random() < fraction:
+            retry_after = max(1, round(self.monitor.overload()))
+            return await send_error(send, 503, "Server is busy, please retry", [
+                (b"retry-after", str(retry_after).encode("latin-1"))
+            ])
+
+        return await self.app(scope, receive, send)
+
+# Shared monitor; its pool listener must be registered before connecting
+load_monitor = LoadMonitor()
+register_event_listener(PoolWaitListener(load_monitor))
@@ -0,0 +1,168 @@
+"""
+Brute-force protection for password login
+
+Failed logins are counted per account and per client IP over a sliding
+window. Once a key passes its free attempts it is locked for an
+exponentially growing period, and locked logins are rejected before any
+password hash is computed, so credential stuffing costs us a dictionary
+lookup instead of a bcrypt verify. Failures are kept in process memory, or
+in the login_failures collection when RATE_LIMIT_BACKEND=mongo so all
+workers see them.
+"""
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from typing import Deque, Tuple
+
+from fastapi import HTTPException, status
+from pymongo import ASCENDING, ReturnDocument
+
+from database import get_login_failures_collection
+from utils.rate_limit import RATE_LIMIT_BACKEND
+
+# Configuration
+LOGIN_FAILURE_WINDOW_SECONDS = int(os.getenv("LOGIN_FAILURE_WINDOW_SECONDS", 900))
+LOGIN_FREE_ATTEMPTS_ACCOUNT = int(os.getenv("LOGIN_FREE_ATTEMPTS_ACCOUNT", 5))
+LOGIN_FREE_ATTEMPTS_IP = int(os.getenv("LOGIN_FREE_ATTEMPTS_IP", 20))
+LOGIN_BACKOFF_BASE_SECONDS = float(os.getenv("LOGIN_BACKOFF_BASE_SECONDS", 1))
+LOGIN_BACKOFF_MAX_SECONDS = float(os.getenv("LOGIN_BACKOFF_MAX_SECONDS", 900))
+LOGIN_GUARD_MAX_KEYS = int(os.getenv("LOGIN_GUARD_MAX_KEYS", 100000))
+
+def lockout_seconds(failures: int, free_attempts: int) -> float:
+    """Lock duration after ``failures`` failures in the window"""
+    if failures < free_attempts:
+        return 0.0
+    return min(
+        LOGIN_BACKOFF_MAX_SECONDS,
+        LOGIN_BACKOFF_BASE_SECONDS * 2 ** (failures - free_attempts)
+    )
+
+class MemoryFailureStore:
+    """Per-process failure timestamps with least-recently-used eviction"""
+
+    def __init__(self, max_keys: int = LOGIN_GUARD_MAX_KEYS):
+        self.max_keys = max_keys
+        # key -> (failure timestamps, locked until)
+        self._entries: "OrderedDict[str, Tuple[Deque[float], float]]" = OrderedDict()
+
+    async def locked_for(self, key: str) -> float:
+        """Seconds until ``key`` may try again (0 if not locked)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return 0.0
+        return max(0.0, entry[1] - time.time())
+
+    async def record_failure(self, key: str, free_attempts: int) -> float:
+        now = time.time()
+        failures, _ = self._entries.pop(key, (deque(), 0.0))
+        while failures and failures[0] <= now - LOGIN_FAILURE_WINDOW_SECONDS:
+            failures.popleft()
+        failures.append(now)
+        lock = lockout_seconds(len(failures), free_attempts)
+        self._entries[key] = (failures, now + lock)
+        if len(self._entries) > self.max_keys:
+            self._entries.popitem(last=False)
+        return lock
+
+    async def reset(self, key: str):
+        self._entries.pop(key, None)
+
+class MongoFailureStore:
+    """Failure windows shared by all workers"""
+
+    async def ensure_indexes(self):
+        await get_login_failures_collection().create_index(
+            [("expires_at", ASCENDING)], expireAfterSeconds=0
+        )
+
+    async def locked_for(self, key: str) -> float:
+        entry = await get_login_failures_collection().find_one(
+            {"_id": key}, {"locked_until": 1}
+        )
+        if not entry or not entry.get("locked_until"):
+            return 0.0
+        return max(0.0, (entry["locked_until"] - datetime.utcnow()).total_seconds())
+
+    async def record_failure(self, key: str, free_attempts: int) -> float:
+        now = datetime.utcnow()
+        window_start = now - timedelta(seconds=LOGIN_FAILURE_WINDOW_SECONDS)
+        entry = await get_login_failures_collection().find_one_and_update(
+            {"_id": key},
+            [
+                {
+                    "$set": {
+                        "failures": {
+                            "$concatArrays": [
+                                {
+                                    "$filter": {
+                                        "input": {"$ifNull": ["$failures", []]},
+                                        "cond": {"$gt": ["$$this", window_start]}
+                                    }
+                                },
+                                [now]
+                            ]
+                        },
+                        "expires_at": now + timedelta(
+                            seconds=LOGIN_FAILURE_WINDOW_SECONDS + LOGIN_BACKOFF_MAX_SECONDS
+                        )
+                    }
+                }
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        lock = lockout_seconds(len(entry["failures"]), free_attempts)
+        if lock:
+            await get_login_failures_collection().update_one(
+                {"_id": key},
+                {"$max": {"locked_until": now + timedelta(seconds=lock)}}
+            )
+        return lock
+
+    async def reset(self, key: str):
+        await get_login_failures_collection().delete_one({"_id": key})
+
+class LoginGuard:
+    """Checks and bookkeeping wrapped around password verification"""
+
+    def __init__(self, store=None):
+        self.store = store or (
+            MongoFailureStore() if RATE_LIMIT_BACKEND == "mongo" else MemoryFailureStore()
+        )
+
+    @staticmethod
+    def _keys(email: str, ip_address: str) -> Tuple[str, str]:
+        return f"account:{email.lower()}", f"ip:{ip_address}"
+
+    async def check(self, email: str, ip_address: str):
+        """Raise 429 before hashing if the account or the IP is locked"""
+        account_key, ip_key = self._keys(email, ip_address)
+        wait = max(
+            await self.store.locked_for(account_key),
+            await self.store.locked_for(ip_key)
+        )
+        if wait > 0:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many failed login attempts, please try again later",
+                headers={"Retry-After": str(max(1, math.ceil(wait)))},
+            )
+
+    async def record_failure(self, email: str, ip_address: str):
+        account_key, ip_key = self._keys(email, ip_address)
+        await self.store.record_failure(account_key, LOGIN_FREE_ATTEMPTS_ACCOUNT)
+        await self.store.record_failure(ip_key, LOGIN_FREE_ATTEMPTS_IP)
+
+    async def record_success(self, email: str, ip_address: str):
+        """Clear the account's failures; the IP window is left to expire"""
+        account_key, _ = self._keys(email, ip_address)
+        await self.store.reset(account_key)
+
+    async def ensure_indexes(self):
+        if isinstance(self.store, MongoFailureStore):
+            await self.store.ensure_indexes()
+
+# Shared guard used by the login route
+login_guard = LoginGuard()
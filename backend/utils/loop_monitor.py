@@ -0,0 +1,243 @@
+"""
+Event-loop lag and blocking-call detection
+
+The heartbeat is LoadMonitor's timer (utils/load_shedding.py, every
+LOAD_SAMPLE_INTERVAL), so a worker runs one lag sampler: every tick hands
+its lag here, kept for recent percentiles. A watchdog thread checks the
+tick every LOOP_MONITOR_INTERVAL seconds; when it is overdue by more than
+LOOP_BLOCK_THRESHOLD_MS, some callback is holding the loop (bcrypt, a big
+Pydantic validation, a sync driver call...) and the watchdog samples the
+loop thread's stack, again on every check while the block lasts. When the
+heartbeat fires again the block is recorded with its duration, the request
+route (or background task) that was running and the sampled stacks, and
+logged as "🐢 Event loop blocked ...".
+
+Blocks are grouped by route and innermost application frame, so repeated
+blocks in the same place add up. Sampling only runs while the loop is
+blocked, so the monitor is cheap enough for production. Per-worker results
+are served to admins at /api/diagnostics/loop, with a summary in /health.
+"""
+import asyncio
+import os
+import sys
+import sysconfig
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from utils.load_shedding import LoadMonitor, load_monitor
+
+# Configuration
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() == "true"
+# How often the watchdog thread checks the heartbeat
+LOOP_MONITOR_INTERVAL = float(os.getenv("LOOP_MONITOR_INTERVAL", 0.05))
+LOOP_BLOCK_THRESHOLD_MS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", 100))
+LOOP_MONITOR_MAX_BLOCKS = int(os.getenv("LOOP_MONITOR_MAX_BLOCKS", 100))
+LOOP_MONITOR_STACK_DEPTH = int(os.getenv("LOOP_MONITOR_STACK_DEPTH", 40))
+# Lag samples kept for percentiles (one per heartbeat)
+LAG_WINDOW = 1200
+
+_APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_STDLIB = sysconfig.get_paths()["stdlib"]
+
+def _is_app_frame(filename: str) -> bool:
+    # Middleware frames (this module's included) sit above every handler
+    return (
+        filename.startswith(_APP_ROOT)
+        and "site-packages" not in filename
+        and filename != os.path.abspath(__file__)
+    )
+
+def _format_frame(frame: traceback.FrameSummary) -> str:
+    filename = frame.filename
+    if "site-packages" in filename:
+        filename = filename.split("site-packages" + os.sep, 1)[-1]
+    elif filename.startswith(_STDLIB):
+        filename = os.path.relpath(filename, _STDLIB)
+    elif filename.startswith(_APP_ROOT):
+        filename = os.path.relpath(filename, _APP_ROOT)
+    return f"{filename}:{frame.lineno} {frame.name}"
+
+def _percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))], 2)
+
+class LoopMonitor:
+    """Measures loop lag and samples the stacks of callbacks blocking it"""
+
+    def __init__(
+        self,
+        heartbeat: Optional[LoadMonitor] = None,
+        interval: float = LOOP_MONITOR_INTERVAL,
+        threshold_ms: float = LOOP_BLOCK_THRESHOLD_MS
+    ):
+        self.heartbeat = heartbeat or load_monitor
+        self.interval = interval
+        self.threshold_ms = threshold_ms
+        self._lock = threading.Lock()
+        self._lags = deque(maxlen=LAG_WINDOW)
+        self._blocks = deque(maxlen=LOOP_MONITOR_MAX_BLOCKS)
+        self._sites: Dict[tuple, dict] = {}
+        self._requests: Dict[asyncio.Task, dict] = {}
+        self._pending: Optional[dict] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._started = False
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    # Attribution
+    def request_started(self, scope: dict):
+        task = asyncio.current_task()
+        if task is not None:
+            self._requests[task] = scope
+
+    def request_finished(self):
+        self._requests.pop(asyncio.current_task(), None)
+
+    def _origin(self) -> str:
+        """Route of the request, or name of the task, running on the loop"""
+        try:
+            task = asyncio.current_task(self._loop)
+        except RuntimeError:
+            task = None
+        if task is None:
+            return "loop callback"
+        scope = self._requests.get(task)
+        if scope is not None:
+            route = scope.get("route")
+            return f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+        coroutine = task.get_coro()
+        return f"task {getattr(coroutine, '__qualname__', task.get_name())}"
+
+    # Sampling, on the watchdog thread
+    def _watch(self):
+        while not self._stopping.wait(self.interval):
+            due = self.heartbeat.due
+            if (time.monotonic() - due) * 1000 < self.threshold_ms:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame, limit=LOOP_MONITOR_STACK_DEPTH)
+            del frame
+            origin = self._origin()
+            with self._lock:
+                if self._pending is None or self._pending["due"] != due:
+                    self._pending = {"due": due, "origin": origin, "samples": []}
+                self._pending["samples"].append(stack)
+
+    # Heartbeat tick, on the loop
+    def _tick(self, lag_ms: float):
+        self._lags.append(lag_ms)
+        with self._lock:
+            pending, self._pending = self._pending, None
+        if pending is not None:
+            self._record(pending, lag_ms)
+
+    def _record(self, pending: dict, duration_ms: float):
+        stack = pending["samples"][0]
+        app_frames = [frame for frame in stack if _is_app_frame(frame.filename)]
+        site = _format_frame(app_frames[-1] if app_frames else stack[-1])
+        block = {
+            "at": datetime.utcnow(),
+            "duration_ms": round(duration_ms, 1),
+            "origin": pending["origin"],
+            "site": site,
+            "samples": len(pending["samples"]),
+            "stack": [_format_frame(frame) for frame in stack],
+            # Innermost frame of later samples, when the block moved on
+            "later_frames": sorted({_format_frame(sample[-1]) for sample in pending["samples"][1:]})
+        }
+        self._blocks.append(block)
+
+        key = (block["origin"], site)
+        summary = self._sites.get(key)
+        first = summary is None
+        if first:
+            summary = self._sites[key] = {
+                "origin": block["origin"], "site": site, "count": 0,
+                "total_ms": 0.0, "max_ms": 0.0, "stack": block["stack"]
+            }
+        summary["count"] += 1
+        summary["total_ms"] += duration_ms
+        summary["max_ms"] = max(summary["max_ms"], duration_ms)
+        summary["last_at"] = block["at"]
+
+        print(f"🐢 Event loop blocked {duration_ms:.0f}ms in {block['origin']} at {site}")
+        if first:
+            print("   " + "\n   ".join(block["stack"][-12:]))
+
+    async def start(self):
+        if self._started:
+            return
+        self._started = True
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        await self.heartbeat.start()
+        self.heartbeat.add_lag_listener(self._tick)
+        self._stopping.clear()
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+        print(f"🐢 Loop monitor started (blocks over {self.threshold_ms:.0f}ms)")
+
+    async def stop(self):
+        if not self._started:
+            return
+        self._started = False
+        self._stopping.set()
+        self.heartbeat.remove_lag_listener(self._tick)
+        await asyncio.to_thread(self._watchdog.join)
+        self._watchdog = None
+
+    def stats(self) -> dict:
+        """Lag percentiles and block counts, for /health"""
+        lags = list(self._lags)
+        return {
+            "enabled": LOOP_MONITOR_ENABLED,
+            "lag_ms": {
+                "p50": _percentile(lags, 0.5),
+                "p99": _percentile(lags, 0.99),
+                "max": round(max(lags), 2) if lags else None
+            },
+            "blocks": sum(summary["count"] for summary in self._sites.values())
+        }
+
+    def report(self, top: int = 20, recent: int = 20) -> dict:
+        """Where the loop was blocked: worst sites by total time, and recent blocks"""
+        sites = sorted(self._sites.values(), key=lambda summary: summary["total_ms"], reverse=True)
+        return {
+            "pid": os.getpid(),
+            "threshold_ms": self.threshold_ms,
+            **self.stats(),
+            "sites": [
+                {**summary, "total_ms": round(summary["total_ms"], 1), "max_ms": round(summary["max_ms"], 1)}
+                for summary in sites[:top]
+            ],
+            "recent": list(self._blocks)[-recent:][::-1] if recent else []
+        }
+
+class LoopMonitorMiddleware:
+    """ASGI middleware telling the monitor which route each task serves"""
+
+    def __init__(self, app, monitor: "LoopMonitor" = None):
+        self.app = app
+        self.monitor = monitor or loop_monitor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        # The router adds the matched route to this same scope
+        self.monitor.request_started(scope)
+        try:
+            return await self.app(scope, receive, send)
+        finally:
+            self.monitor.request_finished()
+
+# Monitor of this worker
+loop_monitor = LoopMonitor()
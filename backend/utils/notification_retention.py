@@ -0,0 +1,274 @@
+"""
+Notification retention
+
+Keeps the notifications collection down to what inboxes actually show, so
+its indexes stay in memory:
+
+- read notifications leave NOTIFICATION_READ_RETENTION_DAYS after being
+  read. Marking as read sets expires_at, and a TTL index on it removes
+  anything the retention job has not moved a day later, so the collection
+  stays bounded even with the job stopped;
+- unread notifications leave after NOTIFICATION_UNREAD_RETENTION_DAYS;
+- system-wide notifications (user_id None) are shared by every inbox, so
+  reading one never starts an expiry; they leave after
+  NOTIFICATION_UNREAD_RETENTION_DAYS whether read or not;
+- each user keeps at most NOTIFICATION_INBOX_LIMIT notifications, the
+  most recently updated ones.
+
+The retention job moves notifications in batches to the archive chosen
+by NOTIFICATION_ARCHIVE_MODE: the notifications_archive collection (with
+its own TTL), gzipped JSON lines under NOTIFICATION_ARCHIVE_DIR, or
+nowhere. Removal writes tombstones in the same transaction, so syncing
+clients drop the notifications too. A batch is archived before it is
+deleted; after a crash in between it is archived again, which the
+collection archive absorbs and a file archive may repeat.
+"""
+import asyncio
+import gzip
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from bson import json_util
+from pymongo import ASCENDING, DESCENDING, ReplaceOne
+
+from database import (
+    get_notifications_collection,
+    get_notifications_archive_collection,
+    get_counters_collection,
+    run_in_transaction,
+    for_each_tenant
+)
+from utils.leases import claim_due_run, mark_migration_done, migration_done
+from utils.sync import record_tombstones
+
+# Configuration
+NOTIFICATION_RETENTION_ENABLED = os.getenv("NOTIFICATION_RETENTION_ENABLED", "true").lower() == "true"
+NOTIFICATION_RETENTION_INTERVAL_SECONDS = float(os.getenv("NOTIFICATION_RETENTION_INTERVAL_SECONDS", 3600))
+NOTIFICATION_RETENTION_BATCH_SIZE = int(os.getenv("NOTIFICATION_RETENTION_BATCH_SIZE", 500))
+NOTIFICATION_READ_RETENTION_DAYS = int(os.getenv("NOTIFICATION_READ_RETENTION_DAYS", 30))
+NOTIFICATION_UNREAD_RETENTION_DAYS = int(os.getenv("NOTIFICATION_UNREAD_RETENTION_DAYS", 180))
+NOTIFICATION_INBOX_LIMIT = int(os.getenv("NOTIFICATION_INBOX_LIMIT", 500))
+NOTIFICATION_ARCHIVE_MODE = os.getenv("NOTIFICATION_ARCHIVE_MODE", "collection")  # collection, file or none
+NOTIFICATION_ARCHIVE_DIR = os.getenv("NOTIFICATION_ARCHIVE_DIR", "notification_archive")
+NOTIFICATION_ARCHIVE_RETENTION_DAYS = int(os.getenv("NOTIFICATION_ARCHIVE_RETENTION_DAYS", 365))
+
+# Time the retention job has to archive read notifications before the TTL
+# monitor deletes them
+TTL_GRACE = timedelta(days=1)
+
+_READ_LIFETIME = timedelta(days=NOTIFICATION_READ_RETENTION_DAYS) + TTL_GRACE
+BROADCAST_EXPIRY_MIGRATION = "broadcast_expiry"
+
+def read_expiry(read_at: datetime) -> datetime:
+    """expires_at of a notification read at ``read_at``"""
+    return read_at + _READ_LIFETIME
+
+def mark_read_update(read_at: datetime) -> list:
+    """
+    Pipeline update marking notifications read at ``read_at``; only
+    personal ones get an expiry
+    """
+    return [{
+        "$set": {
+            "is_read": True,
+            "read_at": read_at,
+            "updated_at": read_at,
+            "expires_at": {
+                "$cond": [
+                    {"$eq": [{"$ifNull": ["$user_id", None]}, None]},
+                    "$expires_at",
+                    read_expiry(read_at)
+                ]
+            }
+        }
+    }]
+
+async def ensure_notification_retention_indexes():
+    """Create retention indexes and give read notifications an expiry"""
+    notifications_collection = get_notifications_collection()
+    await notifications_collection.create_index(
+        [("expires_at", ASCENDING)], expireAfterSeconds=0
+    )
+    await notifications_collection.create_index(
+        [("is_read", ASCENDING), ("created_at", ASCENDING)]
+    )
+    # Past expiries are pushed out by TTL_GRACE, so notifications read long
+    # ago are archived by the job rather than dropped by the TTL monitor
+    await notifications_collection.update_many(
+        {"is_read": True, "expires_at": None, "user_id": {"$ne": None}},
+        [{
+            "$set": {
+                "expires_at": {
+                    "$max": [
+                        {
+                            "$add": [
+                                {"$ifNull": ["$read_at", "$updated_at", "$created_at"]},
+                                int(_READ_LIFETIME.total_seconds() * 1000)
+                            ]
+                        },
+                        datetime.utcnow() + TTL_GRACE
+                    ]
+                }
+            }
+        }]
+    )
+    # Broadcasts read before they were exempt lose their expiry, once
+    if not await migration_done(BROADCAST_EXPIRY_MIGRATION):
+        await notifications_collection.update_many(
+            {"user_id": None, "expires_at": {"$ne": None}},
+            {"$unset": {"expires_at": ""}}
+        )
+        await mark_migration_done(BROADCAST_EXPIRY_MIGRATION)
+    if NOTIFICATION_ARCHIVE_MODE == "collection":
+        archive_collection = get_notifications_archive_collection()
+        await archive_collection.create_index(
+            [("user_id", ASCENDING), ("created_at", DESCENDING)]
+        )
+        if NOTIFICATION_ARCHIVE_RETENTION_DAYS:
+            await archive_collection.create_index(
+                [("archived_at", ASCENDING)],
+                expireAfterSeconds=NOTIFICATION_ARCHIVE_RETENTION_DAYS * 24 * 3600
+            )
+
+def _append_to_file(docs: List[dict], archived_at: datetime):
+    os.makedirs(NOTIFICATION_ARCHIVE_DIR, exist_ok=True)
+    path = os.path.join(NOTIFICATION_ARCHIVE_DIR, f"notifications-{archived_at:%Y-%m}.jsonl.gz")
+    # Appending starts a new gzip member; readers see one continuous stream
+    with gzip.open(path, "at", encoding="utf-8") as archive_file:
+        for doc in docs:
+            archive_file.write(json_util.dumps({**doc, "archived_at": archived_at}) + "\n")
+
+async def archive_batch(docs: List[dict]) -> int:
+    """Archive ``docs`` and remove them from the hot collection"""
+    if not docs:
+        return 0
+    archived_at = datetime.utcnow()
+    if NOTIFICATION_ARCHIVE_MODE == "collection":
+        await get_notifications_archive_collection().bulk_write(
+            [
+                ReplaceOne({"_id": doc["_id"]}, {**doc, "archived_at": archived_at}, upsert=True)
+                for doc in docs
+            ],
+            ordered=False
+        )
+    elif NOTIFICATION_ARCHIVE_MODE == "file":
+        await asyncio.to_thread(_append_to_file, docs, archived_at)
+
+    async def write_removal(session):
+        result = await get_notifications_collection().delete_many(
+            {"_id": {"$in": [doc["_id"] for doc in docs]}}, session=session
+        )
+        await record_tombstones("notifications", docs, session=session)
+        return result.deleted_count
+
+    return await run_in_transaction(write_removal)
+
+async def _archive_matching(query: dict, sort: list, limit: Optional[int] = None) -> int:
+    """Archive notifications matching ``query`` batch by batch"""
+    notifications_collection = get_notifications_collection()
+    archived = 0
+    while limit is None or archived < limit:
+        batch_size = NOTIFICATION_RETENTION_BATCH_SIZE
+        if limit is not None:
+            batch_size = min(batch_size, limit - archived)
+        docs = await notifications_collection.find(query).sort(sort).limit(batch_size).to_list(length=batch_size)
+        if not docs:
+            break
+        removed = await archive_batch(docs)
+        archived += removed
+        if not removed or len(docs) < batch_size:
+            break
+    return archived
+
+async def trim_inbox(user_id: str) -> int:
+    """Archive a user's notifications beyond the NOTIFICATION_INBOX_LIMIT newest"""
+    notifications_collection = get_notifications_collection()
+    excess = await notifications_collection.count_documents({"user_id": user_id}) - NOTIFICATION_INBOX_LIMIT
+    if excess <= 0:
+        return 0
+    return await _archive_matching(
+        {"user_id": user_id}, [("updated_at", ASCENDING), ("id", ASCENDING)], limit=excess
+    )
+
+async def apply_retention() -> dict:
+    """One retention pass; returns the number of notifications archived per rule"""
+    now = datetime.utcnow()
+    archived = {
+        "read": await _archive_matching(
+            {"expires_at": {"$lte": now + TTL_GRACE}}, [("expires_at", ASCENDING)]
+        ),
+        "unread": 0,
+        "broadcast": 0,
+        "inbox_limit": 0
+    }
+    if NOTIFICATION_UNREAD_RETENTION_DAYS:
+        created_before = now - timedelta(days=NOTIFICATION_UNREAD_RETENTION_DAYS)
+        archived["unread"] = await _archive_matching(
+            {"is_read": False, "created_at": {"$lte": created_before}},
+            [("is_read", ASCENDING), ("created_at", ASCENDING)]
+        )
+        archived["broadcast"] = await _archive_matching(
+            {"user_id": None, "created_at": {"$lte": created_before}},
+            [("created_at", ASCENDING)]
+        )
+
+    if NOTIFICATION_INBOX_LIMIT:
+        # Only inboxes that received notifications since the last pass can
+        # have grown past the limit
+        counters_collection = get_counters_collection()
+        state = await counters_collection.find_one({"_id": "notification_retention"}) or {}
+        checked_at = state.get("inbox_checked_at")
+        users_query = {"user_id": {"$ne": None}}
+        if checked_at:
+            users_query["updated_at"] = {"$gte": checked_at}
+        for user_id in await get_notifications_collection().distinct("user_id", users_query):
+            archived["inbox_limit"] += await trim_inbox(user_id)
+        await counters_collection.update_one(
+            {"_id": "notification_retention"},
+            {"$set": {"inbox_checked_at": now}},
+            upsert=True
+        )
+    return archived
+
+class NotificationRetention:
+    """Background task applying notification retention"""
+
+    def __init__(self, interval: float = NOTIFICATION_RETENTION_INTERVAL_SECONDS):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+
+    async def start(self):
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run())
+            print(f"🧹 Notification retention every {self.interval:.0f}s "
+                  f"(read {NOTIFICATION_READ_RETENTION_DAYS}d, archive: {NOTIFICATION_ARCHIVE_MODE})")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stopping.set()
+        await self._task
+        self._task = None
+
+    async def _run_once(self):
+        if await claim_due_run("notification_retention", self.interval):
+            archived = await apply_retention()
+            if any(archived.values()):
+                print(f"🧹 Notifications archived: {archived}")
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                await for_each_tenant(self._run_once)
+            except Exception as e:
+                print(f"❌ Notification retention error: {e}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), min(self.interval, 300))
+            except asyncio.TimeoutError:
+                pass
+
+# Shared task started with the app
+notification_retention = NotificationRetention()
@@ -0,0 +1,317 @@
+"""
+Transactional outbox for report events
+
+Route handlers call record_event() with the session of the transaction that
+mutates a report, so the event is committed atomically with the change.
+OutboxRelay tails the outbox in seq order and hands events to in-process
+consumers with at-least-once delivery. Every consumer keeps its own
+checkpoint and lease in the outbox_checkpoints collection, so only one
+gunicorn worker dispatches a given consumer at a time.
+
+A consumer retries a failing event on every poll. After
+OUTBOX_MAX_ATTEMPTS failures the event is copied to outbox_dead_letters
+with the error and the consumer moves past it, so one poison event cannot
+hold up every later one until the outbox TTL removes it.
+
+A consumer registered with ``batch=True`` gets the matching events of each
+poll as one list, for work that only needs doing once per batch (such as
+cache invalidation). A failing batch is retried and dead-lettered as a
+whole.
+"""
+import asyncio
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from database import (
+    get_outbox_collection,
+    get_outbox_checkpoints_collection,
+    get_outbox_dead_letters_collection,
+    get_counters_collection,
+    for_each_tenant
+)
+from models.schemas import OutboxEventInDB, OutboxEventType
+
+# Configuration
+OUTBOX_RELAY_ENABLED = os.getenv("OUTBOX_RELAY_ENABLED", "true").lower() == "true"
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", 1.0))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 100))
+OUTBOX_LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", 30))
+OUTBOX_RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", 7))
+# How long a hole in the seq numbers is waited on before it is skipped.
+# Holes only appear when transactions are disabled and a writer dies between
+# taking a seq number and inserting its event.
+OUTBOX_GAP_TIMEOUT_SECONDS = int(os.getenv("OUTBOX_GAP_TIMEOUT_SECONDS", 10))
+# Failures of one consumer on one event before it is dead-lettered
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 5))
+
+EventHandler = Callable[[OutboxEventInDB], Awaitable[None]]
+BatchHandler = Callable[[List[OutboxEventInDB]], Awaitable[None]]
+
+# consumer name -> (handler, event types or None for all, whether it takes batches)
+_consumers: Dict[
+    str, Tuple[Union[EventHandler, BatchHandler], Optional[Set[OutboxEventType]], bool]
+] = {}
+
+def register_consumer(
+    name: str,
+    handler: Union[EventHandler, BatchHandler],
+    event_types: Optional[Iterable[OutboxEventType]] = None,
+    batch: bool = False
+):
+    """
+    Register an async handler that receives outbox events in order, one at
+    a time, or with ``batch`` as the list of matching events of each poll
+    """
+    _consumers[name] = (handler, set(event_types) if event_types else None, batch)
+
+def consumer(name: str, *event_types: OutboxEventType, batch: bool = False):
+    """Decorator form of register_consumer()"""
+    def decorator(handler):
+        register_consumer(name, handler, event_types or None, batch)
+        return handler
+    return decorator
+
+async def ensure_outbox_indexes():
+    """Create the indexes used by writers and the relay"""
+    outbox_collection = get_outbox_collection()
+    await outbox_collection.create_index([("seq", ASCENDING)], unique=True)
+    await outbox_collection.create_index(
+        [("created_at", ASCENDING)],
+        expireAfterSeconds=OUTBOX_RETENTION_DAYS * 24 * 3600
+    )
+    await get_outbox_dead_letters_collection().create_index(
+        [("consumer", ASCENDING), ("seq", ASCENDING)]
+    )
+
+async def _next_seq(session=None) -> int:
+    """
+    Take the next outbox sequence number.
+
+    Inside a transaction the counter document is write-locked until commit,
+    so seq order matches commit order. The price is that every transaction
+    recording an event updates this one document: report writes serialize
+    on it, and concurrent ones hit write conflicts and are retried by
+    run_in_transaction(). That is fine at a city's write rate; a busier
+    deployment would take seq per aggregate or per shard and give up the
+    single global order.
+    """
+    counter = await get_counters_collection().find_one_and_update(
+        {"_id": "outbox"},
+        {"$inc": {"seq": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+        session=session
+    )
+    return counter["seq"]
+
+async def record_event(
+    event_type: OutboxEventType,
+    aggregate_id: str,
+    payload: dict,
+    session=None
+) -> OutboxEventInDB:
+    """Write an event to the outbox, as part of ``session``'s transaction"""
+    event = OutboxEventInDB(
+        seq=await _next_seq(session),
+        type=event_type,
+        aggregate_id=aggregate_id,
+        payload=payload
+    )
+    await get_outbox_collection().insert_one(event.dict(), session=session)
+    return event
+
+class OutboxRelay:
+    """Background task that dispatches outbox events to registered consumers"""
+
+    def __init__(
+        self,
+        poll_interval: float = OUTBOX_POLL_INTERVAL,
+        batch_size: int = OUTBOX_BATCH_SIZE
+    ):
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+
+    async def start(self):
+        """Start tailing the outbox in the background"""
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run())
+            print(f"📮 Outbox relay started ({len(_consumers)} consumers)")
+
+    async def stop(self):
+        """Stop the relay and release consumer leases"""
+        if self._task is None:
+            return
+        self._stopping.set()
+        await self._task
+        self._task = None
+        await for_each_tenant(self._release_leases)
+        print("📮 Outbox relay stopped")
+
+    async def _release_leases(self):
+        await get_outbox_checkpoints_collection().update_many(
+            {"lease_owner": self.owner},
+            {"$set": {"lease_expires_at": datetime.utcnow()}}
+        )
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                dispatched = max((await for_each_tenant(self.poll_once)).values())
+            except Exception as e:
+                print(f"❌ Outbox relay error: {e}")
+                dispatched = 0
+
+            # Keep draining without sleeping while a tenant has a backlog
+            if dispatched >= self.batch_size:
+                continue
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def poll_once(self) -> int:
+        """Dispatch one batch per consumer, returning the largest batch size"""
+        largest = 0
+        for name, (handler, event_types, batch) in list(_consumers.items()):
+            checkpoint = await self._acquire_lease(name)
+            if checkpoint is None:
+                continue
+            largest = max(
+                largest, await self._drain(name, handler, event_types, checkpoint, batch)
+            )
+        return largest
+
+    async def _acquire_lease(self, name: str) -> Optional[int]:
+        """Take or renew the consumer lease, returning its checkpoint"""
+        now = datetime.utcnow()
+        try:
+            checkpoint_doc = await get_outbox_checkpoints_collection().find_one_and_update(
+                {
+                    "_id": name,
+                    "$or": [
+                        {"lease_owner": self.owner},
+                        {"lease_expires_at": {"$lt": now}}
+                    ]
+                },
+                {
+                    "$set": {
+                        "lease_owner": self.owner,
+                        "lease_expires_at": now + timedelta(seconds=OUTBOX_LEASE_SECONDS)
+                    },
+                    "$setOnInsert": {"seq": 0}
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Another worker holds a live lease for this consumer
+            return None
+        return checkpoint_doc["seq"]
+
+    async def _drain(
+        self,
+        name: str,
+        handler: Union[EventHandler, BatchHandler],
+        event_types: Optional[Set[OutboxEventType]],
+        checkpoint: int,
+        batch: bool = False
+    ) -> int:
+        cursor = get_outbox_collection().find(
+            {"seq": {"$gt": checkpoint}}
+        ).sort("seq", ASCENDING).limit(self.batch_size)
+        events_docs = await cursor.to_list(length=self.batch_size)
+
+        start = checkpoint
+        gap_cutoff = datetime.utcnow() - timedelta(seconds=OUTBOX_GAP_TIMEOUT_SECONDS)
+        batch_docs: List[dict] = []
+        try:
+            for event_doc in events_docs:
+                event = OutboxEventInDB(**event_doc)
+                if event.seq != checkpoint + 1 and event.created_at > gap_cutoff:
+                    # An earlier event may still be committing
+                    break
+                if event_types is None or event.type in event_types:
+                    if batch:
+                        batch_docs.append(event_doc)
+                    else:
+                        try:
+                            await handler(event)
+                        except Exception as e:
+                            print(f"❌ Outbox consumer '{name}' failed on event {event.seq}: {e}")
+                            if not await self._dead_letter_if_exhausted(name, [event_doc], e):
+                                break
+                checkpoint = event.seq
+            if batch_docs:
+                try:
+                    await handler([OutboxEventInDB(**event_doc) for event_doc in batch_docs])
+                except Exception as e:
+                    print(f"❌ Outbox consumer '{name}' failed on events "
+                          f"{batch_docs[0]['seq']}-{batch_docs[-1]['seq']}: {e}")
+                    if not await self._dead_letter_if_exhausted(name, batch_docs, e):
+                        # The whole batch is delivered again
+                        checkpoint = start
+        finally:
+            if checkpoint != start:
+                await get_outbox_checkpoints_collection().update_one(
+                    {"_id": name, "lease_owner": self.owner},
+                    {"$set": {"seq": checkpoint, "updated_at": datetime.utcnow()}}
+                )
+        return checkpoint - start
+
+    async def _dead_letter_if_exhausted(
+        self, name: str, event_docs: List[dict], error: Exception
+    ) -> bool:
+        """
+        Count a failure of consumer ``name`` on an event, or on a batch
+        starting with it; once it has failed OUTBOX_MAX_ATTEMPTS times,
+        dead-letter the events and return True to move on
+        """
+        seq = event_docs[0]["seq"]
+        checkpoint_doc = await get_outbox_checkpoints_collection().find_one_and_update(
+            {"_id": name, "lease_owner": self.owner},
+            [{
+                "$set": {
+                    "failed_seq": seq,
+                    "attempts": {
+                        "$cond": [
+                            {"$eq": ["$failed_seq", seq]},
+                            {"$add": [{"$ifNull": ["$attempts", 0]}, 1]},
+                            1
+                        ]
+                    }
+                }
+            }],
+            return_document=ReturnDocument.AFTER
+        )
+        if checkpoint_doc is None or checkpoint_doc["attempts"] < OUTBOX_MAX_ATTEMPTS:
+            return False
+        await get_outbox_dead_letters_collection().update_one(
+            {"_id": f"{name}:{seq}"},
+            {
+                "$set": {
+                    "consumer": name,
+                    "seq": seq,
+                    "events": event_docs,
+                    "error": f"{type(error).__name__}: {error}",
+                    "attempts": checkpoint_doc["attempts"],
+                    "failed_at": datetime.utcnow()
+                }
+            },
+            upsert=True
+        )
+        print(f"☠️  Outbox consumer '{name}' gave up on event {seq} after "
+              f"{checkpoint_doc['attempts']} attempts (see outbox_dead_letters)")
+        return True
+
+# Shared relay instance, started by the application on startup
+outbox_relay = OutboxRelay()
@@ -0,0 +1,147 @@
+"""
+Unified password hashing
+
+Accounts may hold any of three hash formats:
+  - bcrypt            "$2b$12$..." (utils/auth.py via passlib)
+  - pbkdf2-sha256     "$pbkdf2-sha256$<iterations>$<salt>$<checksum>"
+                      (passlib's format, adapted base64)
+  - legacy pbkdf2     32 hex chars of salt + 64 hex chars of digest,
+                      100000 iterations (utils/auth_simple.py)
+
+All of them verify here. New hashes use PASSWORD_HASH_SCHEME at the
+configured cost, and verify_and_update() hands back a replacement hash
+whenever a stored one uses another scheme or cost, so accounts move to the
+target on their next successful login. bcrypt is optional: without the
+bcrypt package bcrypt hashes cannot be verified and the target falls back
+to pbkdf2-sha256. Use calibrate_password_hash.py to pick costs.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import re
+import secrets
+from typing import Optional, Tuple
+
+try:
+    import bcrypt
+except ImportError:  # pragma: no cover - optional dependency
+    bcrypt = None
+
+# Configuration
+PASSWORD_HASH_SCHEME = os.getenv("PASSWORD_HASH_SCHEME", "bcrypt").lower()
+PASSWORD_BCRYPT_ROUNDS = int(os.getenv("PASSWORD_BCRYPT_ROUNDS", 12))
+PASSWORD_PBKDF2_ITERATIONS = int(os.getenv("PASSWORD_PBKDF2_ITERATIONS", 210000))
+
+BCRYPT = "bcrypt"
+PBKDF2_SHA256 = "pbkdf2_sha256"
+LEGACY_PBKDF2 = "legacy_pbkdf2"
+
+LEGACY_PBKDF2_ITERATIONS = 100000
+_LEGACY_PATTERN = re.compile(r"^[0-9a-f]{96}$")
+_BCRYPT_PATTERN = re.compile(r"^\$2[abxy]?\$(\d{2})\$[./A-Za-z0-9]{53}$")
+_PBKDF2_PREFIX = "$pbkdf2-sha256$"
+_PBKDF2_PATTERN = re.compile(r"^\$pbkdf2-sha256\$([1-9]\d*)\$([./A-Za-z0-9]+)\$([./A-Za-z0-9]+)$")
+
+if PASSWORD_HASH_SCHEME not in (BCRYPT, PBKDF2_SHA256):
+    print(f"⚠️  Unsupported PASSWORD_HASH_SCHEME '{PASSWORD_HASH_SCHEME}', using bcrypt")
+    PASSWORD_HASH_SCHEME = BCRYPT
+
+if PASSWORD_HASH_SCHEME == BCRYPT and bcrypt is None:
+    print("⚠️  bcrypt is not installed, hashing passwords with pbkdf2_sha256")
+    PASSWORD_HASH_SCHEME = PBKDF2_SHA256
+
+def _ab64_encode(data: bytes) -> str:
+    """passlib's adapted base64: '.' instead of '+', no padding"""
+    return base64.b64encode(data).decode("ascii").rstrip("=").replace("+", ".")
+
+def _ab64_decode(data: str) -> bytes:
+    data = data.replace(".", "+")
+    return base64.b64decode(data + "=" * (-len(data) % 4))
+
+def identify(hashed_password: str) -> Optional[Tuple[str, int]]:
+    """Return (scheme, cost) of a stored hash, or None if unrecognized"""
+    if not hashed_password:
+        return None
+    match = _BCRYPT_PATTERN.match(hashed_password)
+    if match:
+        return BCRYPT, int(match.group(1))
+    match = _PBKDF2_PATTERN.match(hashed_password)
+    if match:
+        return PBKDF2_SHA256, int(match.group(1))
+    if _LEGACY_PATTERN.match(hashed_password):
+        return LEGACY_PBKDF2, LEGACY_PBKDF2_ITERATIONS
+    return None
+
+def hash_password(
+    password: str,
+    scheme: str = None,
+    cost: Optional[int] = None
+) -> str:
+    """Hash ``password`` with ``scheme`` (default: the configured target)"""
+    scheme = scheme or PASSWORD_HASH_SCHEME
+    if scheme == BCRYPT:
+        rounds = cost or PASSWORD_BCRYPT_ROUNDS
+        return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("ascii")
+    if scheme == PBKDF2_SHA256:
+        iterations = cost or PASSWORD_PBKDF2_ITERATIONS
+        salt = secrets.token_bytes(16)
+        digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations)
+        return f"{_PBKDF2_PREFIX}{iterations}${_ab64_encode(salt)}${_ab64_encode(digest)}"
+    if scheme == LEGACY_PBKDF2:
+        salt = secrets.token_hex(16)
+        digest = hashlib.pbkdf2_hmac(
+            "sha256", password.encode("utf-8"), salt.encode("utf-8"), LEGACY_PBKDF2_ITERATIONS
+        )
+        return salt + digest.hex()
+    raise ValueError(f"Unknown password hash scheme: {scheme}")
+
+def verify_password(password: str, hashed_password: str) -> bool:
+    """Verify ``password`` against a hash in any supported format"""
+    identified = identify(hashed_password)
+    if identified is None:
+        return False
+    scheme, cost = identified
+
+    if scheme == BCRYPT:
+        if bcrypt is None:
+            print("⚠️  Cannot verify bcrypt hash: bcrypt is not installed")
+            return False
+        return bcrypt.checkpw(password.encode("utf-8"), hashed_password.encode("ascii"))
+
+    if scheme == PBKDF2_SHA256:
+        _, _, _, salt, checksum = hashed_password.split("$")
+        try:
+            salt, checksum = _ab64_decode(salt), _ab64_decode(checksum)
+        except ValueError:
+            # Not valid base64 (binascii.Error)
+            return False
+        digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, cost)
+        return hmac.compare_digest(digest, checksum)
+
+    salt = hashed_password[:32]
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt.encode("utf-8"), cost)
+    return hmac.compare_digest(digest.hex(), hashed_password[32:])
+
+def needs_rehash(hashed_password: str) -> bool:
+    """True if a stored hash is not on the target scheme and cost"""
+    identified = identify(hashed_password)
+    if identified is None:
+        return True
+    scheme, cost = identified
+    if scheme != PASSWORD_HASH_SCHEME:
+        return True
+    if scheme == BCRYPT:
+        return cost != PASSWORD_BCRYPT_ROUNDS
+    return cost != PASSWORD_PBKDF2_ITERATIONS
+
+def verify_and_update(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify ``password`` and, on success, return a new hash to store if the
+    current one is outdated: (verified, replacement hash or None)
+    """
+    if not verify_password(password, hashed_password):
+        return False, None
+    if needs_rehash(hashed_password):
+        return True, hash_password(password)
+    return True, None
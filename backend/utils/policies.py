@@ -0,0 +1,108 @@
+"""
+Access policies compiled into MongoDB filter fragments
+
+Instead of loading a document and then checking the caller's role in
+Python, routes AND the fragment for the caller into their query, so one
+find_one/update_one both fetches and authorizes. A fragment of {} means
+"no restriction". Policies only read ``id``, ``user_type`` and
+``department`` from the user, which keeps them easy to test on their own.
+"""
+from typing import Optional, Tuple
+
+def _role(user) -> str:
+    user_type = user.user_type
+    return getattr(user_type, "value", user_type)
+
+def _department(user) -> Optional[str]:
+    department = getattr(user, "department", None)
+    if department is None:
+        return None
+    return getattr(department, "value", department).lower()
+
+def with_policy(query: dict, policy: dict) -> dict:
+    """Combine a query with a policy fragment"""
+    if not policy:
+        return query
+    if not query:
+        return policy
+    return {"$and": [query, policy]}
+
+# Reports
+def report_read_filter(user) -> dict:
+    """
+    Reports a user may see: public users their own, officers their
+    department's or those assigned to them, admins all
+    """
+    role = _role(user)
+    if role == "admin":
+        return {}
+    if role == "officer":
+        department = _department(user)
+        if department:
+            return {
+                "$or": [
+                    {"department": department},
+                    {"assigned_officer_id": user.id}
+                ]
+            }
+        return {"assigned_officer_id": user.id}
+    return {"reporter_id": user.id}
+
+def report_write_filter(user) -> dict:
+    """
+    Reports a user may change the status of: officers their department's or
+    assigned ones, admins all, public users none
+    """
+    role = _role(user)
+    if role in ("admin", "officer"):
+        return report_read_filter(user)
+    return {"id": {"$exists": False}}
+
+def report_stats_filter(user) -> dict:
+    """
+    Reports counted in a user's statistics: an officer's department only
+    (not reports assigned to them elsewhere), otherwise what they can read
+    """
+    department = _department(user)
+    if _role(user) == "officer" and department:
+        return {"department": department}
+    return report_read_filter(user)
+
+def report_read_scopes(user) -> Tuple[dict, Optional[dict]]:
+    """
+    The read filter split into a part every user of the same role and
+    department shares and a disjoint personal part (None when empty).
+    Together they match the reports of report_read_filter. Officers share
+    their department's reports; reports assigned to them in another
+    department are personal.
+    """
+    department = _department(user)
+    if _role(user) == "officer" and department:
+        return (
+            {"department": department},
+            {"assigned_officer_id": user.id, "department": {"$ne": department}}
+        )
+    return report_read_filter(user), None
+
+def report_view_department(user, department_filter: Optional[str] = None) -> Optional[str]:
+    """
+    The department a user's report view is keyed to for caching: the one
+    filtered on, else an officer's own (reports assigned to them elsewhere
+    are invalidated with it), or None when the view spans departments
+    """
+    if department_filter:
+        return department_filter.lower()
+    if _role(user) == "officer":
+        return _department(user)
+    return None
+
+# Notifications
+def notification_read_filter(user) -> dict:
+    """A user's own notifications plus system-wide ones (user_id None)"""
+    return {"user_id": {"$in": [user.id, None]}}
+
+def notification_delete_filter(user) -> dict:
+    """Admins may delete any notification, others what they can read"""
+    if _role(user) == "admin":
+        return {}
+    return notification_read_filter(user)
@@ -0,0 +1,237 @@
+"""
+Token-bucket rate limiting middleware
+
+Each request is charged to a bucket keyed by (rule, identity), where the
+identity is the JWT subject when a valid bearer token is present and the
+client IP otherwise. Buckets live in process memory by default; with
+RATE_LIMIT_BACKEND=mongo they are kept in the rate_limits collection and
+updated with a single atomic pipeline update, so all gunicorn workers share
+one budget.
+"""
+import json
+import math
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException
+from pymongo import ASCENDING, ReturnDocument
+
+from database import get_rate_limits_collection
+from utils.auth import verify_token
+
+# Configuration
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+RATE_LIMIT_DEFAULT_CAPACITY = float(os.getenv("RATE_LIMIT_DEFAULT_CAPACITY", 60))
+RATE_LIMIT_DEFAULT_REFILL = float(os.getenv("RATE_LIMIT_DEFAULT_REFILL", 20))
+RATE_LIMIT_MAX_BUCKETS = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", 50000))
+# Paths never limited (health checks from the platform, API docs)
+RATE_LIMIT_EXEMPT_PATHS = {"/", "/health", "/healthz", "/docs", "/redoc", "/openapi.json"}
+# Reverse proxies in front of the app that append to X-Forwarded-For (1 on Render)
+TRUSTED_PROXY_COUNT = int(os.getenv("TRUSTED_PROXY_COUNT", 0))
+
+@dataclass
+class RateLimitRule:
+    """Bucket size and refill rate (tokens per second) for matching requests"""
+    name: str
+    pattern: str
+    capacity: float
+    refill_per_second: float
+    methods: Optional[Tuple[str, ...]] = None
+
+    def __post_init__(self):
+        self._regex = re.compile(self.pattern)
+
+    def matches(self, method: str, path: str) -> bool:
+        if self.methods and method not in self.methods:
+            return False
+        return bool(self._regex.match(path))
+
+# First matching rule wins; the last rule is the per-identity default
+DEFAULT_RULES: List[RateLimitRule] = [
+    RateLimitRule("unread_count", r"^/api/notifications/stats/unread-count/?$", 5, 0.5),
+    RateLimitRule("stats", r"^/api/reports/stats/", 10, 1),
+    RateLimitRule("login", r"^/api/auth/(login|register)/?$", 10, 0.2, ("POST",)),
+    RateLimitRule("report_submit", r"^/api/reports/?$", 10, 0.2, ("POST",)),
+    RateLimitRule("default", r"^/", RATE_LIMIT_DEFAULT_CAPACITY, RATE_LIMIT_DEFAULT_REFILL),
+]
+
+def load_rules() -> List[RateLimitRule]:
+    """
+    Rules from RATE_LIMIT_RULES (a JSON list of RateLimitRule fields),
+    falling back to DEFAULT_RULES
+    """
+    raw = os.getenv("RATE_LIMIT_RULES")
+    if not raw:
+        return DEFAULT_RULES
+    rules = []
+    for rule in json.loads(raw):
+        methods = rule.pop("methods", None)
+        rules.append(RateLimitRule(methods=tuple(methods) if methods else None, **rule))
+    return rules
+
+class MemoryBucketStore:
+    """Per-process buckets with least-recently-used eviction"""
+
+    def __init__(self, max_buckets: int = RATE_LIMIT_MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, key: str, rule: RateLimitRule, cost: float = 1) -> Tuple[bool, float]:
+        """Take ``cost`` tokens, returning (allowed, tokens left)"""
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (rule.capacity, now))
+        tokens = min(rule.capacity, tokens + (now - updated) * rule.refill_per_second)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_buckets:
+            self._buckets.popitem(last=False)
+        return allowed, tokens
+
+class MongoBucketStore:
+    """Buckets shared by all workers, one atomic update per request"""
+
+    async def ensure_indexes(self):
+        await get_rate_limits_collection().create_index(
+            [("expires_at", ASCENDING)], expireAfterSeconds=0
+        )
+
+    async def take(self, key: str, rule: RateLimitRule, cost: float = 1) -> Tuple[bool, float]:
+        now = datetime.utcnow()
+        # Idle long enough to refill completely -> the document may expire
+        idle_seconds = rule.capacity / rule.refill_per_second if rule.refill_per_second else 3600
+        refilled = {
+            "$min": [
+                rule.capacity,
+                {
+                    "$add": [
+                        {"$ifNull": ["$tokens", rule.capacity]},
+                        {
+                            "$multiply": [
+                                {"$divide": [{"$subtract": [now, {"$ifNull": ["$ts", now]}]}, 1000]},
+                                rule.refill_per_second
+                            ]
+                        }
+                    ]
+                }
+            ]
+        }
+        bucket = await get_rate_limits_collection().find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"tokens": refilled, "ts": now}},
+                {"$set": {"allowed": {"$gte": ["$tokens", cost]}}},
+                {
+                    "$set": {
+                        "tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", cost]}, "$tokens"]},
+                        "expires_at": now + timedelta(seconds=idle_seconds)
+                    }
+                }
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return bucket["allowed"], bucket["tokens"]
+
+def client_ip(scope) -> str:
+    """
+    Client address as seen by the nearest of TRUSTED_PROXY_COUNT proxies
+
+    Each proxy appends the address it received the request from to
+    X-Forwarded-For, so only the last TRUSTED_PROXY_COUNT hops can be
+    trusted; anything before them is whatever the client sent. Without a
+    trusted proxy the header is ignored.
+    """
+    if TRUSTED_PROXY_COUNT > 0:
+        hops = []
+        for name, value in scope.get("headers", []):
+            if name == b"x-forwarded-for":
+                hops.extend(hop.strip() for hop in value.decode("latin-1").split(","))
+        hops = [hop for hop in hops if hop]
+        if hops:
+            return hops[-min(TRUSTED_PROXY_COUNT, len(hops))]
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+def request_identity(scope) -> str:
+    """JWT subject of the request if it carries a valid token, else its IP"""
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                try:
+                    subject = verify_token(token).get("sub")
+                except HTTPException:
+                    break
+                if subject:
+                    return f"user:{subject}"
+            break
+    return f"ip:{client_ip(scope)}"
+
+async def send_error(send, status_code: int, detail: str, headers: List[Tuple[bytes, bytes]]):
+    """Send a JSON error response straight from ASGI middleware"""
+    body = json.dumps({"detail": detail}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+            *headers
+        ]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+class RateLimitMiddleware:
+    """ASGI middleware answering 429 with Retry-After when a bucket is empty"""
+
+    def __init__(self, app, rules: Optional[List[RateLimitRule]] = None, store=None):
+        self.app = app
+        self.rules = rules or load_rules()
+        self.store = store or rate_limit_store
+        self.fallback_store = MemoryBucketStore()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in RATE_LIMIT_EXEMPT_PATHS:
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        if method == "OPTIONS":
+            return await self.app(scope, receive, send)
+
+        rule = next((r for r in self.rules if r.matches(method, scope["path"])), None)
+        if rule is None:
+            return await self.app(scope, receive, send)
+
+        key = f"{rule.name}:{request_identity(scope)}"
+        try:
+            allowed, remaining = await self.store.take(key, rule)
+        except Exception as e:
+            # Shared store unavailable: limit per worker rather than fail
+            print(f"⚠️  Rate limit store error, using local buckets: {e}")
+            allowed, remaining = await self.fallback_store.take(key, rule)
+
+        if allowed:
+            return await self.app(scope, receive, send)
+
+        retry_after = math.ceil((1 - remaining) / rule.refill_per_second) if rule.refill_per_second else 60
+        await send_error(send, 429, "Too many requests", [
+            (b"retry-after", str(max(retry_after, 1)).encode("latin-1")),
+            (b"x-ratelimit-limit", str(int(rule.capacity)).encode("latin-1")),
+            (b"x-ratelimit-remaining", b"0"),
+        ])
+
+# Shared bucket store selected by RATE_LIMIT_BACKEND
+rate_limit_store = MongoBucketStore() if RATE_LIMIT_BACKEND == "mongo" else MemoryBucketStore()
+
+async def ensure_rate_limit_indexes():
+    """Create the TTL index for the shared store when it is in use"""
+    if isinstance(rate_limit_store, MongoBucketStore):
+        await rate_limit_store.ensure_indexes()
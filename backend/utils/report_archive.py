@@ -0,0 +1,191 @@
+"""
+Report archival
+
+Finished reports (done, rejected or closed) are rarely read once they are
+old, but they make up most of the reports collection and of every index on
+it. A background job moves those untouched for REPORT_ARCHIVE_AFTER_DAYS
+into reports_archive, in batches. Each batch is copied and then deleted
+from reports in one transaction; a report changed in between (e.g.
+reopened) keeps its updated_at out of the delete and stays hot.
+
+Archived reports keep their fields and are still served by id, in listings
+that ask for them and in stats and exports. A report reopened from the
+archive is restored to reports first. Sync clients keep the copies they
+have; archival is not a deletion.
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Optional, Set
+
+from pymongo import ASCENDING, DESCENDING, ReplaceOne
+
+from database import (
+    get_reports_collection,
+    get_reports_archive_collection,
+    run_in_transaction,
+    for_each_tenant
+)
+from utils.cache import invalidate_report_caches
+from utils.leases import claim_due_run
+from utils.sharding import ensure_report_id_index
+from utils.workflow import CLOSED_STATUSES
+
+# Configuration
+REPORT_ARCHIVE_ENABLED = os.getenv("REPORT_ARCHIVE_ENABLED", "true").lower() == "true"
+REPORT_ARCHIVE_AFTER_DAYS = int(os.getenv("REPORT_ARCHIVE_AFTER_DAYS", 180))
+REPORT_ARCHIVE_INTERVAL_SECONDS = float(os.getenv("REPORT_ARCHIVE_INTERVAL_SECONDS", 3600))
+REPORT_ARCHIVE_BATCH_SIZE = int(os.getenv("REPORT_ARCHIVE_BATCH_SIZE", 200))
+
+_CLOSED_VALUES = sorted(closed.value for closed in CLOSED_STATUSES)
+
+async def ensure_report_archive_indexes():
+    """Indexes for picking reports to archive and for reading the archive"""
+    await get_reports_collection().create_index(
+        [("status", ASCENDING), ("updated_at", ASCENDING)]
+    )
+    archive_collection = get_reports_archive_collection()
+    await ensure_report_id_index(archive_collection)
+    # Same shapes as the read policy: reporter, department, assignee
+    await archive_collection.create_index(
+        [("reporter_id", ASCENDING), ("created_at", DESCENDING)]
+    )
+    await archive_collection.create_index(
+        [("department", ASCENDING), ("status", ASCENDING), ("created_at", DESCENDING)]
+    )
+    await archive_collection.create_index(
+        [("assigned_officer_id", ASCENDING), ("status", ASCENDING)]
+    )
+    await archive_collection.create_index([("updated_at", ASCENDING), ("id", ASCENDING)])
+
+async def archive_batch(
+    cutoff: datetime,
+    batch_size: int = REPORT_ARCHIVE_BATCH_SIZE,
+    departments: Optional[Set[str]] = None
+) -> int:
+    """
+    Move up to ``batch_size`` reports finished before ``cutoff`` to the
+    archive, adding the departments of the reports read to ``departments``
+    """
+    reports_collection = get_reports_collection()
+    archive_collection = get_reports_archive_collection()
+    docs = await reports_collection.find(
+        {"status": {"$in": _CLOSED_VALUES}, "updated_at": {"$lte": cutoff}}
+    ).sort("updated_at", ASCENDING).limit(batch_size).to_list(length=batch_size)
+    if not docs:
+        return 0
+    if departments is not None:
+        departments.update(doc.get("department") for doc in docs)
+    archived_at = datetime.utcnow()
+
+    async def write_move(session):
+        await archive_collection.bulk_write(
+            [
+                ReplaceOne({"_id": doc["_id"]}, {**doc, "archived_at": archived_at}, upsert=True)
+                for doc in docs
+            ],
+            ordered=False,
+            session=session
+        )
+        result = await reports_collection.delete_many(
+            {"$or": [{"_id": doc["_id"], "updated_at": doc["updated_at"]} for doc in docs]},
+            session=session
+        )
+        if result.deleted_count < len(docs):
+            # Changed since they were read: they stay hot
+            still_hot = await reports_collection.distinct(
+                "_id", {"_id": {"$in": [doc["_id"] for doc in docs]}}, session=session
+            )
+            await archive_collection.delete_many({"_id": {"$in": still_hot}}, session=session)
+        return result.deleted_count
+
+    return await run_in_transaction(write_move)
+
+async def archive_reports(now: Optional[datetime] = None) -> int:
+    """Archive every report finished more than REPORT_ARCHIVE_AFTER_DAYS ago"""
+    cutoff = (now or datetime.utcnow()) - timedelta(days=REPORT_ARCHIVE_AFTER_DAYS)
+    archived = 0
+    departments: Set[str] = set()
+    while True:
+        moved = await archive_batch(cutoff, departments=departments)
+        archived += moved
+        if moved < REPORT_ARCHIVE_BATCH_SIZE:
+            if archived:
+                await invalidate_report_caches(departments)
+            return archived
+
+async def find_archived_report(query: dict, projection: Optional[dict] = None) -> Optional[dict]:
+    """find_one on the archive, for lookups that missed the hot collection"""
+    return await get_reports_archive_collection().find_one(query, projection)
+
+async def restore_report(query: dict) -> bool:
+    """
+    Move the archived report matching ``query`` back to reports, e.g.
+    before reopening it. Returns whether a report was restored.
+    """
+    archive_collection = get_reports_archive_collection()
+    report_doc = await archive_collection.find_one(query)
+    if not report_doc:
+        return False
+    report_doc.pop("archived_at", None)
+
+    async def write_restore(session):
+        reports_collection = get_reports_collection()
+        # Another request may have restored it already
+        if not await reports_collection.find_one({"_id": report_doc["_id"]}, {"_id": 1}, session=session):
+            await reports_collection.insert_one(report_doc, session=session)
+        await archive_collection.delete_one({"_id": report_doc["_id"]}, session=session)
+        return True
+
+    return await run_in_transaction(write_restore)
+
+def union_with_archive(match: dict) -> dict:
+    """$unionWith stage adding archived reports matching ``match`` to a pipeline"""
+    return {
+        "$unionWith": {
+            "coll": get_reports_archive_collection().name,
+            "pipeline": [{"$match": match}]
+        }
+    }
+
+class ReportArchiver:
+    """Background task archiving finished reports"""
+
+    def __init__(self, interval: float = REPORT_ARCHIVE_INTERVAL_SECONDS):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+
+    async def start(self):
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run())
+            print(f"🗃️  Report archival every {self.interval:.0f}s "
+                  f"(finished for {REPORT_ARCHIVE_AFTER_DAYS}d)")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stopping.set()
+        await self._task
+        self._task = None
+
+    async def _run_once(self):
+        if await claim_due_run("report_archive", self.interval):
+            archived = await archive_reports()
+            if archived:
+                print(f"🗃️  Reports archived: {archived}")
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                await for_each_tenant(self._run_once)
+            except Exception as e:
+                print(f"❌ Report archival error: {e}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), min(self.interval, 300))
+            except asyncio.TimeoutError:
+                pass
+
+# Shared task started with the app
+report_archiver = ReportArchiver()
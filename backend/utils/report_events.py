@@ -0,0 +1,163 @@
+"""
+Outbox consumers that derive data from report events
+
+Handlers here must be idempotent: the relay delivers at least once, so an
+event can be seen again after a crash or a lost lease.
+"""
+from typing import List, Set
+
+from database import get_notifications_collection, get_users_collection
+from models.schemas import (
+    Department, NotificationInDB, NotificationType, OutboxEventInDB, OutboxEventType
+)
+from utils.outbox import consumer
+from utils.routing import assign_new_report, apply_status_change
+from utils.work_queue import count_duplicate
+from utils.analytics import record_report_event
+from utils.cache import invalidate_report_caches
+
+# Reports store departments lowercased, users as the Department value
+_DEPARTMENT_VALUES = {department.value.lower(): department.value for department in Department}
+
+@consumer("status_notifications", OutboxEventType.REPORT_STATUS_CHANGED)
+async def notify_reporter_of_status_change(event: OutboxEventInDB):
+    """Tell the reporter that their report changed status"""
+    reporter_id = event.payload.get("reporter_id")
+    if not reporter_id or reporter_id == "anonymous":
+        return
+
+    notification = NotificationInDB(
+        # Derived from the event so redelivery does not duplicate it
+        id=f"{event.id}-status",
+        title="Report status updated",
+        message=event.payload.get("message") or
+            f"Your report is now {event.payload.get('new_status')}",
+        type=NotificationType.STATUS_UPDATE,
+        user_id=reporter_id,
+        issue_id=event.aggregate_id,
+        data={
+            "old_status": event.payload.get("old_status"),
+            "new_status": event.payload.get("new_status")
+        },
+        created_at=event.created_at
+    )
+
+    await get_notifications_collection().update_one(
+        {"id": notification.id},
+        {"$setOnInsert": notification.dict()},
+        upsert=True
+    )
+
+async def _escalation_recipients(payload: dict) -> List[str]:
+    """
+    The assigned officer, or the department's officers while the report is
+    unassigned; admins join from the second escalation on
+    """
+    query = {"is_active": True, "$or": []}
+    if payload.get("assigned_officer_id"):
+        query["$or"].append({"id": payload["assigned_officer_id"]})
+    else:
+        department = payload.get("department") or ""
+        query["$or"].append({
+            "user_type": "officer",
+            "department": _DEPARTMENT_VALUES.get(department, department)
+        })
+    if payload.get("escalation_level", 1) >= 2:
+        query["$or"].append({"user_type": "admin"})
+
+    cursor = get_users_collection().find(query, {"id": 1})
+    return [user_doc["id"] async for user_doc in cursor]
+
+@consumer("sla_escalations", OutboxEventType.REPORT_SLA_BREACHED)
+async def notify_sla_breach(event: OutboxEventInDB):
+    """Tell the people responsible that a report is past its SLA"""
+    level = event.payload.get("escalation_level", 1)
+    title = event.payload.get("title") or "A report"
+
+    notifications_collection = get_notifications_collection()
+    for user_id in await _escalation_recipients(event.payload):
+        notification = NotificationInDB(
+            id=f"{event.id}-sla-{user_id}",
+            title="Report overdue" if level == 1 else f"Report overdue (escalation {level})",
+            message=f"{title} has passed its resolution deadline",
+            type=NotificationType.URGENT,
+            user_id=user_id,
+            issue_id=event.aggregate_id,
+            data={
+                "escalation_level": level,
+                "priority": event.payload.get("priority"),
+                "department": event.payload.get("department")
+            },
+            created_at=event.created_at
+        )
+        await notifications_collection.update_one(
+            {"id": notification.id},
+            {"$setOnInsert": notification.dict()},
+            upsert=True
+        )
+
+@consumer(
+    "report_routing",
+    OutboxEventType.REPORT_CREATED,
+    OutboxEventType.REPORT_STATUS_CHANGED
+)
+async def route_reports(event: OutboxEventInDB):
+    """Assign new reports and keep officer workloads in step"""
+    if event.type == OutboxEventType.REPORT_CREATED:
+        await assign_new_report(event)
+    else:
+        await apply_status_change(event)
+
+@consumer("duplicate_tracking", OutboxEventType.REPORT_CREATED, batch=True)
+async def track_duplicates(events: List[OutboxEventInDB]):
+    """Count new reports against nearby open ones, raising their queue rank"""
+    departments = set()
+    for event in events:
+        if await count_duplicate(event):
+            departments.add(event.payload.get("department"))
+    if departments:
+        await invalidate_report_caches(departments)
+
+async def _affected_departments(events: List[OutboxEventInDB]) -> Set[str]:
+    """
+    Departments whose report views the events change: the reports' own,
+    and those of the officers they are (or were) assigned to, who also see
+    them in their department's views
+    """
+    departments = {event.payload.get("department") for event in events}
+    officer_ids = {
+        officer_id
+        for event in events
+        for officer_id in (
+            event.payload.get("assigned_officer_id"),
+            event.payload.get("previous_assigned_officer_id")
+        )
+        if officer_id
+    }
+    if officer_ids:
+        cursor = get_users_collection().find(
+            {"id": {"$in": sorted(officer_ids)}}, {"department": 1}
+        )
+        departments.update([user_doc.get("department") async for user_doc in cursor])
+    return {department for department in departments if department}
+
+@consumer(
+    "report_caches",
+    OutboxEventType.REPORT_CREATED,
+    OutboxEventType.REPORT_STATUS_CHANGED,
+    OutboxEventType.REPORT_SLA_BREACHED,
+    OutboxEventType.REPORT_ASSIGNED,
+    batch=True
+)
+async def invalidate_report_views(events: List[OutboxEventInDB]):
+    """Drop the cached report views of a batch of report writes, once"""
+    await invalidate_report_caches(await _affected_departments(events))
+
+@consumer(
+    "analytics_rollups",
+    OutboxEventType.REPORT_CREATED,
+    OutboxEventType.REPORT_STATUS_CHANGED
+)
+async def update_rollups(event: OutboxEventInDB):
+    """Keep the hourly and daily analytics rollups current"""
+    await record_report_event(event)
@@ -0,0 +1,81 @@
+"""
+Fast JSON response class used as the application's default
+
+FastJSONResponse renders with orjson, which serializes datetime, enum, UUID
+and dataclass values natively. Routes returning data still go through
+FastAPI's serialize_response first (the response_model serializer, or
+jsonable_encoder without one); the response class only replaces the final
+json.dumps. Hot list routes skip that step by returning list_response(),
+which dumps their schema models with model_dump() and encodes the result
+with orjson directly.
+
+Naive datetimes keep the "YYYY-MM-DDTHH:MM:SS[.ffffff]" format the Flutter
+app already parses. Falls back to the standard library encoder when orjson
+is not installed.
+"""
+import json
+from datetime import date, datetime, time
+from enum import Enum
+from typing import Any, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+def _default(obj: Any) -> Any:
+    """Encode values orjson/json do not handle natively"""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    return jsonable_encoder(obj)
+
+def _stdlib_default(obj: Any) -> Any:
+    """Mirror orjson's native handling for the standard library encoder"""
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, Enum):
+        return obj.value
+    return _default(obj)
+
+def dumps(content: Any) -> bytes:
+    """Encode ``content`` as compact UTF-8 JSON"""
+    if orjson is not None:
+        return orjson.dumps(
+            content,
+            default=_default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        )
+    return json.dumps(
+        content,
+        default=_stdlib_default,
+        ensure_ascii=False,
+        separators=(",", ":")
+    ).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def list_response(items: List[BaseModel], response: Optional[Response] = None) -> FastJSONResponse:
+    """
+    Response for a list of schema models, without response_model
+    serialization. The models must already be of the route's
+    response_model type, as nothing validates them. Headers set on the
+    route's injected ``response`` (ETag and the like) are carried over.
+    """
+    json_response = FastJSONResponse([item.model_dump() for item in items])
+    if response is not None:
+        json_response.headers.update({
+            name: value for name, value in response.headers.items()
+            if name != "content-length"
+        })
+    return json_response
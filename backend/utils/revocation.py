@@ -0,0 +1,148 @@
+"""
+Access-token revocation list for stateless authentication
+
+When tokens are authorized from their claims alone, deactivating a user or
+changing their role must still invalidate tokens already handed out. Such
+changes call revoke_user_tokens(), which records "tokens issued to this user
+before now are void" in the revocations collection. Every worker keeps the
+live entries in memory - a Bloom filter answers the common "never revoked"
+case, backed by an exact user id -> revoked_at map - and polls the
+collection for new entries. Entries expire once every token they could
+match has expired.
+"""
+import asyncio
+import hashlib
+import math
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from pymongo import ASCENDING
+
+from database import get_revocations_collection, current_tenant, for_each_tenant
+
+# Configuration
+REVOCATION_POLL_INTERVAL = float(os.getenv("REVOCATION_POLL_INTERVAL", 2.0))
+REVOCATION_BLOOM_CAPACITY = int(os.getenv("REVOCATION_BLOOM_CAPACITY", 10000))
+REVOCATION_BLOOM_ERROR_RATE = float(os.getenv("REVOCATION_BLOOM_ERROR_RATE", 0.001))
+# Re-read window covering inserts that commit out of revoked_at order
+REVOCATION_POLL_OVERLAP = timedelta(seconds=5)
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        # Double hashing: position_i = h1 + i * h2
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[p >> 3] & (1 << (p & 7)) for p in self._positions(item))
+
+class RevocationList:
+    """In-memory view of the revocations collection for this worker"""
+
+    def __init__(self, poll_interval: float = REVOCATION_POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self._revoked: Dict[str, datetime] = {}
+        self._expires: Dict[str, datetime] = {}
+        self._bloom = BloomFilter(REVOCATION_BLOOM_CAPACITY, REVOCATION_BLOOM_ERROR_RATE)
+        # Per tenant; user ids are unique across tenants, so one map holds all
+        self._last_seen: Dict[str, datetime] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def _apply(self, user_id: str, revoked_at: datetime, expires_at: datetime):
+        if revoked_at > self._revoked.get(user_id, datetime.min):
+            self._revoked[user_id] = revoked_at
+            self._expires[user_id] = expires_at
+            self._bloom.add(user_id)
+
+    def is_revoked(self, user_id: str, issued_at: datetime) -> bool:
+        """True if a token issued to ``user_id`` at ``issued_at`` is void"""
+        if user_id not in self._bloom:
+            return False
+        revoked_at = self._revoked.get(user_id)
+        return revoked_at is not None and issued_at <= revoked_at
+
+    def _prune(self):
+        """Drop expired entries and rebuild the Bloom filter without them"""
+        now = datetime.utcnow()
+        expired = [user_id for user_id, expires in self._expires.items() if expires <= now]
+        if not expired:
+            return
+        for user_id in expired:
+            self._revoked.pop(user_id, None)
+            self._expires.pop(user_id, None)
+        self._bloom = BloomFilter(REVOCATION_BLOOM_CAPACITY, REVOCATION_BLOOM_ERROR_RATE)
+        for user_id in self._revoked:
+            self._bloom.add(user_id)
+
+    async def refresh(self):
+        """Load the current tenant's revocations recorded since its last refresh"""
+        tenant = current_tenant()
+        query = {"expires_at": {"$gt": datetime.utcnow()}}
+        if tenant in self._last_seen:
+            query["revoked_at"] = {"$gt": self._last_seen[tenant] - REVOCATION_POLL_OVERLAP}
+        cursor = get_revocations_collection().find(query).sort("revoked_at", ASCENDING)
+        async for entry in cursor:
+            self._apply(entry["user_id"], entry["revoked_at"], entry["expires_at"])
+            self._last_seen[tenant] = max(self._last_seen.get(tenant, entry["revoked_at"]), entry["revoked_at"])
+        self._prune()
+
+    async def _load(self):
+        await get_revocations_collection().create_index(
+            [("expires_at", ASCENDING)], expireAfterSeconds=0
+        )
+        await get_revocations_collection().create_index([("revoked_at", ASCENDING)])
+        await self.refresh()
+
+    async def start(self):
+        """Load current revocations and keep following new ones"""
+        if self._task is None:
+            await for_each_tenant(self._load)
+            self._task = asyncio.create_task(self._poll())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await for_each_tenant(self.refresh)
+            except Exception as e:
+                print(f"⚠️  Revocation list refresh failed: {e}")
+
+    async def revoke(self, user_id: str, reason: str, token_lifetime: timedelta):
+        """Void every token issued to ``user_id`` up to now"""
+        revoked_at = datetime.utcnow()
+        expires_at = revoked_at + token_lifetime
+        await get_revocations_collection().insert_one({
+            "user_id": user_id,
+            "reason": reason,
+            "revoked_at": revoked_at,
+            "expires_at": expires_at
+        })
+        # Effective in this worker at once, in others after their next poll
+        self._apply(user_id, revoked_at, expires_at)
+
+# Shared revocation list, started by the application in stateless mode
+revocation_list = RevocationList()
@@ -0,0 +1,545 @@
+"""
+Automatic routing of new reports to officers
+
+Every officer has a workload entry holding the priority-weighted load of
+the open reports assigned to them and the running centroid of where those
+reports are: a report's location is added when it is assigned to the
+officer and taken off again when it closes or moves to another officer. Entries are kept sorted by load, so picking the least-loaded
+officers of a department is a bounded index read (O(log n)) rather than
+an aggregation over reports. The few candidates are then scored on load,
+distance and report priority.
+
+Workloads live in the officer_workloads collection, indexed on
+(department, active, load). They are maintained incrementally by the
+report_routing outbox consumer, which also assigns new reports.
+MemoryWorkloadStore keeps the same counters in a heap so that
+replay_routing.py can evaluate strategies against historical reports.
+"""
+import heapq
+import math
+import os
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import ASCENDING, ReturnDocument
+
+from database import (
+    get_officer_workloads_collection,
+    get_reports_collection,
+    get_users_collection,
+    get_counters_collection,
+    get_notifications_collection,
+    run_in_transaction
+)
+from models.schemas import (
+    Department, NotificationInDB, NotificationType, OutboxEventInDB, OutboxEventType,
+    ReportInDB, ReportStatus, ReportUpdate
+)
+from utils.workflow import OPEN_STATUSES
+from utils.leases import claim_due_run
+from utils.outbox import record_event
+
+# Configuration
+ROUTING_ENABLED = os.getenv("ROUTING_ENABLED", "true").lower() == "true"
+ROUTING_STRATEGY = os.getenv("ROUTING_STRATEGY", "balanced")
+ROUTING_OFFICER_SYNC_SECONDS = int(os.getenv("ROUTING_OFFICER_SYNC_SECONDS", 300))
+
+# Only one worker rebuilds missing workloads within this time
+ROUTING_REBUILD_LEASE_SECONDS = 3600
+
+# Load an open report adds to its officer
+PRIORITY_WEIGHTS = {"critical": 3.0, "high": 2.0, "medium": 1.0, "low": 0.5}
+# How much more distance counts for urgent reports
+PRIORITY_DISTANCE_FACTORS = {"critical": 2.0, "high": 1.5, "medium": 1.0, "low": 0.5}
+
+_OPEN_VALUES = {open_status.value for open_status in OPEN_STATUSES}
+# Reports store departments lowercased, users as the Department value
+_DEPARTMENT_VALUES = {department.value.lower(): department.value for department in Department}
+
+@dataclass
+class RoutingStrategy:
+    name: str
+    # Least-loaded officers considered per report
+    candidates: int
+    # Kilometres of extra travel worth one unit of load; None ignores distance
+    km_per_load: Optional[float]
+
+STRATEGIES = {
+    "least_loaded": RoutingStrategy("least_loaded", 1, None),
+    "balanced": RoutingStrategy("balanced", 5, 5.0),
+    "proximity": RoutingStrategy("proximity", 15, 1.0),
+}
+
+# Change to an officer's (lat_sum, lon_sum, located)
+LocationDelta = Tuple[float, float, int]
+
+@dataclass
+class OfficerLoad:
+    officer_id: str
+    department: Optional[str] = None
+    name: str = ""
+    load: float = 0.0
+    open_reports: int = 0
+    lat_sum: float = 0.0
+    lon_sum: float = 0.0
+    located: int = 0
+    active: bool = True
+
+    def centroid(self) -> Optional[Tuple[float, float]]:
+        if not self.located:
+            return None
+        return self.lat_sum / self.located, self.lon_sum / self.located
+
+def priority_weight(priority: Optional[str]) -> float:
+    return PRIORITY_WEIGHTS.get((priority or "").lower(), 1.0)
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 6371.0 * 2 * math.asin(math.sqrt(a))
+
+def score(
+    officer: OfficerLoad,
+    strategy: RoutingStrategy,
+    priority: Optional[str],
+    latitude: Optional[float],
+    longitude: Optional[float]
+) -> float:
+    """Lower is better: current load plus distance converted to load"""
+    centroid = officer.centroid()
+    if strategy.km_per_load is None or centroid is None or latitude is None or longitude is None:
+        return officer.load
+    distance = haversine_km(latitude, longitude, *centroid)
+    factor = PRIORITY_DISTANCE_FACTORS.get((priority or "").lower(), 1.0)
+    return officer.load + factor * distance / strategy.km_per_load
+
+class MemoryWorkloadStore:
+    """
+    Workloads in process memory: a min-heap of (load, officer) per
+    department with lazy deletion of outdated entries
+    """
+
+    def __init__(self):
+        self._officers: Dict[str, OfficerLoad] = {}
+        self._heaps: Dict[str, List[Tuple[float, str]]] = defaultdict(list)
+
+    def _push(self, officer: OfficerLoad):
+        if officer.department and officer.active:
+            heap = self._heaps[officer.department]
+            heapq.heappush(heap, (officer.load, officer.officer_id))
+            # Rebuild once stale entries dominate, keeping pushes O(log n)
+            if len(heap) > 4 * len(self._officers) + 16:
+                self._heaps[officer.department] = [
+                    (entry.load, entry.officer_id) for entry in self._officers.values()
+                    if entry.department == officer.department and entry.active
+                ]
+                heapq.heapify(self._heaps[officer.department])
+
+    async def add_officer(self, officer: OfficerLoad):
+        self._officers[officer.officer_id] = officer
+        self._push(officer)
+
+    async def get(self, officer_id: str) -> Optional[OfficerLoad]:
+        return self._officers.get(officer_id)
+
+    def loads(self, department: str) -> List[float]:
+        """Current loads of a department's officers"""
+        return [
+            officer.load for officer in self._officers.values()
+            if officer.department == department
+        ]
+
+    async def candidates(self, department: str, limit: int) -> List[OfficerLoad]:
+        """The ``limit`` least-loaded active officers of ``department``"""
+        heap = self._heaps.get(department, [])
+        found: List[OfficerLoad] = []
+        seen = set()
+        popped = []
+        while heap and len(found) < limit:
+            entry = heapq.heappop(heap)
+            officer = self._officers.get(entry[1])
+            # Drop entries left behind by a later load change
+            if (officer is None or not officer.active or officer.load != entry[0]
+                    or officer.department != department or officer.officer_id in seen):
+                continue
+            seen.add(officer.officer_id)
+            found.append(officer)
+            popped.append(entry)
+        for entry in popped:
+            heapq.heappush(heap, entry)
+        return found
+
+    async def apply(
+        self,
+        officer_id: str,
+        load_delta: float,
+        open_delta: int,
+        location_delta: Optional[LocationDelta] = None,
+        seq: Optional[int] = None,
+        session=None
+    ):
+        officer = self._officers.get(officer_id)
+        if officer is None:
+            officer = self._officers[officer_id] = OfficerLoad(officer_id=officer_id)
+        officer.load = max(0.0, officer.load + load_delta)
+        officer.open_reports = max(0, officer.open_reports + open_delta)
+        if location_delta is not None:
+            officer.lat_sum += location_delta[0]
+            officer.lon_sum += location_delta[1]
+            officer.located = max(0, officer.located + location_delta[2])
+            if not officer.located:
+                officer.lat_sum = officer.lon_sum = 0.0
+        self._push(officer)
+
+class MongoWorkloadStore:
+    """Workloads shared by all workers in the officer_workloads collection"""
+
+    def __init__(self):
+        # department -> monotonic time of the last officer sync
+        self._synced: Dict[str, float] = {}
+
+    async def ensure_indexes(self):
+        await get_officer_workloads_collection().create_index(
+            [("department", ASCENDING), ("active", ASCENDING), ("load", ASCENDING)]
+        )
+
+    @staticmethod
+    def _to_officer(workload_doc: dict) -> OfficerLoad:
+        return OfficerLoad(
+            officer_id=workload_doc["_id"],
+            **{
+                key: workload_doc[key]
+                for key in (
+                    "department", "name", "load", "open_reports",
+                    "lat_sum", "lon_sum", "located", "active"
+                )
+                if workload_doc.get(key) is not None
+            }
+        )
+
+    async def sync_officers(self, department: Optional[str] = None, force: bool = False):
+        """
+        Mirror officer accounts (name, department, active) into workloads,
+        at most once per ROUTING_OFFICER_SYNC_SECONDS per department
+        """
+        key = department or "*"
+        if not force and time.monotonic() - self._synced.get(key, float("-inf")) < ROUTING_OFFICER_SYNC_SECONDS:
+            return
+        self._synced[key] = time.monotonic()
+
+        query = {"user_type": "officer"}
+        if department:
+            query["department"] = _DEPARTMENT_VALUES.get(department, department)
+        cursor = get_users_collection().find(
+            query, {"id": 1, "name": 1, "department": 1, "is_active": 1}
+        )
+        workloads_collection = get_officer_workloads_collection()
+        async for user_doc in cursor:
+            await workloads_collection.update_one(
+                {"_id": user_doc["id"]},
+                {
+                    "$set": {
+                        "name": user_doc.get("name", ""),
+                        "department": (user_doc.get("department") or "").lower() or None,
+                        "active": user_doc.get("is_active", True)
+                    },
+                    "$setOnInsert": {"load": 0.0, "open_reports": 0}
+                },
+                upsert=True
+            )
+
+    async def get(self, officer_id: str) -> Optional[OfficerLoad]:
+        workload_doc = await get_officer_workloads_collection().find_one({"_id": officer_id})
+        return self._to_officer(workload_doc) if workload_doc else None
+
+    async def candidates(self, department: str, limit: int) -> List[OfficerLoad]:
+        """The ``limit`` least-loaded active officers, read off the index"""
+        await self.sync_officers(department)
+        cursor = get_officer_workloads_collection().find(
+            {"department": department, "active": True}
+        ).sort("load", ASCENDING).limit(limit)
+        return [self._to_officer(workload_doc) async for workload_doc in cursor]
+
+    async def apply(
+        self,
+        officer_id: str,
+        load_delta: float,
+        open_delta: int,
+        location_delta: Optional[LocationDelta] = None,
+        seq: Optional[int] = None,
+        session=None
+    ):
+        """
+        Adjust an officer's workload, and its location sums by
+        ``location_delta`` (see location_delta()). With ``seq``, an event
+        already applied to this officer is ignored, which makes outbox
+        redelivery harmless.
+
+        The seq is checked before writing rather than by an upsert filter:
+        inside a transaction a duplicate key error aborts the transaction
+        and cannot be caught and ignored.
+        """
+        workloads_collection = get_officer_workloads_collection()
+        increments = {"load": load_delta, "open_reports": open_delta}
+        if location_delta is not None:
+            increments.update({
+                "lat_sum": location_delta[0], "lon_sum": location_delta[1], "located": location_delta[2]
+            })
+        update = {"$inc": increments}
+        query = {"_id": officer_id}
+        if seq is not None:
+            update["$set"] = {"applied_seq": seq}
+        workload_doc = await workloads_collection.find_one(
+            {"_id": officer_id}, {"applied_seq": 1}, session=session
+        )
+        if workload_doc is None:
+            # First event for this officer; nothing to guard against
+            await workloads_collection.update_one(query, update, upsert=True, session=session)
+            return
+        if seq is not None:
+            if (workload_doc.get("applied_seq") or 0) >= seq:
+                return
+            # Still guarded in case another writer applied it meanwhile
+            query["applied_seq"] = {"$not": {"$gte": seq}}
+        await workloads_collection.update_one(query, update, session=session)
+
+class RoutingEngine:
+    """Chooses the officer for a report"""
+
+    def __init__(self, store, strategy: str = ROUTING_STRATEGY):
+        self.store = store
+        self.strategy = STRATEGIES.get(strategy, STRATEGIES["balanced"])
+
+    async def choose(
+        self,
+        department: str,
+        priority: Optional[str] = None,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None
+    ) -> Optional[OfficerLoad]:
+        candidates = await self.store.candidates(
+            (department or "").lower(), self.strategy.candidates
+        )
+        if not candidates:
+            return None
+        return min(
+            candidates,
+            key=lambda officer: score(officer, self.strategy, priority, latitude, longitude)
+        )
+
+def report_location(payload: dict) -> Optional[Tuple[float, float]]:
+    latitude, longitude = payload.get("latitude"), payload.get("longitude")
+    if latitude is None or longitude is None:
+        return None
+    return latitude, longitude
+
+def location_delta(payload: dict, sign: int = 1) -> Optional[LocationDelta]:
+    """Location sums change for a report joining (1) or leaving (-1) an officer"""
+    location = report_location(payload)
+    if location is None:
+        return None
+    return sign * location[0], sign * location[1], sign
+
+def status_workload_deltas(payload: dict) -> Dict[str, Tuple[float, int, Optional[LocationDelta]]]:
+    """
+    Workload changes implied by a status change event: the report (its
+    load and location) leaves its previous officer if it was open, and
+    counts for its current officer if it still is
+    """
+    weight = priority_weight(payload.get("priority"))
+    deltas: Dict[str, List] = defaultdict(lambda: [0.0, 0])
+    previous_officer = payload.get("previous_assigned_officer_id")
+    current_officer = payload.get("assigned_officer_id")
+    if previous_officer and payload.get("old_status") in _OPEN_VALUES:
+        deltas[previous_officer][0] -= weight
+        deltas[previous_officer][1] -= 1
+    if current_officer and payload.get("new_status") in _OPEN_VALUES:
+        deltas[current_officer][0] += weight
+        deltas[current_officer][1] += 1
+    # A report stays where it is, so its location moves with its count
+    return {
+        officer_id: (load, count, location_delta(payload, count))
+        for officer_id, (load, count) in deltas.items()
+        if count
+    }
+
+async def rebuild_workloads():
+    """
+    Recompute every workload from the open reports. Only needed on first
+    deployment or for repair; events up to the current outbox seq are
+    treated as already applied.
+    """
+    counter = await get_counters_collection().find_one({"_id": "outbox"})
+    applied_seq = counter["seq"] if counter else 0
+
+    workload_store = MongoWorkloadStore()
+    await workload_store.sync_officers(force=True)
+    workloads_collection = get_officer_workloads_collection()
+    await workloads_collection.update_many(
+        {},
+        {
+            "$set": {
+                "load": 0.0, "open_reports": 0, "lat_sum": 0.0, "lon_sum": 0.0,
+                "located": 0, "applied_seq": applied_seq
+            }
+        }
+    )
+
+    pipeline = [
+        {
+            "$match": {
+                "status": {"$in": sorted(_OPEN_VALUES)},
+                "assigned_officer_id": {"$ne": None}
+            }
+        },
+        {
+            "$group": {
+                "_id": {"officer": "$assigned_officer_id", "priority": "$priority"},
+                "count": {"$sum": 1},
+                "lat_sum": {"$sum": {"$ifNull": ["$latitude", 0]}},
+                "lon_sum": {"$sum": {"$ifNull": ["$longitude", 0]}},
+                "located": {"$sum": {"$cond": [{"$isNumber": "$latitude"}, 1, 0]}}
+            }
+        }
+    ]
+    async for group in get_reports_collection().aggregate(pipeline):
+        await workloads_collection.update_one(
+            {"_id": group["_id"]["officer"]},
+            {
+                "$inc": {
+                    "load": priority_weight(group["_id"]["priority"]) * group["count"],
+                    "open_reports": group["count"],
+                    "lat_sum": group["lat_sum"],
+                    "lon_sum": group["lon_sum"],
+                    "located": group["located"]
+                },
+                "$set": {"applied_seq": applied_seq}
+            },
+            upsert=True
+        )
+    print(f"👮 Officer workloads rebuilt (events up to seq {applied_seq} included)")
+
+async def ensure_routing_indexes():
+    """
+    Create workload indexes and seed workloads on first deployment. Workers
+    starting together would each add the open reports again, so only the
+    one holding the rebuild lease does it.
+    """
+    await workload_store.ensure_indexes()
+    if (
+        not await get_officer_workloads_collection().find_one({}, {"_id": 1})
+        and await claim_due_run("officer_workloads_rebuild", ROUTING_REBUILD_LEASE_SECONDS)
+    ):
+        await rebuild_workloads()
+
+async def assign_new_report(event: OutboxEventInDB):
+    """Assign a newly created report, if it is still open and unassigned"""
+    payload = event.payload
+    if not ROUTING_ENABLED or payload.get("assigned_officer_id"):
+        return
+    officer = await routing_engine.choose(
+        payload.get("department"),
+        payload.get("priority"),
+        payload.get("latitude"),
+        payload.get("longitude")
+    )
+    if officer is None:
+        return
+
+    now = datetime.utcnow()
+    update_record = ReportUpdate(
+        message=f"Assigned to {officer.name or 'an officer'}",
+        status=ReportStatus.SUBMITTED,
+        updated_by="routing",
+        updated_by_name="Automatic routing"
+    ).dict()
+    # The report keeps its status; the pipeline below fills it in
+    update_record.pop("status")
+
+    async def write_assignment(session):
+        report_doc = await get_reports_collection().find_one_and_update(
+            {
+                "id": event.aggregate_id,
+                "department": payload.get("department"),
+                "assigned_officer_id": None,
+                "status": {"$in": sorted(_OPEN_VALUES)}
+            },
+            [{
+                "$set": {
+                    "assigned_officer_id": {"$literal": officer.officer_id},
+                    "assigned_officer_name": {"$literal": officer.name},
+                    "assigned_at": now,
+                    "updated_at": now,
+                    "version": {"$add": [{"$ifNull": ["$version", 0]}, 1]},
+                    "updates": {
+                        "$concatArrays": [
+                            {"$ifNull": ["$updates", []]},
+                            [{**{key: {"$literal": value} for key, value in update_record.items()},
+                              "status": "$status"}]
+                        ]
+                    }
+                }
+            }],
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+        if report_doc:
+            report = ReportInDB(**report_doc)
+            await workload_store.apply(
+                officer.officer_id,
+                priority_weight(payload.get("priority")),
+                1,
+                location_delta=location_delta(payload),
+                seq=event.seq,
+                session=session
+            )
+            await record_event(
+                OutboxEventType.REPORT_ASSIGNED,
+                event.aggregate_id,
+                {
+                    "status": report.status.value,
+                    "department": report.department,
+                    "priority": report.priority,
+                    "reporter_id": report.reporter_id,
+                    "assigned_officer_id": officer.officer_id,
+                    "version": report.version
+                },
+                session=session
+            )
+        return report_doc is not None
+
+    if not await run_in_transaction(write_assignment):
+        return
+
+    notification = NotificationInDB(
+        id=f"{event.id}-assignment",
+        title="New report assigned",
+        message=payload.get("title") or "A new report was assigned to you",
+        type=NotificationType.ASSIGNMENT,
+        user_id=officer.officer_id,
+        issue_id=event.aggregate_id,
+        data={"priority": payload.get("priority"), "department": payload.get("department")},
+        created_at=event.created_at
+    )
+    await get_notifications_collection().update_one(
+        {"id": notification.id},
+        {"$setOnInsert": notification.dict()},
+        upsert=True
+    )
+
+async def apply_status_change(event: OutboxEventInDB):
+    """Move a report's load between officers as its status changes"""
+    for officer_id, (load_delta, open_delta, location) in status_workload_deltas(event.payload).items():
+        await workload_store.apply(
+            officer_id, load_delta, open_delta, location_delta=location, seq=event.seq
+        )
+
+# Shared store and engine used by the routing consumer
+workload_store = MongoWorkloadStore()
+routing_engine = RoutingEngine(workload_store)
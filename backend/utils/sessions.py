@@ -0,0 +1,197 @@
+"""
+Server-side sessions backing rotating refresh tokens
+
+A refresh token is "<session id>.<secret>". Only a SHA-256 of the secret is
+stored (the secret is random, so a slow hash buys nothing). Every refresh
+swaps the secret for a new one; presenting a secret that was already
+rotated away means the token was copied, and the whole session is revoked.
+Sessions expire through a TTL index on expires_at.
+"""
+import hashlib
+import hmac
+import os
+import secrets
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from pymongo import ASCENDING, ReturnDocument
+
+from database import get_sessions_collection
+from models.schemas import SessionInDB, SessionResponse, UserInDB
+
+# Configuration
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", 30))
+# A retry of the refresh that just rotated (e.g. the response was lost on a
+# mobile network) is rejected without revoking the session
+REFRESH_REUSE_GRACE_SECONDS = int(os.getenv("REFRESH_REUSE_GRACE_SECONDS", 10))
+MAX_SESSIONS_PER_USER = int(os.getenv("MAX_SESSIONS_PER_USER", 10))
+# Rotated-away hashes remembered per session for reuse detection
+REFRESH_REUSE_HISTORY = 5
+
+def _hash_secret(secret: str) -> str:
+    return hashlib.sha256(secret.encode("utf-8")).hexdigest()
+
+def _split_token(refresh_token: str) -> Tuple[str, str]:
+    session_id, _, secret = refresh_token.partition(".")
+    if not session_id or not secret:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token",
+        )
+    return session_id, secret
+
+async def ensure_session_indexes():
+    """Create the indexes used by session lookups and expiry"""
+    sessions_collection = get_sessions_collection()
+    await sessions_collection.create_index([("id", ASCENDING)], unique=True)
+    await sessions_collection.create_index(
+        [("user_id", ASCENDING), ("last_used_at", ASCENDING)]
+    )
+    await sessions_collection.create_index(
+        [("expires_at", ASCENDING)], expireAfterSeconds=0
+    )
+
+async def create_session(
+    user: UserInDB,
+    device_name: Optional[str] = None,
+    user_agent: Optional[str] = None,
+    ip_address: Optional[str] = None
+) -> Tuple[SessionInDB, str]:
+    """Start a session for ``user``, returning it and its refresh token"""
+    secret = secrets.token_urlsafe(32)
+    now = datetime.utcnow()
+    session = SessionInDB(
+        user_id=user.id,
+        token_hash=_hash_secret(secret),
+        device_name=device_name,
+        user_agent=user_agent,
+        ip_address=ip_address,
+        created_at=now,
+        last_used_at=now,
+        expires_at=now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    )
+
+    sessions_collection = get_sessions_collection()
+    await sessions_collection.insert_one(session.dict())
+
+    # Keep the newest sessions only, so abandoned devices do not pile up
+    stale_cursor = sessions_collection.find(
+        {"user_id": user.id, "revoked_at": None},
+        {"id": 1}
+    ).sort("last_used_at", -1).skip(MAX_SESSIONS_PER_USER)
+    stale_ids = [doc["id"] async for doc in stale_cursor]
+    if stale_ids:
+        await sessions_collection.update_many(
+            {"id": {"$in": stale_ids}},
+            {"$set": {"revoked_at": now, "revoked_reason": "session_limit"}}
+        )
+
+    return session, f"{session.id}.{secret}"
+
+async def rotate_refresh_token(refresh_token: str) -> Tuple[SessionInDB, str]:
+    """
+    Exchange a refresh token for a new one, detecting reuse of old tokens
+    """
+    session_id, secret = _split_token(refresh_token)
+    presented_hash = _hash_secret(secret)
+    new_secret = secrets.token_urlsafe(32)
+    now = datetime.utcnow()
+
+    sessions_collection = get_sessions_collection()
+    session_doc = await sessions_collection.find_one_and_update(
+        {
+            "id": session_id,
+            "token_hash": presented_hash,
+            "revoked_at": None,
+            "expires_at": {"$gt": now}
+        },
+        {
+            "$set": {
+                "token_hash": _hash_secret(new_secret),
+                "rotated_at": now,
+                "last_used_at": now,
+                "expires_at": now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+            },
+            "$push": {
+                "previous_token_hashes": {
+                    "$each": [presented_hash],
+                    "$slice": -REFRESH_REUSE_HISTORY
+                }
+            }
+        },
+        return_document=ReturnDocument.AFTER
+    )
+    if session_doc:
+        return SessionInDB(**session_doc), f"{session_id}.{new_secret}"
+
+    # Work out why it failed: unknown, expired/revoked, or a replayed token.
+    # Only a genuinely rotated-away secret revokes the session, so knowing a
+    # session id alone is not enough to sign someone out.
+    session_doc = await sessions_collection.find_one({"id": session_id})
+    if session_doc and session_doc.get("revoked_at") is None:
+        session = SessionInDB(**session_doc)
+        replayed = any(
+            hmac.compare_digest(old_hash, presented_hash)
+            for old_hash in session.previous_token_hashes
+        )
+        just_rotated = (
+            session.previous_token_hashes
+            and hmac.compare_digest(session.previous_token_hashes[-1], presented_hash)
+            and now - session.rotated_at < timedelta(seconds=REFRESH_REUSE_GRACE_SECONDS)
+        )
+        if replayed and not just_rotated:
+            await revoke_session(session.id, session.user_id, "refresh_token_reuse")
+            print(f"⚠️  Refresh token reuse detected, session {session.id} revoked")
+
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token",
+    )
+
+async def list_sessions(user_id: str, current_session_id: Optional[str] = None) -> List[SessionResponse]:
+    """Active sessions of a user, most recently used first"""
+    cursor = get_sessions_collection().find(
+        {"user_id": user_id, "revoked_at": None, "expires_at": {"$gt": datetime.utcnow()}}
+    ).sort("last_used_at", -1)
+    sessions_docs = await cursor.to_list(length=MAX_SESSIONS_PER_USER * 2)
+
+    sessions = []
+    for session_doc in sessions_docs:
+        session = SessionInDB(**session_doc)
+        sessions.append(SessionResponse(
+            id=session.id,
+            device_name=session.device_name,
+            user_agent=session.user_agent,
+            ip_address=session.ip_address,
+            created_at=session.created_at,
+            last_used_at=session.last_used_at,
+            expires_at=session.expires_at,
+            current=session.id == current_session_id
+        ))
+    return sessions
+
+async def revoke_session(session_id: str, user_id: str, reason: str) -> bool:
+    """Revoke one of ``user_id``'s sessions, returning False if not found"""
+    result = await get_sessions_collection().update_one(
+        {"id": session_id, "user_id": user_id, "revoked_at": None},
+        {"$set": {"revoked_at": datetime.utcnow(), "revoked_reason": reason}}
+    )
+    return result.modified_count > 0
+
+async def revoke_refresh_token(refresh_token: str, reason: str) -> bool:
+    """Revoke the session a refresh token belongs to, if it is current"""
+    session_id, secret = _split_token(refresh_token)
+    result = await get_sessions_collection().update_one(
+        {"id": session_id, "token_hash": _hash_secret(secret), "revoked_at": None},
+        {"$set": {"revoked_at": datetime.utcnow(), "revoked_reason": reason}}
+    )
+    return result.modified_count > 0
+
+async def revoke_all_sessions(user_id: str, reason: str) -> int:
+    """Revoke every session of a user (e.g. on deactivation)"""
+    result = await get_sessions_collection().update_many(
+        {"user_id": user_id, "revoked_at": None},
+        {"$set": {"revoked_at": datetime.utcnow(), "revoked_reason": reason}}
+    )
+    return result.modified_count
@@ -0,0 +1,214 @@
+"""
+Sharding readiness
+
+Shard keys of the collections expected to outgrow one replica set:
+
+- reports and reports_archive: {department: 1, id: "hashed"}. Department
+  queries (officer lists, stats, the work queue) go to that department's
+  chunks, and the hashed id spreads a large department over shards. Queries
+  by id add the report's department, which never changes; it is looked up
+  once and cached.
+- notifications: {user_id: 1, id: "hashed"}. Inbox queries carry the
+  user_id; broadcasts (user_id None) are spread by the hashed id.
+
+Set SHARDED_CLUSTER=true when connected to a mongos. Queries by report id
+then carry the department, and the unique index on report ids includes
+the department, as a sharded collection requires.
+
+With SHARD_CHECK_ENABLED a command listener flags commands on these
+collections whose filter does not pin the shard key prefix, so that mongos
+would send them to every shard. Each query shape is logged once with the
+route that issued it and counted under "sharding" in /health. It works on
+an unsharded server too, to find such queries before sharding.
+
+shard_collections.py applies the keys; shard_cluster.sh starts a local
+two-shard cluster to try them.
+"""
+import json
+import os
+import threading
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Iterable, Optional
+
+from pymongo import ASCENDING, monitoring
+from pymongo.errors import OperationFailure
+
+from database import (
+    get_reports_collection,
+    get_reports_archive_collection,
+    register_event_listener
+)
+from utils.cache import cache
+
+# Configuration
+SHARDED_CLUSTER = os.getenv("SHARDED_CLUSTER", "false").lower() == "true"
+SHARD_CHECK_ENABLED = os.getenv("SHARD_CHECK_ENABLED", "false").lower() == "true"
+
+SHARD_KEYS = {
+    "reports": {"department": 1, "id": "hashed"},
+    "reports_archive": {"department": 1, "id": "hashed"},
+    "notifications": {"user_id": 1, "id": "hashed"},
+}
+
+# Report departments never change, so the lookup can be kept for long
+_REPORT_DEPARTMENT_SECONDS = 24 * 3600
+
+async def ensure_report_id_index(collection, sharded: bool = SHARDED_CLUSTER):
+    """Unique index on report ids, prefixed by the department when sharded"""
+    if sharded:
+        await collection.create_index([("department", ASCENDING), ("id", ASCENDING)], unique=True)
+        await collection.create_index([("id", ASCENDING)])
+    else:
+        await collection.create_index([("id", ASCENDING)], unique=True)
+
+async def _load_report_department(report_id: str) -> Optional[str]:
+    projection = {"_id": 0, "department": 1}
+    report_doc = (
+        await get_reports_collection().find_one({"id": report_id}, projection)
+        or await get_reports_archive_collection().find_one({"id": report_id}, projection)
+    )
+    return report_doc.get("department") if report_doc else None
+
+async def report_key(report_id: str) -> dict:
+    """
+    Filter on one report by id, with its department on a sharded cluster
+    so the query goes to a single shard
+    """
+    if not SHARDED_CLUSTER:
+        return {"id": report_id}
+    department = await cache.get_or_load(
+        "report_departments",
+        report_id,
+        lambda: _load_report_department(report_id),
+        _REPORT_DEPARTMENT_SECONDS
+    )
+    if department is None:
+        return {"id": report_id}
+    return {"id": report_id, "department": department}
+
+def pins_field(query, field: str) -> bool:
+    """Whether ``query`` restricts ``field`` to given values (equality or $in)"""
+    if not isinstance(query, dict):
+        return False
+    if field in query:
+        condition = query[field]
+        if not isinstance(condition, dict) or "$eq" in condition or "$in" in condition:
+            return True
+    if any(pins_field(clause, field) for clause in query.get("$and", [])):
+        return True
+    branches = query.get("$or")
+    return bool(branches) and all(pins_field(branch, field) for branch in branches)
+
+def _filters(command_name: str, command: dict) -> Iterable[dict]:
+    if command_name == "find":
+        yield command.get("filter") or {}
+    elif command_name in ("count", "distinct", "findAndModify"):
+        yield command.get("query") or {}
+    elif command_name == "aggregate":
+        pipeline = command.get("pipeline") or [{}]
+        yield pipeline[0].get("$match", {})
+    elif command_name == "update":
+        for update in command.get("updates", []):
+            yield update.get("q") or {}
+    elif command_name == "delete":
+        for delete in command.get("deletes", []):
+            yield delete.get("q") or {}
+
+def query_shape(query) -> object:
+    """``query`` with its values replaced, for grouping similar queries"""
+    if isinstance(query, dict):
+        return {key: query_shape(value) for key, value in query.items()}
+    if isinstance(query, list):
+        return [query_shape(query[0])] if query else []
+    return "?"
+
+# Request (ASGI scope) whose handler issues the current commands
+_current_request: ContextVar[Optional[dict]] = ContextVar("shard_check_request", default=None)
+
+def _origin() -> str:
+    scope = _current_request.get()
+    if scope is None:
+        return "background"
+    route = scope.get("route")
+    return f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+
+class ScatterGatherChecker(monitoring.CommandListener):
+    """Counts and logs commands that would go to every shard"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = defaultdict(int)
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        key = SHARD_KEYS.get(collection) if isinstance(collection, str) else None
+        if key is None:
+            return
+        prefix = next(iter(key))
+        for query in _filters(event.command_name, event.command):
+            if pins_field(query, prefix):
+                continue
+            shape = json.dumps(query_shape(query), sort_keys=True, default=str)[:300]
+            entry = (_origin(), event.command_name, collection, shape)
+            with self._lock:
+                self._counts[entry] += 1
+                first = self._counts[entry] == 1
+            if first:
+                print(f"🔀 Scatter-gather {event.command_name} on {collection} "
+                      f"from {entry[0]}: {shape}")
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def stats(self, top: int = 20) -> dict:
+        with self._lock:
+            counts = sorted(self._counts.items(), key=lambda item: item[1], reverse=True)
+        return {
+            "enabled": SHARD_CHECK_ENABLED,
+            "scatter_gather": [
+                {"origin": origin, "command": command, "collection": collection, "shape": shape, "count": count}
+                for (origin, command, collection, shape), count in counts[:top]
+            ]
+        }
+
+class ShardCheckMiddleware:
+    """ASGI middleware attributing commands to the request that issued them"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        # The router adds the matched route to this same scope
+        _current_request.set(scope)
+        return await self.app(scope, receive, send)
+
+async def shard_collections(client, database_name: str) -> None:
+    """Shard the collections of SHARD_KEYS, creating the indexes they need"""
+    database = client[database_name]
+    await client.admin.command("enableSharding", database_name)
+    for name, key in SHARD_KEYS.items():
+        collection = database[name]
+        if "department" in key:
+            # A unique index must start with the shard key
+            indexes = await collection.index_information()
+            if indexes.get("id_1", {}).get("unique"):
+                await collection.drop_index("id_1")
+                print(f"   {name}: unique id index replaced by (department, id)")
+            await ensure_report_id_index(collection, sharded=True)
+        await collection.create_index(list(key.items()))
+        try:
+            await client.admin.command("shardCollection", f"{database_name}.{name}", key=key)
+            print(f"✅ {name} sharded on {key}")
+        except OperationFailure as e:
+            print(f"⚠️  {name}: {e.details.get('errmsg', e)}")
+
+# Shared checker; its listener must be registered before connecting
+scatter_gather_checker = ScatterGatherChecker()
+if SHARD_CHECK_ENABLED:
+    register_event_listener(scatter_gather_checker)
@@ -0,0 +1,140 @@
+"""
+SLA breach detection and escalation
+
+Every worker polls for reports whose sla_breach_at has passed, in timer
+order through the sla_breach_at index, so a check costs in proportion to
+the breaches found rather than the number of open reports. Each breach is
+claimed with a conditional update on the timer value it was found with,
+so exactly one worker escalates it, and the escalation is recorded as an
+outbox event in the same transaction for consumers to act on.
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from pymongo import ASCENDING, ReturnDocument
+
+from database import get_reports_collection, run_in_transaction, for_each_tenant
+from models.schemas import OutboxEventType, ReportInDB
+from utils.outbox import record_event
+from utils.workflow import (
+    SLA_ESCALATION_REPEAT_HOURS, SLA_MAX_ESCALATIONS, backfill_sla_deadlines
+)
+
+# Configuration
+SLA_MONITOR_ENABLED = os.getenv("SLA_MONITOR_ENABLED", "true").lower() == "true"
+SLA_CHECK_INTERVAL_SECONDS = float(os.getenv("SLA_CHECK_INTERVAL_SECONDS", 60))
+SLA_BATCH_SIZE = int(os.getenv("SLA_BATCH_SIZE", 200))
+
+class SlaMonitor:
+    """Background task escalating reports that missed their SLA"""
+
+    def __init__(
+        self,
+        interval: float = SLA_CHECK_INTERVAL_SECONDS,
+        batch_size: int = SLA_BATCH_SIZE
+    ):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+
+    async def start(self):
+        """Backfill missing deadlines and start checking in the background"""
+        if self._task is None:
+            await for_each_tenant(backfill_sla_deadlines)
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run())
+            print(f"⏱️  SLA monitor started (every {self.interval:.0f}s)")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stopping.set()
+        await self._task
+        self._task = None
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                escalated = max((await for_each_tenant(self.check_once)).values())
+            except Exception as e:
+                print(f"❌ SLA monitor error: {e}")
+                escalated = 0
+
+            # Keep going without sleeping while breaches are backed up
+            if escalated >= self.batch_size:
+                continue
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def check_once(self, now: Optional[datetime] = None) -> int:
+        """Escalate one batch of breached reports, returning how many"""
+        now = now or datetime.utcnow()
+        cursor = get_reports_collection().find(
+            {"sla_breach_at": {"$lte": now}},
+            {"id": 1, "department": 1, "sla_breach_at": 1}
+        ).sort("sla_breach_at", ASCENDING).limit(self.batch_size)
+
+        escalated = 0
+        async for breach in cursor:
+            if await self.escalate(breach["id"], breach["sla_breach_at"], now, breach.get("department")):
+                escalated += 1
+        return escalated
+
+    async def escalate(
+        self, report_id: str, breach_at: datetime, now: datetime, department: Optional[str] = None
+    ) -> bool:
+        """
+        Escalate a report if its timer is still at ``breach_at``, returning
+        False when another worker or a status change got there first
+        """
+        next_breach_at = now + timedelta(hours=SLA_ESCALATION_REPEAT_HOURS)
+        escalation_level = {"$ifNull": ["$escalation_level", 0]}
+
+        async def write_escalation(session):
+            report_doc = await get_reports_collection().find_one_and_update(
+                {"id": report_id, "department": department, "sla_breach_at": breach_at},
+                [{
+                    "$set": {
+                        "escalation_level": {"$add": [escalation_level, 1]},
+                        "escalated_at": now,
+                        "updated_at": now,
+                        # Stop the timer once the last escalation is used up
+                        "sla_breach_at": {
+                            "$cond": [
+                                {"$lt": [{"$add": [escalation_level, 1]}, SLA_MAX_ESCALATIONS]},
+                                next_breach_at,
+                                None
+                            ]
+                        }
+                    }
+                }],
+                return_document=ReturnDocument.AFTER,
+                session=session
+            )
+            if report_doc:
+                report = ReportInDB(**report_doc)
+                await record_event(
+                    OutboxEventType.REPORT_SLA_BREACHED,
+                    report_id,
+                    {
+                        "title": report.title,
+                        "status": report.status.value,
+                        "department": report.department,
+                        "priority": report.priority,
+                        "assigned_officer_id": report.assigned_officer_id,
+                        "sla_due_at": report.sla_due_at,
+                        "escalation_level": report.escalation_level
+                    },
+                    session=session
+                )
+            return report_doc
+
+        return await run_in_transaction(write_escalation) is not None
+
+# Shared monitor started with the app
+sla_monitor = SlaMonitor()
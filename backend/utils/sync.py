@@ -0,0 +1,174 @@
+"""
+Delta sync support for offline-first clients
+
+A sync token is an opaque, URL-safe encoding of where a client stopped
+reading each change feed: a keyset cursor over (``updated_at``, id) for
+reports and notifications and over (``deleted_at``, id) for tombstones.
+Deletions are kept as tombstones for SYNC_TOMBSTONE_DAYS; clients holding an
+older token are told to reset and do a full fetch.
+"""
+import base64
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from pymongo import ASCENDING
+
+from database import (
+    get_reports_collection,
+    get_notifications_collection,
+    get_tombstones_collection
+)
+from models.schemas import TombstoneInDB
+
+# Configuration
+SYNC_TOMBSTONE_DAYS = int(os.getenv("SYNC_TOMBSTONE_DAYS", 30))
+SYNC_OVERLAP_SECONDS = int(os.getenv("SYNC_OVERLAP_SECONDS", 5))
+SYNC_TOKEN_VERSION = 1
+
+async def ensure_sync_indexes():
+    """Create the indexes used by delta sync queries"""
+    await get_reports_collection().create_index(
+        [("updated_at", ASCENDING), ("id", ASCENDING)]
+    )
+    notifications_collection = get_notifications_collection()
+    await notifications_collection.create_index(
+        [("user_id", ASCENDING), ("updated_at", ASCENDING), ("id", ASCENDING)]
+    )
+    await notifications_collection.create_index([("updated_at", ASCENDING)])
+    # Notifications written before updated_at existed sync by creation time
+    await notifications_collection.update_many(
+        {"updated_at": None},
+        [{"$set": {"updated_at": "$created_at"}}]
+    )
+    tombstones_collection = get_tombstones_collection()
+    await tombstones_collection.create_index(
+        [("user_id", ASCENDING), ("deleted_at", ASCENDING), ("id", ASCENDING)]
+    )
+    await tombstones_collection.create_index(
+        [("deleted_at", ASCENDING)],
+        expireAfterSeconds=SYNC_TOMBSTONE_DAYS * 24 * 3600
+    )
+
+# Token keys: one keyset cursor per change feed plus the profile watermark
+SYNC_FEEDS = ("reports", "notifications", "deleted")
+
+def encode_sync_token(position: dict) -> str:
+    """Encode a sync position as an opaque token"""
+    raw = {"v": SYNC_TOKEN_VERSION, "profile": position["profile"].isoformat()}
+    for feed in SYNC_FEEDS:
+        ts, last_id = position[feed]
+        raw[feed] = [ts.isoformat(), last_id]
+    encoded = json.dumps(raw, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(encoded).decode("ascii").rstrip("=")
+
+def _parse_timestamp(value: str) -> datetime:
+    """Token timestamp as naive UTC, like stored ones, even if given with an offset"""
+    timestamp = datetime.fromisoformat(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+def decode_sync_token(token: Optional[str]) -> Optional[dict]:
+    """
+    Decode a sync token into {"profile": datetime, feed: (datetime, id)}.
+
+    Returns None for a first sync.
+    """
+    if not token:
+        return None
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        raw = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if raw.get("v") != SYNC_TOKEN_VERSION:
+            raise ValueError("unsupported token version")
+        position = {"profile": _parse_timestamp(raw["profile"])}
+        for feed in SYNC_FEEDS:
+            ts, last_id = raw[feed]
+            position[feed] = (_parse_timestamp(ts), str(last_id))
+        return position
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid sync token"
+        )
+
+def caught_up_cursor(synced_at: datetime) -> Tuple[datetime, str]:
+    """
+    Cursor for a feed that has been read to the end.
+
+    Writes are stamped before they commit, so the next sync re-reads a short
+    window. Clients upsert by id, which makes the overlap harmless.
+    """
+    return (synced_at - timedelta(seconds=SYNC_OVERLAP_SECONDS), "")
+
+def token_expired(position: dict) -> bool:
+    """True when tombstones needed to sync from ``position`` may be gone"""
+    return position["deleted"][0] < datetime.utcnow() - timedelta(days=SYNC_TOMBSTONE_DAYS)
+
+async def read_feed(
+    collection,
+    base_filter: dict,
+    cursor: Optional[Tuple[datetime, str]],
+    limit: int,
+    ts_field: str = "updated_at"
+) -> Tuple[List[dict], Optional[Tuple[datetime, str]]]:
+    """
+    Read the next page of a change feed ordered by (``ts_field``, id).
+
+    Returns the documents and the cursor after the last one, or None as the
+    cursor when the feed has been read to the end.
+    """
+    query = base_filter
+    if cursor is not None:
+        ts, last_id = cursor
+        query = {
+            "$and": [
+                base_filter,
+                {
+                    "$or": [
+                        {ts_field: {"$gt": ts}},
+                        {ts_field: ts, "id": {"$gt": last_id}}
+                    ]
+                }
+            ]
+        }
+
+    docs_cursor = collection.find(query).sort(
+        [(ts_field, ASCENDING), ("id", ASCENDING)]
+    ).limit(limit + 1)
+    docs = await docs_cursor.to_list(length=limit + 1)
+
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    return docs, (docs[-1][ts_field], docs[-1]["id"])
+
+async def record_tombstone(
+    collection: str,
+    doc_id: str,
+    user_id: Optional[str] = None,
+    session=None
+) -> TombstoneInDB:
+    """Remember that ``doc_id`` was deleted so syncing clients drop it"""
+    tombstone = TombstoneInDB(collection=collection, doc_id=doc_id, user_id=user_id)
+    await get_tombstones_collection().insert_one(tombstone.dict(), session=session)
+    return tombstone
+
+async def record_tombstones(
+    collection: str,
+    docs: List[dict],
+    session=None
+) -> List[TombstoneInDB]:
+    """Batch form of record_tombstone for documents with ``id`` and ``user_id``"""
+    tombstones = [
+        TombstoneInDB(collection=collection, doc_id=doc["id"], user_id=doc.get("user_id"))
+        for doc in docs
+    ]
+    if tombstones:
+        await get_tombstones_collection().insert_many(
+            [tombstone.dict() for tombstone in tombstones], session=session
+        )
+    return tombstones
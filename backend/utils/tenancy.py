@@ -0,0 +1,131 @@
+"""
+Tenant resolution and isolation
+
+One deployment serves several municipalities (tenants, see TENANTS in
+database/mongodb.py). TenantMiddleware picks the tenant of each request
+from the X-Tenant header, else from the "tenant" claim of its bearer token,
+else DEFAULT_TENANT, and makes it current for the request, so that every
+collection getter returns that tenant's collection. The claim is only read
+here to route the request; verify_token() rejects a token issued for
+another tenant than the current one.
+
+Tenants on the same cluster share a connection pool. So that a noisy
+tenant cannot take every connection and starve the others, each worker
+runs at most TENANT_MAX_CONCURRENT_REQUESTS requests of a tenant at once;
+further ones wait up to TENANT_QUEUE_TIMEOUT_SECONDS for a slot, then get
+503 + Retry-After. Counts per tenant are reported under "tenants" in
+/health.
+"""
+import asyncio
+import os
+from collections import defaultdict
+from typing import Dict, Optional
+
+import jwt
+
+from database import TENANTS, DEFAULT_TENANT, set_current_tenant
+from utils.rate_limit import RATE_LIMIT_EXEMPT_PATHS, send_error
+
+# Configuration
+TENANT_HEADER = "x-tenant"
+# Per worker and tenant; 0 disables the limit
+TENANT_MAX_CONCURRENT_REQUESTS = int(os.getenv("TENANT_MAX_CONCURRENT_REQUESTS", 0))
+TENANT_QUEUE_TIMEOUT_SECONDS = float(os.getenv("TENANT_QUEUE_TIMEOUT_SECONDS", 2.0))
+
+def token_tenant(token: str) -> Optional[str]:
+    """Tenant claim of a bearer token, unverified"""
+    try:
+        claims = jwt.decode(token, options={"verify_signature": False})
+    except jwt.PyJWTError:
+        return None
+    tenant = claims.get("tenant")
+    return tenant if isinstance(tenant, str) else None
+
+def resolve_tenant(scope) -> Optional[str]:
+    """Tenant named by the request, or DEFAULT_TENANT (None if unset)"""
+    claimed = None
+    for name, value in scope.get("headers", []):
+        if name == TENANT_HEADER.encode("latin-1"):
+            return value.decode("latin-1").strip().lower()
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                claimed = token_tenant(token)
+    return claimed or DEFAULT_TENANT or None
+
+class TenantLimiter:
+    """Bounds the requests of each tenant in flight in this worker"""
+
+    def __init__(
+        self,
+        max_concurrent: int = TENANT_MAX_CONCURRENT_REQUESTS,
+        queue_timeout: float = TENANT_QUEUE_TIMEOUT_SECONDS
+    ):
+        self.max_concurrent = max_concurrent
+        self.queue_timeout = queue_timeout
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+        self._in_flight: Dict[str, int] = defaultdict(int)
+        self._counts: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    async def acquire(self, tenant: str) -> bool:
+        """Take a slot for a request of ``tenant``; False if none freed in time"""
+        counts = self._counts[tenant]
+        counts["requests"] += 1
+        if self.max_concurrent > 0:
+            slots = self._slots.get(tenant)
+            if slots is None:
+                slots = self._slots[tenant] = asyncio.Semaphore(self.max_concurrent)
+            if slots.locked():
+                counts["queued"] += 1
+            try:
+                await asyncio.wait_for(slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                counts["rejected"] += 1
+                return False
+        self._in_flight[tenant] += 1
+        return True
+
+    def release(self, tenant: str):
+        self._in_flight[tenant] -= 1
+        if self.max_concurrent > 0:
+            self._slots[tenant].release()
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrent_requests": self.max_concurrent,
+            "tenants": {
+                tenant: {**counts, "in_flight": self._in_flight[tenant]}
+                for tenant, counts in self._counts.items()
+            }
+        }
+
+class TenantMiddleware:
+    """ASGI middleware making the request's tenant current and bounding its load"""
+
+    def __init__(self, app, limiter: "TenantLimiter" = None):
+        self.app = app
+        self.limiter = limiter or tenant_limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        tenant = resolve_tenant(scope)
+        if tenant is None or tenant not in TENANTS:
+            if scope["path"] in RATE_LIMIT_EXEMPT_PATHS:
+                return await self.app(scope, receive, send)
+            detail = "Unknown tenant" if tenant else "Tenant required (X-Tenant header)"
+            return await send_error(send, 400, detail, [])
+
+        set_current_tenant(tenant)
+        if not await self.limiter.acquire(tenant):
+            return await send_error(send, 503, "Too many requests for this tenant, please retry", [
+                (b"retry-after", b"1")
+            ])
+        try:
+            return await self.app(scope, receive, send)
+        finally:
+            self.limiter.release(tenant)
+
+# Limiter of this worker
+tenant_limiter = TenantLimiter()
@@ -0,0 +1,132 @@
+"""
+Officer work queue support
+
+The queue reads open reports in queue_rank_at order (see utils/workflow.py)
+through indexes that lead with the officer policy fields, so serving it is
+an index scan however large the department is. This module creates those
+indexes and keeps duplicate counts, one of the rank's inputs, up to date
+from report events: a new report near an open one of the same department
+and category counts as its duplicate.
+"""
+import math
+import os
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING
+
+from database import get_reports_collection
+from models.schemas import OutboxEventInDB, ReportStatus, ReportUpdate
+from utils.leases import mark_migration_done, migration_done
+from utils.workflow import OPEN_STATUSES, queue_rank_stage
+
+# Configuration
+DUPLICATE_RADIUS_METERS = float(os.getenv("DUPLICATE_RADIUS_METERS", 150))
+DUPLICATE_WINDOW_DAYS = int(os.getenv("DUPLICATE_WINDOW_DAYS", 30))
+
+_OPEN_VALUES = sorted(open_status.value for open_status in OPEN_STATUSES)
+QUEUE_RANK_MIGRATION = "queue_rank_backfill"
+
+async def ensure_queue_indexes():
+    """Create the work queue indexes and rank reports that predate it"""
+    reports_collection = get_reports_collection()
+    # One per shape of the officer policy: department, assignment, or all
+    await reports_collection.create_index(
+        [("department", ASCENDING), ("status", ASCENDING), ("queue_rank_at", ASCENDING)]
+    )
+    await reports_collection.create_index(
+        [("assigned_officer_id", ASCENDING), ("status", ASCENDING), ("queue_rank_at", ASCENDING)]
+    )
+    await reports_collection.create_index(
+        [("status", ASCENDING), ("queue_rank_at", ASCENDING)]
+    )
+    # Duplicate lookup by place
+    await reports_collection.create_index(
+        [("department", ASCENDING), ("category", ASCENDING), ("latitude", ASCENDING)]
+    )
+    # Once per database; new reports are ranked when written
+    if not await migration_done(QUEUE_RANK_MIGRATION):
+        await reports_collection.update_many(
+            {"queue_rank_at": {"$exists": False}},
+            [queue_rank_stage()]
+        )
+        await mark_migration_done(QUEUE_RANK_MIGRATION)
+
+async def count_duplicate(event: OutboxEventInDB) -> bool:
+    """
+    Record a new report as a duplicate of the oldest open report of the
+    same department and category within DUPLICATE_RADIUS_METERS, returning
+    whether one was found
+    """
+    payload = event.payload
+    latitude, longitude = payload.get("latitude"), payload.get("longitude")
+    if latitude is None or longitude is None:
+        return False
+
+    lat_delta = DUPLICATE_RADIUS_METERS / 111320
+    lon_delta = DUPLICATE_RADIUS_METERS / (111320 * max(math.cos(math.radians(latitude)), 0.01))
+    reports_collection = get_reports_collection()
+    original_doc = await reports_collection.find_one(
+        {
+            "department": payload.get("department"),
+            "category": payload.get("category"),
+            "latitude": {"$gte": latitude - lat_delta, "$lte": latitude + lat_delta},
+            "longitude": {"$gte": longitude - lon_delta, "$lte": longitude + lon_delta},
+            "status": {"$in": _OPEN_VALUES},
+            "created_at": {
+                "$gte": event.created_at - timedelta(days=DUPLICATE_WINDOW_DAYS),
+                "$lte": event.created_at
+            },
+            "duplicate_of": None,
+            "id": {"$ne": event.aggregate_id}
+        },
+        {"id": 1, "department": 1},
+        sort=[("created_at", ASCENDING)]
+    )
+    if not original_doc:
+        return False
+
+    # Set semantics keep redelivered events from counting twice
+    await reports_collection.update_one(
+        {"id": original_doc["id"], "department": original_doc["department"]},
+        [
+            {
+                "$set": {
+                    "updated_at": datetime.utcnow(),
+                    "duplicate_ids": {
+                        "$setUnion": [
+                            {"$ifNull": ["$duplicate_ids", []]},
+                            [{"$literal": event.aggregate_id}]
+                        ]
+                    }
+                }
+            },
+            {"$set": {"duplicate_count": {"$size": "$duplicate_ids"}}},
+            queue_rank_stage()
+        ]
+    )
+    update_record = ReportUpdate(
+        message=f"Marked as a duplicate of report {original_doc['id']}",
+        status=ReportStatus.SUBMITTED,
+        updated_by="duplicates",
+        updated_by_name="Duplicate detection"
+    ).dict()
+    # The report keeps its status; the pipeline below fills it in
+    update_record.pop("status")
+    await reports_collection.update_one(
+        {"id": event.aggregate_id, "department": payload.get("department"), "duplicate_of": None},
+        [{
+            "$set": {
+                "duplicate_of": {"$literal": original_doc["id"]},
+                "updated_at": datetime.utcnow(),
+                "version": {"$add": [{"$ifNull": ["$version", 0]}, 1]},
+                "updates": {
+                    "$concatArrays": [
+                        {"$ifNull": ["$updates", []]},
+                        [{**{key: {"$literal": value} for key, value in update_record.items()},
+                          "status": "$status"}]
+                    ]
+                }
+            }
+        }]
+    )
+    return True
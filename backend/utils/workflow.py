@@ -0,0 +1,262 @@
+"""
+Report status workflow
+
+The allowed status transitions, expressed so they can be enforced inside
+the update query itself: a status change only matches reports whose
+current status may move to the new one, which keeps the check atomic with
+the write.
+
+Open reports also run against an SLA. Its length depends on priority
+(with per-department overrides) and is stored on the report as sla_hours.
+The deadline is stored as sla_due_at. sla_breach_at is the pending
+escalation timer: it is set only while a report is open and has
+escalations left, so the SLA monitor finds breaches with an index range
+scan.
+
+The officer work queue is ordered by queue_rank_at: the SLA deadline
+pulled forward for priority and duplicates. Because it is a point in time
+rather than a score, older reports rise on their own as their deadline
+nears, and the field only changes when its inputs do. It is null once a
+report is closed.
+"""
+import math
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from pymongo import ASCENDING
+
+from database import get_reports_collection
+from models.schemas import ReportStatus
+from utils.leases import mark_migration_done, migration_done
+from utils.sharding import ensure_report_id_index
+
+# Status -> statuses it may move to
+ALLOWED_TRANSITIONS: Dict[ReportStatus, Set[ReportStatus]] = {
+    ReportStatus.SUBMITTED: {
+        ReportStatus.NOT_SEEN, ReportStatus.RESOLVE_SOON,
+        ReportStatus.IN_PROGRESS, ReportStatus.REJECTED
+    },
+    ReportStatus.NOT_SEEN: {
+        ReportStatus.RESOLVE_SOON, ReportStatus.IN_PROGRESS, ReportStatus.REJECTED
+    },
+    ReportStatus.RESOLVE_SOON: {
+        ReportStatus.IN_PROGRESS, ReportStatus.DONE, ReportStatus.REJECTED
+    },
+    ReportStatus.IN_PROGRESS: {
+        ReportStatus.RESOLVE_SOON, ReportStatus.DONE, ReportStatus.REJECTED
+    },
+    # Done and rejected reports may be reopened until they are closed
+    ReportStatus.DONE: {ReportStatus.IN_PROGRESS, ReportStatus.CLOSED},
+    ReportStatus.REJECTED: {ReportStatus.IN_PROGRESS, ReportStatus.CLOSED},
+    ReportStatus.CLOSED: set(),
+}
+
+OPEN_STATUSES = {
+    ReportStatus.SUBMITTED, ReportStatus.NOT_SEEN,
+    ReportStatus.RESOLVE_SOON, ReportStatus.IN_PROGRESS
+}
+CLOSED_STATUSES = set(ReportStatus) - OPEN_STATUSES
+
+# SLA length in hours by priority
+SLA_HOURS: Dict[str, int] = {
+    "critical": int(os.getenv("SLA_HOURS_CRITICAL", 24)),
+    "high": int(os.getenv("SLA_HOURS_HIGH", 72)),
+    "medium": int(os.getenv("SLA_HOURS_MEDIUM", 120)),
+    "low": int(os.getenv("SLA_HOURS_LOW", 240)),
+}
+DEFAULT_SLA_HOURS = SLA_HOURS["medium"]
+
+# (department, priority) -> hours, where a department differs from SLA_HOURS
+DEPARTMENT_SLA_HOURS: Dict[Tuple[str, str], int] = {
+    ("watersupply", "critical"): 12,
+    ("drainage", "critical"): 12,
+    ("streetlights", "low"): 168,
+}
+
+# After a breach the report escalates again every SLA_ESCALATION_REPEAT_HOURS
+# until it has escalated SLA_MAX_ESCALATIONS times
+SLA_ESCALATION_REPEAT_HOURS = int(os.getenv("SLA_ESCALATION_REPEAT_HOURS", 24))
+SLA_MAX_ESCALATIONS = int(os.getenv("SLA_MAX_ESCALATIONS", 3))
+SLA_BACKFILL_MIGRATION = "sla_backfill"
+
+# Work queue: hours a report's rank moves ahead of its deadline by
+# priority, and per doubling of its duplicate reports
+QUEUE_PRIORITY_LEAD_HOURS: Dict[str, float] = {
+    "critical": 48, "high": 12, "medium": 0, "low": -24
+}
+QUEUE_DUPLICATE_LEAD_HOURS = float(os.getenv("QUEUE_DUPLICATE_LEAD_HOURS", 12))
+
+def sla_hours(department: str, priority: str) -> int:
+    """SLA length for a report of ``department`` and ``priority``"""
+    department = (department or "").lower()
+    priority = (priority or "").lower()
+    return DEPARTMENT_SLA_HOURS.get(
+        (department, priority), SLA_HOURS.get(priority, DEFAULT_SLA_HOURS)
+    )
+
+def describe_sla(hours: int) -> str:
+    """Human-readable SLA, as shown in estimated_resolution_time"""
+    if hours % 24 == 0:
+        days = hours // 24
+        return f"Within {days} day{'s' if days != 1 else ''}"
+    return f"Within {hours} hours"
+
+def sla_fields(department: str, priority: str, start: datetime) -> dict:
+    """SLA fields for a report opened at ``start``"""
+    hours = sla_hours(department, priority)
+    due_at = start + timedelta(hours=hours)
+    return {
+        "sla_hours": hours,
+        "sla_due_at": due_at,
+        "sla_breach_at": due_at,
+        "estimated_resolution_time": describe_sla(hours),
+        "queue_rank_at": queue_rank_at(due_at, priority),
+    }
+
+def queue_rank_at(sla_due_at: datetime, priority: str, duplicate_count: int = 0) -> datetime:
+    """Work queue position of an open report; earlier is more urgent"""
+    lead_hours = (
+        QUEUE_PRIORITY_LEAD_HOURS.get((priority or "").lower(), 0)
+        + QUEUE_DUPLICATE_LEAD_HOURS * math.log2(1 + duplicate_count)
+    )
+    return sla_due_at - timedelta(hours=lead_hours)
+
+def queue_rank_stage() -> dict:
+    """
+    Pipeline stage recomputing queue_rank_at from the updated report, to
+    append to any update that changes status, deadline, priority or
+    duplicates
+    """
+    priority_lead = {
+        "$switch": {
+            "branches": [
+                {"case": {"$eq": ["$priority", priority]}, "then": hours}
+                for priority, hours in QUEUE_PRIORITY_LEAD_HOURS.items()
+            ],
+            "default": 0
+        }
+    }
+    duplicate_lead = {
+        "$multiply": [
+            QUEUE_DUPLICATE_LEAD_HOURS,
+            {"$log": [{"$add": [1, {"$ifNull": ["$duplicate_count", 0]}]}, 2]}
+        ]
+    }
+    open_values = [open_status.value for open_status in OPEN_STATUSES]
+    return {
+        "$set": {
+            "queue_rank_at": {
+                "$cond": [
+                    {"$and": [
+                        {"$in": ["$status", open_values]},
+                        {"$ne": [{"$type": "$sla_due_at"}, "missing"]}
+                    ]},
+                    {
+                        "$subtract": [
+                            "$sla_due_at",
+                            {"$multiply": [{"$add": [priority_lead, duplicate_lead]}, 3600000]}
+                        ]
+                    },
+                    None
+                ]
+            }
+        }
+    }
+
+def sla_transition_fields(new_status: ReportStatus, now: datetime) -> dict:
+    """
+    Pipeline $set fields keeping the SLA timer in step with a status
+    change: closing a report stops its timer and reopening one restarts
+    the clock. Field paths refer to the report as it was before the update.
+    """
+    if new_status in CLOSED_STATUSES:
+        return {"sla_breach_at": None}
+
+    reopened = {"$in": ["$status", [closed.value for closed in CLOSED_STATUSES]]}
+    restarted_due_at = {
+        "$add": [now, {"$multiply": [{"$ifNull": ["$sla_hours", DEFAULT_SLA_HOURS]}, 3600000]}]
+    }
+    return {
+        "sla_due_at": {"$cond": [reopened, restarted_due_at, "$sla_due_at"]},
+        "sla_breach_at": {"$cond": [reopened, restarted_due_at, "$sla_breach_at"]},
+        "escalation_level": {
+            "$cond": [reopened, 0, {"$ifNull": ["$escalation_level", 0]}]
+        },
+    }
+
+def can_transition(old_status: ReportStatus, new_status: ReportStatus) -> bool:
+    return new_status in ALLOWED_TRANSITIONS.get(ReportStatus(old_status), set())
+
+def allowed_sources(new_status: ReportStatus) -> List[str]:
+    """Statuses a report may be in to move to ``new_status``"""
+    return [
+        old_status.value
+        for old_status, targets in ALLOWED_TRANSITIONS.items()
+        if new_status in targets
+    ]
+
+def transition_filter(new_status: ReportStatus, expected_version: Optional[int] = None) -> dict:
+    """
+    Filter fragment matching reports that may move to ``new_status`` and,
+    when given, are still at ``expected_version``
+    """
+    filter_query = {"status": {"$in": allowed_sources(new_status)}}
+    if expected_version is not None:
+        # Reports written before versioning have no version field
+        filter_query["version"] = (
+            {"$in": [0, None]} if expected_version == 0 else expected_version
+        )
+    return filter_query
+
+async def ensure_workflow_indexes():
+    """Create the indexes used by status updates and SLA monitoring"""
+    reports_collection = get_reports_collection()
+    # Every single-report read and write looks the report up by id
+    await ensure_report_id_index(reports_collection)
+    await reports_collection.create_index([("sla_breach_at", ASCENDING)])
+
+async def backfill_sla_deadlines():
+    """
+    Give reports created before SLA tracking a deadline counted from their
+    creation, with one update per SLA rule rather than a pass over reports.
+    Runs once per database; new reports get their deadline when created.
+    """
+    if await migration_done(SLA_BACKFILL_MIGRATION):
+        return
+    reports_collection = get_reports_collection()
+    open_values = [open_status.value for open_status in OPEN_STATUSES]
+
+    def deadline_update(hours: int) -> list:
+        due_at = {"$add": ["$created_at", hours * 3600000]}
+        return [
+            {
+                "$set": {
+                    "sla_hours": hours,
+                    "sla_due_at": due_at,
+                    "sla_breach_at": {"$cond": [{"$in": ["$status", open_values]}, due_at, None]},
+                    "escalation_level": {"$ifNull": ["$escalation_level", 0]},
+                }
+            },
+            queue_rank_stage()
+        ]
+
+    missing = {"sla_hours": {"$exists": False}}
+    updated = 0
+    for (department, priority), hours in DEPARTMENT_SLA_HOURS.items():
+        result = await reports_collection.update_many(
+            {**missing, "department": department, "priority": priority},
+            deadline_update(hours)
+        )
+        updated += result.modified_count
+    for priority, hours in SLA_HOURS.items():
+        result = await reports_collection.update_many(
+            {**missing, "priority": priority}, deadline_update(hours)
+        )
+        updated += result.modified_count
+    result = await reports_collection.update_many(missing, deadline_update(DEFAULT_SLA_HOURS))
+    updated += result.modified_count
+
+    await mark_migration_done(SLA_BACKFILL_MIGRATION)
+    if updated:
+        print(f"⏱️  Added SLA deadlines to {updated} existing reports")